@@ -8,13 +8,26 @@ Dominio: Educación - Generación de infografías, diagramas y material didácti
 ═══════════════════════════════════════════════════════════════════════════════
 """
 
-import gradio as gr
-from together import Together
 import os
-import base64
-from io import BytesIO
-from PIL import Image
+import asyncio
+import math
+import time
+import random
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.cache import ResultCache, generation_key
+from src.backends import create_backend
+from src.dedup import HashIndex, image_hashes
+from src.delivery import DeliveryEncoder
+from src.grid import build_grid_streaming
+from src.latency import AdmissionController, LatencyModel
+from src.metrics import RequestTimer, registry, request_timer, stage, start_metrics_server
+from src.scheduler import RateLimitScheduler, TokenBucket, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from src.similarity import PromptIndex
+from src.singleflight import SingleFlight
+from src.storage import OutputStore
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # CONFIGURACIÓN
@@ -29,13 +42,714 @@ ESTILOS = {
     "🌈 Mapa Conceptual": "concept map, connected ideas, colorful nodes, mind map style, organized layout, arrows and connections"
 }
 
+# Identificador del modelo (Together AI o Hugging Face para el backend local)
+MODELO = os.environ.get("EDUDIFF_MODEL", "stabilityai/stable-diffusion-xl-base-1.0")
+ANCHO = 1024
+ALTO = 1024
+
+# Backend de generación: "together" (API), "stub" (servidor local para pruebas)
+# o "local" (diffusers en este proceso)
+backend_generacion = create_backend(os.environ.get("EDUDIFF_BACKEND", "together"))
+
+# Réplicas detrás de un balanceador: base SQLite común con la cubeta de la
+# API y las concesiones por clave (src.shared). Vacío = estado por proceso.
+ESTADO_COMPARTIDO = os.environ.get("EDUDIFF_SHARED_STATE", "")
+CONCESION_TTL_S = float(os.environ.get("EDUDIFF_LEASE_TTL_S", "120"))
+
+# Caché de resultados: LRU en memoria + almacén en disco acotado por tamaño.
+# Con estado compartido, la caché por defecto está junto a la base, en el
+# mismo disco, para que todas las réplicas vean lo que genera cada una.
+CACHE_DIR = os.environ.get("EDUDIFF_CACHE_DIR") or (
+    os.path.join(os.path.dirname(os.path.abspath(ESTADO_COMPARTIDO)), "edudiff_cache") if ESTADO_COMPARTIDO
+    else os.path.join(tempfile.gettempdir(), "edudiff_cache")
+)
+CACHE_MAX_MB = int(os.environ.get("EDUDIFF_CACHE_MAX_MB", "512"))
+CACHE_MEMORIA_ITEMS = int(os.environ.get("EDUDIFF_CACHE_MEMORY_ITEMS", "32"))
+# Con réplicas, cada una ve solo lo que escribe: el tamaño total se vuelve a medir cada tanto
+CACHE_REMEDICION_S = float(os.environ.get("EDUDIFF_CACHE_RESCAN_S", "30"))
+
+cache_resultados = ResultCache(
+    CACHE_DIR,
+    max_memory_items=CACHE_MEMORIA_ITEMS,
+    max_disk_bytes=CACHE_MAX_MB * 1024 * 1024,
+    rescan_interval=CACHE_REMEDICION_S if ESTADO_COMPARTIDO else None
+)
+
+# Almacén de salidas con recolección por antigüedad y tamaño
+SALIDAS_DIR = os.environ.get("EDUDIFF_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "edudiff_outputs"))
+SALIDAS_TTL_MIN = float(os.environ.get("EDUDIFF_OUTPUT_TTL_MIN", "60"))
+SALIDAS_MAX_MB = int(os.environ.get("EDUDIFF_OUTPUT_MAX_MB", "1024"))
+
+almacen_salidas = OutputStore(
+    SALIDAS_DIR,
+    ttl_seconds=SALIDAS_TTL_MIN * 60,
+    max_bytes=SALIDAS_MAX_MB * 1024 * 1024
+)
+
+# Copias para el navegador (WebP/JPEG) y miniaturas de la galería; los PNG
+# originales quedan disponibles para descargar
+VISTA_FORMATO = os.environ.get("EDUDIFF_DISPLAY_FORMAT", "webp").lower()
+VISTA_CALIDAD = int(os.environ.get("EDUDIFF_DISPLAY_QUALITY", "85"))
+VISTA_LADO_MAX = int(os.environ.get("EDUDIFF_DISPLAY_MAX_SIDE", "1024"))
+MINIATURA_LADO = int(os.environ.get("EDUDIFF_THUMB_SIDE", "256"))
+CODIFICACION_HILOS = int(os.environ.get("EDUDIFF_ENCODE_WORKERS", "4"))
+
+codificador_vistas = DeliveryEncoder(
+    almacen_salidas,
+    display_format=VISTA_FORMATO,
+    quality=VISTA_CALIDAD,
+    max_side=VISTA_LADO_MAX,
+    thumbnail_side=MINIATURA_LADO,
+    num_workers=CODIFICACION_HILOS
+)
+
+# Índice de hashes perceptuales de las imágenes generadas (por clave de caché)
+DEDUP_INDICE = os.environ.get("EDUDIFF_DEDUP_INDEX", os.path.join(CACHE_DIR, "dedup_index.npz"))
+DEDUP_DISTANCIA = int(os.environ.get("EDUDIFF_DEDUP_DISTANCE", "6"))
+
+indice_duplicados = HashIndex(DEDUP_INDICE)
+
+# Índice de prompts ya generados por estilo (MinHash + LSH) para reutilizar
+# resultados de peticiones casi idénticas
+SIMILITUD_UMBRAL = float(os.environ.get("EDUDIFF_SIMILARITY_THRESHOLD", "0.8"))
+
+indice_prompts = PromptIndex(os.path.join(CACHE_DIR, "prompt_index.jsonl"), threshold=SIMILITUD_UMBRAL)
+
+# Peticiones idénticas en vuelo: una sola llamada a la API para todas
+vuelos_en_curso = SingleFlight()
+
+# Límite de tasa del plan de la API: cola con prioridad + reintentos ante 429
+LIMITE_POR_MINUTO = float(os.environ.get("EDUDIFF_RATE_PER_MIN", "60"))
+LIMITE_RAFAGA = float(os.environ.get("EDUDIFF_RATE_BURST", "5"))
+MAX_REINTENTOS = int(os.environ.get("EDUDIFF_MAX_RETRIES", "4"))
+
+# Con réplicas, el límite es el del plan para todas juntas y una sola
+# réplica genera cada clave mientras las demás esperan a la caché
+concesiones = None
+if ESTADO_COMPARTIDO:
+    from src.shared import SharedLeases, SharedState, SharedTokenBucket
+    estado_replicas = SharedState(ESTADO_COMPARTIDO)
+    cubeta_api = SharedTokenBucket(estado_replicas, rate=LIMITE_POR_MINUTO / 60.0, capacity=LIMITE_RAFAGA)
+    concesiones = SharedLeases(estado_replicas, ttl=CONCESION_TTL_S)
+else:
+    cubeta_api = TokenBucket(rate=LIMITE_POR_MINUTO / 60.0, capacity=LIMITE_RAFAGA)
+
+planificador_api = RateLimitScheduler(cubeta_api, max_retries=MAX_REINTENTOS)
+
+# Cola de Gradio: generaciones simultáneas y peticiones en espera
+CONCURRENCIA = int(os.environ.get("EDUDIFF_CONCURRENCY", "32"))
+COLA_MAX = int(os.environ.get("EDUDIFF_QUEUE_MAX", "128"))
+
+# Variantes por petición (una sola llamada a la API con n imágenes)
+MAX_VARIANTES = 4
+_decodificador = ThreadPoolExecutor(max_workers=MAX_VARIANTES, thread_name_prefix="edudiff-decode")
+
+# Modo progresivo: borrador rápido con la misma semilla antes del render final
+PASOS_BORRADOR = int(os.environ.get("EDUDIFF_DRAFT_STEPS", "15"))
+
+# Latencia: modelo aprendido de las generaciones observadas, tiempo estimado
+# y control de admisión. SLO_SEGUNDOS es el tiempo máximo aceptable hasta el
+# resultado (0 = sin control): por encima se reducen steps/variantes y, si
+# la espera en cola ya lo supera, la petición se rechaza.
+SLO_SEGUNDOS = float(os.environ.get("EDUDIFF_SLO_S", "0"))
+INTERVALO_ETA = 1.0
+
+modelo_latencia = LatencyModel()
+control_admision = AdmissionController(
+    modelo_latencia,
+    backend_generacion.name,
+    ANCHO,
+    ALTO,
+    queue_wait=planificador_api.estimate_wait,
+    sequential=backend_generacion.sequential,
+    slo_seconds=SLO_SEGUNDOS,
+    min_steps=PASOS_BORRADOR
+)
+
+# Origen del resultado mostrado en el estado
+ORIGEN_CACHE = "⚡ Recuperado de caché"
+ORIGEN_COMPARTIDO = "🔗 Compartido con una petición idéntica"
+ORIGEN_API = "✅ Generado con SDXL"
+
+# Métricas: etiqueta "outcome" de cada origen y puerto del endpoint /metrics (0 = desactivado)
+RESULTADO_METRICA = {ORIGEN_CACHE: "cache", ORIGEN_COMPARTIDO: "shared", ORIGEN_API: "api"}
+METRICAS_PUERTO = int(os.environ.get("EDUDIFF_METRICS_PORT", "0"))
+
+# Preparar el backend (cliente de la API o modelo local) mientras arranca la interfaz
+PRECALENTAR = os.environ.get("EDUDIFF_WARMUP", "1").lower() in ("1", "true", "yes")
+
+registry.register_gauges("edudiff_cache", cache_resultados.stats)
+registry.register_gauges("edudiff_singleflight", vuelos_en_curso.stats)
+registry.register_gauges("edudiff_outputs", almacen_salidas.stats)
+registry.register_gauges("edudiff_delivery", codificador_vistas.stats)
+registry.register_gauges("edudiff_scheduler", planificador_api.stats)
+registry.register_gauges("edudiff_prompt_index", indice_prompts.stats)
+registry.register_gauges("edudiff_latency_model", modelo_latencia.stats)
+registry.register_gauges("edudiff_admission", control_admision.stats)
+if concesiones is not None:
+    registry.register_gauges("edudiff_leases", concesiones.stats)
+if backend_generacion.name == "local":
+    registry.register_gauges("edudiff_pipelines", backend_generacion.registry.stats)
+    if backend_generacion.batcher is not None:
+        registry.register_gauges("edudiff_microbatch", backend_generacion.batcher.stats)
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # FUNCIÓN DE GENERACIÓN CON TOGETHER AI
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def generar_imagen(prompt: str, estilo: str, guidance_scale: float, num_steps: int, seed: int) -> tuple:
+def _empaquetar_resultados(imagenes: list) -> tuple:
+    """
+    Guarda las variantes tal como llegaron y arma la hoja comparativa.
+    
+    Los bytes recibidos se escriben directamente en el almacén de salidas y
+    la cuadrícula se compone desde esos archivos por franjas, decodificando
+    las variantes en paralelo.
+    
+    Args:
+        imagenes: Lista de bytes de imagen (una por variante)
+    
+    Returns:
+        tuple: (ruta principal, rutas de la galería, ruta de la cuadrícula o None)
+    """
+    with stage("output_write"):
+        rutas = [almacen_salidas.save_bytes(img_data) for img_data in imagenes]
+    
+    cuadricula = None
+    if len(imagenes) > 1:
+        cols = math.ceil(math.sqrt(len(rutas)))
+        with stage("grid"):
+            cuadricula = almacen_salidas.save_with(
+                lambda destino: build_grid_streaming(rutas, destino, cols=cols, num_workers=MAX_VARIANTES)
+            )
+    
+    return rutas[0], rutas, cuadricula
+
+
+def _empaquetar_para_interfaz(imagenes: list) -> tuple:
+    """
+    Empaqueta un resultado para la interfaz web: copias ligeras a la vista y originales para descargar.
+    
+    Las copias de visualización y las miniaturas se codifican en el pool de
+    codificador_vistas mientras se escriben los originales y se compone la
+    cuadrícula.
+    
+    Args:
+        imagenes: Lista de bytes de imagen (una por variante)
+    
+    Returns:
+        tuple: (copia principal, miniaturas de la galería, copia de la cuadrícula o None,
+                rutas de los originales, rutas de las copias de cada variante)
+    """
+    pendientes = [codificador_vistas.submit(img_data) for img_data in imagenes]
+    _, originales, cuadricula = _empaquetar_resultados(imagenes)
+    
+    with stage("display_encode"):
+        cuadricula_vista = codificador_vistas.submit_file(cuadricula).result() if cuadricula else None
+        copias = [pendiente.result() for pendiente in pendientes]
+    
+    vistas = [copia.display for copia in copias]
+    descargas = originales + ([cuadricula] if cuadricula else [])
+    return vistas[0], [copia.thumbnail for copia in copias], cuadricula_vista, descargas, vistas
+
+
+def _resumen_cache() -> str:
+    """Texto corto con los contadores de la caché y la cola para el estado."""
+    stats = cache_resultados.stats()
+    aciertos = stats["memory_hits"] + stats["disk_hits"]
+    agrupadas = vuelos_en_curso.stats()["coalesced"]
+    salidas_mb = almacen_salidas.disk_usage() / (1024 * 1024)
+    cola = planificador_api.stats()
+    return (
+        f"Caché: {aciertos} aciertos / {stats['misses']} fallos | Agrupadas: {agrupadas} | "
+        f"Salidas: {salidas_mb:.1f} MB | Cola API: {cola['queue_depth']} (espera media {cola['avg_wait']:.1f}s)"
+    )
+
+
+def _construir_prompt(prompt: str, estilo: str) -> str:
+    """Combina la descripción del usuario con el sufijo del estilo visual."""
+    estilo_prompt = ESTILOS.get(estilo, ESTILOS["📊 Infografía Profesional"])
+    # Normalizar espacios para que variaciones triviales compartan clave
+    prompt = " ".join(prompt.split())
+    return f"{prompt}, {estilo_prompt}, masterpiece, best quality, highly detailed"
+
+
+def _resolver_seed(seed: int) -> int:
+    """
+    Fija la semilla efectiva de una petición.
+    
+    Con seed = -1 se sortea una semilla nueva, una sola vez por petición, de
+    modo que el borrador y el render final usen exactamente la misma.
+    """
+    seed = int(seed)
+    if seed >= 0:
+        return seed
+    return random.randint(0, 2**31 - 1)
+
+
+def _claves_cache(prompt_completo: str, num_steps: int, guidance_scale: float, seed: int, num_variantes: int) -> list:
+    """Una clave de caché por variante; con una sola variante coincide con la clave base."""
+    if num_variantes == 1:
+        return [generation_key(prompt_completo, MODELO, num_steps, guidance_scale, seed, ANCHO, ALTO)]
+    return [
+        generation_key(prompt_completo, MODELO, num_steps, guidance_scale, seed, ANCHO, ALTO, n=num_variantes, variant=i)
+        for i in range(num_variantes)
+    ]
+
+
+def _buscar_en_cache(claves: list):
+    """Retorna los bytes de todas las variantes, o None si falta alguna."""
+    imagenes = []
+    with stage("cache_lookup"):
+        for clave in claves:
+            img_data = cache_resultados.get(clave)
+            if img_data is None:
+                return None
+            imagenes.append(img_data)
+    return imagenes
+
+
+def _guardar_en_cache(claves: list, imagenes: list):
+    with stage("cache_write"):
+        for clave, img_data in zip(claves, imagenes):
+            cache_resultados.put(clave, img_data)
+
+
+_indexado_lock = threading.Lock()
+
+
+def _indexar_cache():
+    """
+    Añade al índice de casi-duplicados las entradas de la caché que aún no tiene.
+    
+    Se ejecuta al buscar, no al generar: las peticiones no pagan el hash ni
+    reescribir el índice, y el archivo se guarda una vez por búsqueda con
+    entradas nuevas.
+    """
+    with _indexado_lock:
+        nuevas = [clave for clave in cache_resultados.keys() if clave not in indice_duplicados]
+        if not nuevas:
+            return
+        
+        def _hashes(clave):
+            img_data = cache_resultados.peek(clave)
+            try:
+                return clave, image_hashes(img_data) if img_data is not None else None
+            except (OSError, ValueError) as e:
+                print(f"⚠️ No se pudo indexar la imagen {clave[:12]}: {e}")
+                return clave, None
+        
+        with ThreadPoolExecutor(max_workers=MAX_VARIANTES) as pool:
+            for clave, hashes in pool.map(_hashes, nuevas):
+                if hashes is not None:
+                    indice_duplicados.add(clave, hashes)
+        indice_duplicados.save()
+
+
+def buscar_casi_duplicados(imagen, max_distancia: int = DEDUP_DISTANCIA) -> list:
+    """
+    Busca generaciones anteriores casi idénticas a una imagen.
+    
+    Permite reutilizar una imagen ya generada (y aún en caché) en lugar de
+    pedir otra casi igual a la API. Antes de buscar se indexan las entradas
+    de la caché añadidas desde la última búsqueda.
+    
+    Args:
+        imagen: Imagen PIL, ruta o bytes
+        max_distancia: Bits distintos permitidos entre hashes (de 64)
+    
+    Returns:
+        list: Tuplas (clave de caché, distancia), de la más parecida a la menos
+    """
+    _indexar_cache()
+    coincidencias = indice_duplicados.search(image_hashes(imagen), max_distancia)
+    return [(clave, distancia) for clave, distancia in coincidencias if clave in cache_resultados]
+
+
+def _llamar_api(prompt_completo: str, num_steps: int, guidance_scale: float, seed: int, num_variantes: int, claves: list) -> list:
+    """
+    Genera las variantes con el backend en una sola llamada y las guarda en caché.
+    
+    Returns:
+        list: Bytes de cada imagen recibida
+    """
+    with control_admision.running(num_steps, num_variantes):
+        imagenes = backend_generacion.generate(
+            prompt_completo, MODELO, num_steps, seed, num_variantes, ANCHO, ALTO, guidance_scale
+        )
+    _guardar_en_cache(claves[:len(imagenes)], imagenes)
+    return imagenes
+
+
+async def _llamar_api_async(prompt_completo: str, num_steps: int, guidance_scale: float, seed: int, num_variantes: int, claves: list) -> list:
+    """Versión asíncrona de _llamar_api."""
+    with control_admision.running(num_steps, num_variantes):
+        imagenes = await backend_generacion.generate_async(
+            prompt_completo, MODELO, num_steps, seed, num_variantes, ANCHO, ALTO, guidance_scale
+        )
+    await asyncio.to_thread(_guardar_en_cache, claves[:len(imagenes)], imagenes)
+    return imagenes
+
+
+def _buscar_en_cache_compartida(claves: list):
+    """Como _buscar_en_cache, pero sin contar fallos mientras otra réplica genera."""
+    if all(clave in cache_resultados for clave in claves):
+        return _buscar_en_cache(claves)
+    return None
+
+
+def _generar_una_vez(prompt_completo: str, num_steps: int, guidance_scale: float, seed: int, num_variantes: int, claves: list, prioridad: int) -> tuple:
+    """
+    Llama a la API a través del planificador. Con estado compartido, solo
+    una réplica genera cada clave y las demás recogen su resultado de la caché.
+    
+    Returns:
+        tuple: (lista de bytes, generado por otra réplica)
+    """
+    def _llamar():
+        return planificador_api.call(
+            _llamar_api, prompt_completo, num_steps, guidance_scale, seed, num_variantes, claves, priority=prioridad
+        )
+    
+    if concesiones is None:
+        return _llamar(), False
+    return concesiones.run(claves[0], _llamar, lambda: _buscar_en_cache_compartida(claves))
+
+
+async def _generar_una_vez_async(prompt_completo: str, num_steps: int, guidance_scale: float, seed: int, num_variantes: int, claves: list, prioridad: int) -> tuple:
+    """Versión asíncrona de _generar_una_vez."""
+    async def _llamar():
+        return await planificador_api.call_async(
+            _llamar_api_async, prompt_completo, num_steps, guidance_scale, seed, num_variantes, claves, priority=prioridad
+        )
+    
+    if concesiones is None:
+        return await _llamar(), False
+    return await concesiones.run_async(claves[0], _llamar, lambda: _buscar_en_cache_compartida(claves))
+
+
+def _mensaje_error(e: Exception) -> str:
+    """Traduce una excepción de la API a un mensaje para el usuario."""
+    error_msg = str(e)
+    if "401" in error_msg or "unauthorized" in error_msg.lower():
+        return "❌ API Key inválida. Verifica tu TOGETHER_API_KEY."
+    elif "429" in error_msg or "rate" in error_msg.lower():
+        return "⏳ Límite de API alcanzado. Espera unos segundos."
+    elif "insufficient" in error_msg.lower() or "balance" in error_msg.lower():
+        return "💰 Créditos agotados en Together AI."
+    else:
+        return f"❌ Error: {error_msg[:200]}"
+
+
+def _sin_resultado(mensaje: str) -> tuple:
+    return None, [], None, mensaje
+
+
+def _sin_resultado_interfaz(mensaje: str) -> tuple:
+    return None, [], None, None, [], mensaje
+
+
+def _finalizar(cronometro: RequestTimer, resultado: str, salida: tuple) -> tuple:
+    """Añade el desglose de tiempos al estado y cierra las métricas de la petición."""
+    *valores, estado = salida
+    estado = f"{estado} | {cronometro.summary()}"
+    cronometro.finish(resultado)
+    return (*valores, estado)
+
+
+def _mensaje_exito(origen: str, num_steps: int, guidance_scale: float, seed: int, num_variantes: int) -> str:
+    variantes = f" | Variantes: {num_variantes}" if num_variantes > 1 else ""
+    estado = f"{origen}{variantes} | Steps: {num_steps} | Guidance: {guidance_scale} | Seed: {seed}"
+    if origen == ORIGEN_CACHE:
+        estado = f"{estado} | {_resumen_cache()}"
+    return estado
+
+
+def _segundos(valor: float) -> str:
+    return f"{valor:.1f}s" if valor < 10 else f"{valor:.0f}s"
+
+
+def _estado_eta(transcurrido: float, eta: float) -> str:
+    """Tiempo restante según la estimación, para el estado durante la generación."""
+    if transcurrido < eta:
+        return f"~{_segundos(eta - transcurrido)} restantes de ~{_segundos(eta)}"
+    return f"{_segundos(transcurrido)}, más de lo estimado (~{_segundos(eta)})"
+
+
+def _con_aviso(estado: str, admision) -> str:
+    """Antepone al estado el aviso de una petición aligerada por carga alta."""
+    if admision is not None and admision.message:
+        return f"{admision.message} | {estado}"
+    return estado
+
+
+def estimar_tiempo(num_steps: int, num_variantes: int) -> str:
     """
-    Genera una imagen educativa usando Stable Diffusion XL via Together AI.
+    Tiempo estimado para los parámetros actuales, antes de generar.
+    
+    Args:
+        num_steps: Número de pasos de inferencia
+        num_variantes: Número de imágenes a generar
+    
+    Returns:
+        Texto Markdown con el tiempo estimado y el efecto del control de admisión
+    """
+    num_variantes = max(1, min(int(num_variantes or 1), MAX_VARIANTES))
+    admision = control_admision.evaluate(int(num_steps or PASOS_BORRADOR), num_variantes)
+    texto = f"⏱️ Tiempo estimado: ~{_segundos(admision.eta)}"
+    if admision.wait >= 1:
+        texto = f"{texto} (cola ~{_segundos(admision.wait)})"
+    if not admision.accepted:
+        texto = f"{texto} · ⚠️ Servicio saturado, inténtalo en unos segundos"
+    elif admision.message:
+        texto = f"{texto} · {admision.message}"
+    return texto
+
+
+def _admitir(prompt_completo: str, guidance_scale: float, num_steps: int, seed: int, num_variantes: int, claves: list) -> tuple:
+    """
+    Aplica el control de admisión a una petición interactiva.
+    
+    Las peticiones que ya están en caché se admiten siempre, sin estimación.
+    
+    Returns:
+        tuple: (Admission o None si está en caché, claves de los parámetros admitidos)
+    """
+    if all(clave in cache_resultados for clave in claves):
+        return None, claves
+    
+    admision = control_admision.decide(num_steps, num_variantes)
+    if admision.accepted and (admision.steps, admision.variants) != (int(num_steps), num_variantes):
+        claves = _claves_cache(prompt_completo, admision.steps, guidance_scale, seed, admision.variants)
+    return admision, claves
+
+
+def preparar_peticion(prompt: str, estilo: str, seed: int, num_variantes: int) -> tuple:
+    """
+    Normaliza la entrada del usuario.
+    
+    Returns:
+        tuple: (prompt completo, semilla efectiva, número de variantes)
+    """
+    prompt_completo = _construir_prompt(prompt, estilo)
+    seed = _resolver_seed(seed)
+    num_variantes = max(1, min(int(num_variantes), MAX_VARIANTES))
+    return prompt_completo, seed, num_variantes
+
+
+def _coincidencia_similar(
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed_pedida: int,
+    claves: list
+):
+    """
+    Busca la generación en caché de un prompt casi idéntico del mismo estilo.
+    
+    Solo se consideran generaciones con los mismos steps, guidance y número
+    de variantes, y con la misma semilla si el usuario fijó una. Si la
+    petición exacta ya está en caché no se busca nada.
+    
+    Returns:
+        tuple: (similitud, entrada del índice de prompts) o None si no hay coincidencia
+    """
+    if all(clave in cache_resultados for clave in claves):
+        return None
+    
+    def _aceptable(entrada: dict) -> bool:
+        return (
+            entrada["steps"] == int(num_steps)
+            and entrada["guidance"] == float(guidance_scale)
+            and len(entrada["claves"]) == len(claves)
+            and (seed_pedida < 0 or entrada["seed"] == seed_pedida)
+            and all(clave in cache_resultados for clave in entrada["claves"])
+        )
+    
+    return indice_prompts.query(estilo, prompt, accept=_aceptable)
+
+
+def _buscar_prompt_similar(
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed_pedida: int,
+    claves: list
+):
+    """
+    Recupera de caché el resultado de un prompt casi idéntico (ver _coincidencia_similar).
+    
+    Returns:
+        tuple: (lista de bytes, mensaje de estado) o None si no hay coincidencia
+    """
+    coincidencia = _coincidencia_similar(prompt, estilo, guidance_scale, num_steps, seed_pedida, claves)
+    if coincidencia is None:
+        return None
+    
+    similitud, entrada = coincidencia
+    imagenes = _buscar_en_cache(entrada["claves"])
+    if imagenes is None:
+        return None
+    
+    estado = (
+        f"♻️ Reutilizado de un prompt similar ({similitud:.0%}): «{entrada['prompt']}» | "
+        f"Steps: {num_steps} | Guidance: {guidance_scale} | Seed: {entrada['seed']}"
+    )
+    return imagenes, estado
+
+
+def buscar_sugerencia_similar(
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int = 1
+):
+    """
+    Busca un resultado en caché de un prompt casi idéntico para ofrecerlo como sugerencia.
+    
+    La interfaz no reemplaza la generación pedida: muestra la coincidencia
+    como un botón y el usuario decide si usarla (usar_sugerencia).
+    
+    Returns:
+        dict: Prompt, similitud, semilla, steps, guidance y claves de la
+            coincidencia, o None si no hay ninguna
+    """
+    if not prompt or not prompt.strip():
+        return None
+    prompt_completo, seed_final, num_variantes = preparar_peticion(prompt, estilo, seed, num_variantes)
+    claves = _claves_cache(prompt_completo, num_steps, guidance_scale, seed_final, num_variantes)
+    coincidencia = _coincidencia_similar(prompt, estilo, guidance_scale, num_steps, int(seed), claves)
+    if coincidencia is None:
+        return None
+    similitud, entrada = coincidencia
+    return {**entrada, "similitud": similitud}
+
+
+def usar_sugerencia(sugerencia: dict) -> tuple:
+    """
+    Muestra el resultado en caché de una sugerencia de buscar_sugerencia_similar.
+    
+    Returns:
+        tuple: Salidas de la interfaz, como generar_imagen_progresivo
+    """
+    if not sugerencia:
+        return _sin_resultado_interfaz("⚠️ No hay ninguna sugerencia disponible.")
+    
+    with request_timer("similar") as cronometro:
+        imagenes = _buscar_en_cache(sugerencia["claves"])
+        if imagenes is None:
+            return _finalizar(cronometro, "error", _sin_resultado_interfaz("⚠️ El resultado sugerido ya no está en caché."))
+        estado = (
+            f"♻️ Resultado de un prompt similar ({sugerencia['similitud']:.0%}): «{sugerencia['prompt']}» | "
+            f"Steps: {sugerencia['steps']} | Guidance: {sugerencia['guidance']} | Seed: {sugerencia['seed']}"
+        )
+        return _finalizar(cronometro, "similar", (*_empaquetar_para_interfaz(imagenes), estado))
+
+
+def _registrar_prompt(prompt: str, estilo: str, guidance_scale: float, num_steps: int, seed: int, claves: list):
+    """Añade una generación nueva al índice de prompts similares."""
+    indice_prompts.add(estilo, prompt, {
+        "prompt": " ".join(prompt.split()),
+        "steps": int(num_steps),
+        "guidance": float(guidance_scale),
+        "seed": int(seed),
+        "claves": claves,
+    })
+
+
+def _obtener_imagenes(
+    prompt_completo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int,
+    prioridad: int = PRIORITY_INTERACTIVE
+) -> tuple:
+    """
+    Obtiene los bytes de las variantes desde la caché o desde la API.
+    
+    Las llamadas a la API pasan por el planificador: esperan turno según su
+    prioridad y se reintentan con backoff si la API responde 429.
+    
+    Returns:
+        tuple: (lista de bytes o None si hubo error, origen o mensaje de error)
+    """
+    # Buscar en caché antes de llamar a la API
+    claves = _claves_cache(prompt_completo, num_steps, guidance_scale, seed, num_variantes)
+    imagenes = _buscar_en_cache(claves)
+    if imagenes is not None:
+        return imagenes, ORIGEN_CACHE
+    
+    # Verificar API Key
+    if not backend_generacion.is_configured():
+        return None, backend_generacion.not_configured_message
+    
+    try:
+        # Peticiones idénticas en vuelo (en este proceso o en otra réplica)
+        # comparten una sola llamada a la API
+        (imagenes, otra_replica), compartido = vuelos_en_curso.do(
+            claves[0], _generar_una_vez,
+            prompt_completo, num_steps, guidance_scale, seed, num_variantes, claves, prioridad
+        )
+    except Exception as e:
+        return None, _mensaje_error(e)
+    
+    if not imagenes:
+        return None, "❌ No se recibió imagen en la respuesta"
+    
+    return imagenes, ORIGEN_COMPARTIDO if compartido or otra_replica else ORIGEN_API
+
+
+async def _obtener_imagenes_async(
+    prompt_completo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int,
+    prioridad: int = PRIORITY_INTERACTIVE
+) -> tuple:
+    """Versión asíncrona de _obtener_imagenes."""
+    claves = _claves_cache(prompt_completo, num_steps, guidance_scale, seed, num_variantes)
+    imagenes = await asyncio.to_thread(_buscar_en_cache, claves)
+    if imagenes is not None:
+        return imagenes, ORIGEN_CACHE
+    
+    if not backend_generacion.is_configured():
+        return None, backend_generacion.not_configured_message
+    
+    try:
+        (imagenes, otra_replica), compartido = await vuelos_en_curso.do_async(
+            claves[0], _generar_una_vez_async,
+            prompt_completo, num_steps, guidance_scale, seed, num_variantes, claves, prioridad
+        )
+    except Exception as e:
+        return None, _mensaje_error(e)
+    
+    if not imagenes:
+        return None, "❌ No se recibió imagen en la respuesta"
+    
+    return imagenes, ORIGEN_COMPARTIDO if compartido or otra_replica else ORIGEN_API
+
+
+def generar_imagen(
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int = 1,
+    prioridad: int = PRIORITY_INTERACTIVE,
+    reutilizar_similares: bool = False
+) -> tuple:
+    """
+    Genera imágenes educativas usando Stable Diffusion XL via Together AI.
+    
+    Las peticiones repetidas (mismo prompt completo, modelo, steps, guidance,
+    seed y resolución) se sirven desde la caché sin llamar a la API. Todas
+    las variantes se piden en una sola llamada.
     
     Args:
         prompt: Descripción del contenido educativo
@@ -43,189 +757,507 @@ def generar_imagen(prompt: str, estilo: str, guidance_scale: float, num_steps: i
         guidance_scale: Control de adherencia al prompt (1-20)
         num_steps: Número de pasos de inferencia (10-50)
         seed: Semilla para reproducibilidad (-1 = aleatorio)
+        num_variantes: Número de imágenes a generar (1-4)
+        prioridad: Prioridad en la cola de la API (PRIORITY_BATCH para lotes)
+        reutilizar_similares: Servir desde caché el resultado de un prompt
+            casi idéntico del mismo estilo (mayúsculas, tildes, orden...)
     
     Returns:
-        tuple: (imagen, mensaje de estado)
+        tuple: (imagen, galería, cuadrícula comparativa, mensaje de estado)
     """
     if not prompt or not prompt.strip():
-        return None, "⚠️ Por favor, ingresa una descripción del contenido educativo."
+        return _sin_resultado("⚠️ Por favor, ingresa una descripción del contenido educativo.")
     
-    # Verificar API Key
-    api_key = os.environ.get("TOGETHER_API_KEY", "")
-    if not api_key:
-        return None, "❌ Error: API Key de Together AI no configurada. Añade TOGETHER_API_KEY en los Secrets del Space."
+    with request_timer("batch" if prioridad == PRIORITY_BATCH else "sync") as cronometro:
+        # Construir prompt completo
+        seed_pedida = int(seed)
+        prompt_completo, seed, num_variantes = preparar_peticion(prompt, estilo, seed, num_variantes)
+        claves = _claves_cache(prompt_completo, num_steps, guidance_scale, seed, num_variantes)
+        cronometro.fields.update(style=estilo, steps=int(num_steps), variants=num_variantes)
+        
+        if reutilizar_similares:
+            similar = _buscar_prompt_similar(prompt, estilo, guidance_scale, num_steps, seed_pedida, claves)
+            if similar is not None:
+                imagenes, estado = similar
+                return _finalizar(cronometro, "similar", (*_empaquetar_resultados(imagenes), estado))
+        
+        # Los lotes no pasan por el control de admisión: esperan su turno
+        admision = None
+        if prioridad == PRIORITY_INTERACTIVE:
+            admision, claves = _admitir(prompt_completo, guidance_scale, num_steps, seed, num_variantes, claves)
+            if admision is not None:
+                if not admision.accepted:
+                    return _finalizar(cronometro, "rejected", _sin_resultado(admision.message))
+                num_steps, num_variantes = admision.steps, admision.variants
+                cronometro.fields.update(eta_s=round(admision.eta, 3))
+        
+        imagenes, origen = _obtener_imagenes(prompt_completo, guidance_scale, num_steps, seed, num_variantes, prioridad)
+        if imagenes is None:
+            return _finalizar(cronometro, "error", _sin_resultado(origen))
+        
+        if origen == ORIGEN_API:
+            _registrar_prompt(prompt, estilo, guidance_scale, num_steps, seed, claves[:len(imagenes)])
+        
+        resultado = _empaquetar_resultados(imagenes)
+        estado = _con_aviso(_mensaje_exito(origen, num_steps, guidance_scale, seed, len(imagenes)), admision)
+        return _finalizar(cronometro, RESULTADO_METRICA[origen], (*resultado, estado))
+
+
+async def generar_imagen_async(
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int = 1,
+    reutilizar_similares: bool = False
+) -> tuple:
+    """
+    Versión asíncrona de generar_imagen para el bucle de eventos de Gradio.
     
-    # Construir prompt completo
-    estilo_prompt = ESTILOS.get(estilo, ESTILOS["📊 Infografía Profesional"])
-    prompt_completo = f"{prompt}, {estilo_prompt}, masterpiece, best quality, highly detailed"
+    La llamada a la API usa el cliente asíncrono compartido, de modo que las
+    generaciones en vuelo no ocupan un hilo mientras esperan la red. El
+    trabajo de disco y decodificación se delega a hilos auxiliares.
+    
+    Args:
+        prompt: Descripción del contenido educativo
+        estilo: Estilo visual seleccionado
+        guidance_scale: Control de adherencia al prompt (1-20)
+        num_steps: Número de pasos de inferencia (10-50)
+        seed: Semilla para reproducibilidad (-1 = aleatorio)
+        num_variantes: Número de imágenes a generar (1-4)
+        reutilizar_similares: Servir desde caché el resultado de un prompt casi idéntico
+    
+    Returns:
+        tuple: (imagen, galería, cuadrícula comparativa, mensaje de estado)
+    """
+    if not prompt or not prompt.strip():
+        return _sin_resultado("⚠️ Por favor, ingresa una descripción del contenido educativo.")
+    
+    cronometro = RequestTimer("async")
+    return await cronometro.run_async(
+        _generar_async, cronometro, prompt, estilo, guidance_scale, num_steps, seed, num_variantes, reutilizar_similares
+    )
+
+
+async def _generar_async(
+    cronometro: RequestTimer,
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int,
+    reutilizar_similares: bool
+) -> tuple:
+    """Cuerpo de generar_imagen_async, con `cronometro` como petición actual."""
+    seed_pedida = int(seed)
+    prompt_completo, seed, num_variantes = preparar_peticion(prompt, estilo, seed, num_variantes)
+    claves = _claves_cache(prompt_completo, num_steps, guidance_scale, seed, num_variantes)
+    cronometro.fields.update(style=estilo, steps=int(num_steps), variants=num_variantes)
+    
+    if reutilizar_similares:
+        similar = await asyncio.to_thread(_buscar_prompt_similar, prompt, estilo, guidance_scale, num_steps, seed_pedida, claves)
+        if similar is not None:
+            imagenes, estado = similar
+            resultado = await asyncio.to_thread(_empaquetar_resultados, imagenes)
+            return _finalizar(cronometro, "similar", (*resultado, estado))
+    
+    admision, claves = await asyncio.to_thread(_admitir, prompt_completo, guidance_scale, num_steps, seed, num_variantes, claves)
+    if admision is not None:
+        if not admision.accepted:
+            return _finalizar(cronometro, "rejected", _sin_resultado(admision.message))
+        num_steps, num_variantes = admision.steps, admision.variants
+        cronometro.fields.update(eta_s=round(admision.eta, 3))
+    
+    imagenes, origen = await _obtener_imagenes_async(prompt_completo, guidance_scale, num_steps, seed, num_variantes)
+    if imagenes is None:
+        return _finalizar(cronometro, "error", _sin_resultado(origen))
+    
+    if origen == ORIGEN_API:
+        await asyncio.to_thread(_registrar_prompt, prompt, estilo, guidance_scale, num_steps, seed, claves[:len(imagenes)])
     
+    resultado = await asyncio.to_thread(_empaquetar_resultados, imagenes)
+    estado = _con_aviso(_mensaje_exito(origen, num_steps, guidance_scale, seed, len(imagenes)), admision)
+    return _finalizar(cronometro, RESULTADO_METRICA[origen], (*resultado, estado))
+
+
+async def _obtener_borrador_async(cronometro: RequestTimer, prompt_completo: str, guidance_scale: float, num_steps: int, seed: int) -> tuple:
+    """
+    Pide el borrador con su propio desglose de tiempos.
+    
+    Sus etapas (cola, API...) se solapan con las del render final: sumarlas
+    al desglose de la petición daría más tiempo de API que total. A la
+    petición solo se le añade su duración como etapa "draft".
+    """
+    borrador = RequestTimer("borrador")
     try:
-        # Crear cliente de Together AI
-        client = Together(api_key=api_key)
-        
-        # Generar imagen con SDXL
-        response = client.images.generate(
-            prompt=prompt_completo,
-            model="stabilityai/stable-diffusion-xl-base-1.0",
-            steps=num_steps,
-            n=1,
-            width=1024,
-            height=1024
-        )
-        
-        if response.data and len(response.data) > 0:
-            # Obtener imagen en base64
-            img_b64 = response.data[0].b64_json
-            
-            if img_b64:
-                # Decodificar y guardar
-                img_data = base64.b64decode(img_b64)
-                img = Image.open(BytesIO(img_data))
-                
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-                img.save(temp_file.name)
-                
-                return temp_file.name, f"✅ Generado con SDXL | Steps: {num_steps} | Guidance: {guidance_scale}"
-            else:
-                # Si hay URL en lugar de base64
-                img_url = response.data[0].url
-                if img_url:
-                    import requests
-                    img_response = requests.get(img_url)
-                    img = Image.open(BytesIO(img_response.content))
-                    
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-                    img.save(temp_file.name)
-                    
-                    return temp_file.name, f"✅ Generado con SDXL | Steps: {num_steps}"
+        return await borrador.run_async(_obtener_imagenes_async, prompt_completo, guidance_scale, num_steps, seed, 1)
+    finally:
+        cronometro.add("draft", borrador.elapsed())
+
+
+async def generar_imagen_progresivo(
+    prompt: str,
+    estilo: str,
+    guidance_scale: float,
+    num_steps: int,
+    seed: int,
+    num_variantes: int = 1,
+    vista_previa: bool = True
+):
+    """
+    Generador para Gradio: muestra primero un borrador rápido y luego el render final.
+    
+    El borrador (PASOS_BORRADOR steps, misma semilla) y el render completo se
+    piden en paralelo; el borrador se muestra en cuanto llega y se reemplaza
+    por el resultado final. Mientras tanto el estado muestra el tiempo
+    restante según el modelo de latencia, y la petición pasa antes por el
+    control de admisión (puede rechazarse o aligerarse). Si Gradio cancela el evento (p. ej. porque el
+    usuario cambió el prompt), ambas llamadas pendientes se cancelan.
+    
+    Las imágenes se muestran como copias ligeras (EDUDIFF_DISPLAY_FORMAT) y
+    la galería con miniaturas; los PNG originales se ofrecen para descargar.
+    
+    Args:
+        prompt: Descripción del contenido educativo
+        estilo: Estilo visual seleccionado
+        guidance_scale: Control de adherencia al prompt (1-20)
+        num_steps: Número de pasos de inferencia (10-50)
+        seed: Semilla para reproducibilidad (-1 = aleatorio)
+        num_variantes: Número de imágenes a generar (1-4)
+        vista_previa: Mostrar el borrador antes del render final
+    
+    Yields:
+        tuple: (imagen, miniaturas de la galería, cuadrícula comparativa,
+                originales para descargar, copias de las variantes, mensaje de estado)
+    """
+    if not prompt or not prompt.strip():
+        yield _sin_resultado_interfaz("⚠️ Por favor, ingresa una descripción del contenido educativo.")
+        return
+    
+    # Un generador asíncrono puede reanudarse en otro contexto entre yields:
+    # cada etapa se ejecuta explícitamente con el cronómetro como petición actual
+    cronometro = RequestTimer("progresivo")
+    
+    prompt_completo, seed, num_variantes = preparar_peticion(prompt, estilo, seed, num_variantes)
+    claves = _claves_cache(prompt_completo, num_steps, guidance_scale, seed, num_variantes)
+    cronometro.fields.update(style=estilo, steps=int(num_steps), variants=num_variantes)
+    
+    admision, claves = await asyncio.to_thread(
+        cronometro.run, _admitir, prompt_completo, guidance_scale, num_steps, seed, num_variantes, claves
+    )
+    if admision is not None:
+        if not admision.accepted:
+            yield _finalizar(cronometro, "rejected", _sin_resultado_interfaz(admision.message))
+            return
+        num_steps, num_variantes = admision.steps, admision.variants
+        cronometro.fields.update(eta_s=round(admision.eta, 3))
+    
+    inicio = time.monotonic()
+    final = asyncio.create_task(cronometro.run_async(
+        _obtener_imagenes_async, prompt_completo, guidance_scale, num_steps, seed, num_variantes
+    ))
+    # Sin borrador si está desactivado, no ahorra tiempo o el final ya está en caché
+    borrador = None
+    if vista_previa and num_steps > PASOS_BORRADOR and admision is not None:
+        borrador = asyncio.create_task(_obtener_borrador_async(
+            cronometro, prompt_completo, guidance_scale, PASOS_BORRADOR, seed
+        ))
+    
+    try:
+        if admision is not None:
+            yield None, [], None, None, [], _con_aviso(f"⏳ Generando {num_steps} steps | Tiempo estimado ~{_segundos(admision.eta)}", admision)
         
-        return None, "❌ No se recibió imagen en la respuesta"
+        # Hasta el resultado final: mostrar el borrador cuando llegue y refrescar el tiempo restante
+        vista = None
+        pendientes = {tarea for tarea in (final, borrador) if tarea is not None}
+        while not final.done():
+            _, pendientes = await asyncio.wait(
+                pendientes, timeout=INTERVALO_ETA if admision is not None else None,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if final.done():
+                break
             
-    except Exception as e:
-        error_msg = str(e)
-        if "401" in error_msg or "unauthorized" in error_msg.lower():
-            return None, "❌ API Key inválida. Verifica tu TOGETHER_API_KEY."
-        elif "429" in error_msg or "rate" in error_msg.lower():
-            return None, "⏳ Límite de API alcanzado. Espera unos segundos."
-        elif "insufficient" in error_msg.lower() or "balance" in error_msg.lower():
-            return None, "💰 Créditos agotados en Together AI."
-        else:
-            return None, f"❌ Error: {error_msg[:200]}"
+            restante = _estado_eta(time.monotonic() - inicio, admision.eta)
+            if borrador is not None and borrador.done() and vista is None:
+                imagenes, _ = borrador.result()
+                if imagenes:
+                    vista = (await asyncio.wrap_future(codificador_vistas.submit(imagenes[0]))).display
+                    yield vista, [], None, None, [], f"👀 Borrador ({PASOS_BORRADOR} steps) | Render final de {num_steps} steps: {restante}"
+                    continue
+            yield vista, [], None, None, [], f"⏳ Generando {num_steps} steps | {restante}"
+        
+        imagenes, origen = await final
+        if imagenes is None:
+            yield _finalizar(cronometro, "error", _sin_resultado_interfaz(origen))
+            return
+        
+        if origen == ORIGEN_API:
+            await asyncio.to_thread(_registrar_prompt, prompt, estilo, guidance_scale, num_steps, seed, claves[:len(imagenes)])
+        
+        resultado = await asyncio.to_thread(cronometro.run, _empaquetar_para_interfaz, imagenes)
+        estado = _con_aviso(_mensaje_exito(origen, num_steps, guidance_scale, seed, len(imagenes)), admision)
+        yield _finalizar(cronometro, RESULTADO_METRICA[origen], (*resultado, estado))
+    
+    finally:
+        # Evento cancelado por Gradio antes del resultado final
+        if not final.done():
+            cronometro.finish("cancelled")
+        for tarea in (borrador, final):
+            if tarea is not None and not tarea.done():
+                tarea.cancel()
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # INTERFAZ DE USUARIO
 # ═══════════════════════════════════════════════════════════════════════════════
 
-with gr.Blocks() as demo:
+def crear_interfaz():
+    """
+    Construye la interfaz de Gradio.
+
+    gradio se importa aquí y no al cargar el módulo: src.batch, src.sweep y
+    las pruebas de carga usan las funciones de generación sin pagar el
+    arranque de la interfaz. `app.demo` la construye la primera vez que se
+    pide.
+
+    Returns:
+        gr.Blocks con la cola ya configurada
+    """
+    import gradio as gr
+
+    # delete_cache: Gradio también limpia sus copias de las salidas servidas
+    with gr.Blocks(delete_cache=(int(SALIDAS_TTL_MIN * 60), int(SALIDAS_TTL_MIN * 60))) as demo:
     
-    # Header
-    gr.Markdown("""
-    # 🎓 EduDiff XL
-    ### Generador de Material Educativo con Inteligencia Artificial
+        # Header
+        gr.Markdown("""
+        # 🎓 EduDiff XL
+        ### Generador de Material Educativo con Inteligencia Artificial
     
-    Crea imágenes educativas de alta calidad usando **Stable Diffusion XL** via Together AI.
-    """)
+        Crea imágenes educativas de alta calidad usando **Stable Diffusion XL** via Together AI.
+        """)
     
-    with gr.Row():
-        # Panel izquierdo - Controles
-        with gr.Column(scale=1):
-            gr.Markdown("### 📝 Configuración")
+        with gr.Row():
+            # Panel izquierdo - Controles
+            with gr.Column(scale=1):
+                gr.Markdown("### 📝 Configuración")
             
-            prompt_input = gr.Textbox(
-                label="Descripción del contenido",
-                placeholder="Ej: Diagrama de célula vegetal mostrando cloroplastos, vacuola central, pared celular y núcleo con etiquetas claras",
-                lines=4
-            )
+                prompt_input = gr.Textbox(
+                    label="Descripción del contenido",
+                    placeholder="Ej: Diagrama de célula vegetal mostrando cloroplastos, vacuola central, pared celular y núcleo con etiquetas claras",
+                    lines=4
+                )
             
-            estilo_input = gr.Dropdown(
-                choices=list(ESTILOS.keys()),
-                value="📊 Infografía Profesional",
-                label="Estilo visual"
-            )
+                estilo_input = gr.Dropdown(
+                    choices=list(ESTILOS.keys()),
+                    value="📊 Infografía Profesional",
+                    label="Estilo visual"
+                )
             
-            gr.Markdown("### ⚙️ Parámetros")
+                gr.Markdown("### ⚙️ Parámetros")
             
-            guidance_input = gr.Slider(
-                minimum=1.0,
-                maximum=20.0,
-                value=7.5,
-                step=0.5,
-                label="Guidance Scale (adherencia al prompt)",
-                info="Bajo (1-5): más creativo | Medio (6-9): balanceado | Alto (10+): más literal"
-            )
+                guidance_input = gr.Slider(
+                    minimum=1.0,
+                    maximum=20.0,
+                    value=7.5,
+                    step=0.5,
+                    label="Guidance Scale (adherencia al prompt)",
+                    info="Bajo (1-5): más creativo | Medio (6-9): balanceado | Alto (10+): más literal"
+                )
             
-            steps_input = gr.Slider(
-                minimum=10,
-                maximum=50,
-                value=25,
-                step=5,
-                label="Inference Steps (calidad)",
-                info="Más pasos = mejor calidad pero más lento"
-            )
+                steps_input = gr.Slider(
+                    minimum=10,
+                    maximum=50,
+                    value=25,
+                    step=5,
+                    label="Inference Steps (calidad)",
+                    info="Más pasos = mejor calidad pero más lento"
+                )
             
-            seed_input = gr.Number(
-                value=-1,
-                label="Seed (-1 = aleatorio)",
-                precision=0
-            )
+                seed_input = gr.Number(
+                    value=-1,
+                    label="Seed (-1 = aleatorio)",
+                    precision=0
+                )
+            
+                variantes_input = gr.Slider(
+                    minimum=1,
+                    maximum=MAX_VARIANTES,
+                    value=1,
+                    step=1,
+                    label="Variantes",
+                    info="Genera varias opciones en una sola petición para elegir la mejor"
+                )
+            
+                vista_previa_input = gr.Checkbox(
+                    value=True,
+                    label="⚡ Vista previa rápida",
+                    info=f"Muestra un borrador de {PASOS_BORRADOR} steps mientras termina el render final"
+                )
+            
+                reutilizar_input = gr.Checkbox(
+                    value=False,
+                    label="♻️ Sugerir resultados de prompts similares",
+                    info="Ofrece una imagen ya generada para un prompt casi idéntico, sin reemplazar la nueva"
+                )
             
-            generar_btn = gr.Button("🚀 Generar Imagen", variant="primary", size="lg")
+                eta_output = gr.Markdown(estimar_tiempo(25, 1))
             
-            gr.Markdown("""
-            ---
-            ### 💡 Consejos
-            - **Guidance 7-9**: Balance óptimo para contenido educativo
-            - **Steps 25-35**: Buena calidad sin esperar mucho
-            - Guarda el **seed** para reproducir resultados
-            """)
+                generar_btn = gr.Button("🚀 Generar Imagen", variant="primary", size="lg")
+            
+                gr.Markdown("""
+                ---
+                ### 💡 Consejos
+                - **Guidance 7-9**: Balance óptimo para contenido educativo
+                - **Steps 25-35**: Buena calidad sin esperar mucho
+                - Guarda el **seed** para reproducir resultados
+                """)
         
-        # Panel derecho - Resultado
-        with gr.Column(scale=1):
-            gr.Markdown("### 🖼️ Resultado")
+            # Panel derecho - Resultado
+            with gr.Column(scale=1):
+                gr.Markdown("### 🖼️ Resultado")
             
-            output_image = gr.Image(
-                label="Imagen Generada",
-                type="filepath",
-                height=500
-            )
+                output_image = gr.Image(
+                    label="Imagen Generada",
+                    type="filepath",
+                    height=500
+                )
             
-            status_output = gr.Textbox(
-                label="Estado",
-                interactive=False
-            )
+                galeria_output = gr.Gallery(
+                    label="Variantes",
+                    columns=4,
+                    height="auto",
+                    allow_preview=False
+                )
+            
+                cuadricula_output = gr.Image(
+                    label="Hoja comparativa",
+                    type="filepath"
+                )
+            
+                descargas_output = gr.File(
+                    label="Originales (PNG)",
+                    file_count="multiple"
+                )
+            
+                status_output = gr.Textbox(
+                    label="Estado",
+                    interactive=False
+                )
+            
+                # Resultado en caché de un prompt casi idéntico, solo si el usuario lo pide
+                sugerencia_btn = gr.Button(visible=False, variant="secondary", size="sm")
+            
+                # Copias de visualización de cada variante, para mostrarlas al elegir una miniatura
+                vistas_state = gr.State([])
+                sugerencia_state = gr.State(None)
     
-    # Ejemplos
-    gr.Markdown("### 📚 Ejemplos de uso")
-    gr.Examples(
-        examples=[
-            ["Diagrama de célula animal con núcleo, mitocondrias, ribosomas y membrana celular etiquetados", "🔬 Científico Detallado", 7.5, 30, -1],
-            ["Ciclo del agua mostrando evaporación, condensación, precipitación con flechas y etiquetas", "📊 Infografía Profesional", 8.0, 25, -1],
-            ["Sistema solar con los 8 planetas en orden, con nombres y tamaños relativos", "🎨 Ilustración Didáctica", 7.0, 25, -1],
-            ["Pirámide alimenticia con grupos de alimentos y porciones recomendadas", "📊 Infografía Profesional", 7.5, 25, -1],
-            ["Anatomía del corazón humano con aurículas, ventrículos y válvulas etiquetados", "🔬 Científico Detallado", 8.5, 35, -1],
-        ],
-        inputs=[prompt_input, estilo_input, guidance_input, steps_input, seed_input],
-        cache_examples=False
-    )
+        # Ejemplos
+        gr.Markdown("### 📚 Ejemplos de uso")
+        gr.Examples(
+            examples=[
+                ["Diagrama de célula animal con núcleo, mitocondrias, ribosomas y membrana celular etiquetados", "🔬 Científico Detallado", 7.5, 30, -1],
+                ["Ciclo del agua mostrando evaporación, condensación, precipitación con flechas y etiquetas", "📊 Infografía Profesional", 8.0, 25, -1],
+                ["Sistema solar con los 8 planetas en orden, con nombres y tamaños relativos", "🎨 Ilustración Didáctica", 7.0, 25, -1],
+                ["Pirámide alimenticia con grupos de alimentos y porciones recomendadas", "📊 Infografía Profesional", 7.5, 25, -1],
+                ["Anatomía del corazón humano con aurículas, ventrículos y válvulas etiquetados", "🔬 Científico Detallado", 8.5, 35, -1],
+            ],
+            inputs=[prompt_input, estilo_input, guidance_input, steps_input, seed_input],
+            cache_examples=False
+        )
     
-    # Footer
-    gr.Markdown("""
-    ---
-    **EduDiff XL** — Proyecto EA3: Generación de Contenido con IA Generativa
+        # Footer
+        gr.Markdown("""
+        ---
+        **EduDiff XL** — Proyecto EA3: Generación de Contenido con IA Generativa
     
-    Modelo: Stable Diffusion XL via Together AI | ⚠️ Verificar contenido antes de uso educativo
-    """)
+        Modelo: Stable Diffusion XL via Together AI | ⚠️ Verificar contenido antes de uso educativo
+        """)
     
-    # Evento de generación
-    generar_btn.click(
-        fn=generar_imagen,
-        inputs=[prompt_input, estilo_input, guidance_input, steps_input, seed_input],
-        outputs=[output_image, status_output]
-    )
+        # Evento de generación
+        evento_generar = generar_btn.click(
+            fn=generar_imagen_progresivo,
+            inputs=[prompt_input, estilo_input, guidance_input, steps_input, seed_input, variantes_input, vista_previa_input],
+            outputs=[output_image, galeria_output, cuadricula_output, descargas_output, vistas_state, status_output],
+            concurrency_limit=CONCURRENCIA
+        )
+        
+        # Elegir una miniatura muestra su variante en grande
+        def mostrar_variante(vistas: list, seleccion: gr.SelectData):
+            return vistas[seleccion.index] if seleccion.index < len(vistas) else gr.update()
+        
+        galeria_output.select(fn=mostrar_variante, inputs=vistas_state, outputs=output_image, queue=False)
+        
+        # Un prompt casi idéntico ya generado se ofrece como botón; la generación sigue su curso
+        def sugerir(prompt, estilo, guidance, steps, seed, variantes, activar):
+            sugerencia = buscar_sugerencia_similar(prompt, estilo, guidance, steps, seed, variantes) if activar else None
+            if sugerencia is None:
+                return gr.update(visible=False), None
+            texto = sugerencia["prompt"] if len(sugerencia["prompt"]) <= 60 else sugerencia["prompt"][:57] + "..."
+            return gr.update(visible=True, value=f"♻️ Ver resultado de «{texto}» ({sugerencia['similitud']:.0%})"), sugerencia
+        
+        generar_btn.click(
+            fn=sugerir,
+            inputs=[prompt_input, estilo_input, guidance_input, steps_input, seed_input, variantes_input, reutilizar_input],
+            outputs=[sugerencia_btn, sugerencia_state],
+            queue=False
+        )
+        sugerencia_btn.click(
+            fn=usar_sugerencia,
+            inputs=sugerencia_state,
+            outputs=[output_image, galeria_output, cuadricula_output, descargas_output, vistas_state, status_output],
+            cancels=[evento_generar]
+        )
+    
+        # Cambiar el prompt cancela el render en curso
+        prompt_input.change(fn=None, cancels=[evento_generar])
+        
+        # Tiempo estimado: al cambiar los parámetros y periódicamente (la cola cambia)
+        for control in (steps_input, variantes_input):
+            control.change(fn=estimar_tiempo, inputs=[steps_input, variantes_input], outputs=eta_output, queue=False)
+        gr.Timer(5).tick(fn=estimar_tiempo, inputs=[steps_input, variantes_input], outputs=eta_output, queue=False)
+
+    # Cola con concurrencia acotada: la espera de red se solapa en un único proceso
+    demo.queue(default_concurrency_limit=CONCURRENCIA, max_size=COLA_MAX)
+    return demo
+
+
+_interfaz = None
+
+
+def __getattr__(nombre: str):
+    # `app.demo` (Gradio en modo recarga, pruebas de carga) se construye al primer acceso
+    global _interfaz
+    if nombre == "demo":
+        if _interfaz is None:
+            _interfaz = crear_interfaz()
+        return _interfaz
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # INICIO
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def _precalentar():
+    """Prepara el backend en segundo plano para que la primera petición no pague su arranque."""
+    if not backend_generacion.is_configured():
+        return
+    inicio = time.perf_counter()
+    try:
+        backend_generacion.warmup(MODELO)
+    except Exception as e:
+        print(f"⚠️ No se pudo precalentar el backend: {e}")
+        return
+    print(f"🔥 Backend {backend_generacion.name} listo en {time.perf_counter() - inicio:.1f}s")
+
+
 if __name__ == "__main__":
+    if METRICAS_PUERTO:
+        start_metrics_server(METRICAS_PUERTO)
+        print(f"📈 Métricas en http://0.0.0.0:{METRICAS_PUERTO}/metrics")
+    if PRECALENTAR:
+        # Se solapa con la importación de gradio y la construcción de la interfaz
+        threading.Thread(target=_precalentar, name="edudiff-warmup", daemon=True).start()
+    demo = crear_interfaz()
     demo.launch()
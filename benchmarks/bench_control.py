@@ -0,0 +1,105 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Benchmark: preprocesado de ControlNet sin caché vs. con caché
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_control.py --count 16 --size 2048 --iterations 5
+#   python benchmarks/bench_control.py --dir bocetos/ --kinds canny,lineart
+#
+# Simula a un docente que prueba `--iterations` prompts sobre los mismos
+# bocetos. La referencia repite en cada iteración lo que hace el notebook
+# (Canny sobre la imagen original y LANCZOS completo a 1024x1024). src.control
+# procesa los bocetos en paralelo la primera vez y después los sirve desde caché.
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.cache import ResultCache  # noqa: E402
+from src.control import ControlPreprocessor, canny_map, lineart_map, _implementation  # noqa: E402
+
+
+def _bocetos_sinteticos(directorio: str, cantidad: int, lado: int) -> list:
+    """Bocetos de trazos negros sobre fondo blanco, proporción 4:3."""
+    rng = np.random.default_rng(0)
+    ancho, alto = lado, lado * 3 // 4
+    rutas = []
+    for i in range(cantidad):
+        imagen = Image.new("RGB", (ancho, alto), "white")
+        dibujo = ImageDraw.Draw(imagen)
+        for _ in range(30):
+            x0, x1 = sorted(rng.integers(0, ancho, 2))
+            y0, y1 = sorted(rng.integers(0, alto, 2))
+            dibujo.line((x0, y0, x1, y1), fill="black", width=int(rng.integers(2, 10)))
+            dibujo.ellipse((x0, y0, x1, y1), outline="black", width=4)
+        ruta = os.path.join(directorio, f"boceto_{i:03d}.png")
+        imagen.save(ruta)
+        rutas.append(ruta)
+    return rutas
+
+
+def _original(ruta: str, tipos: list):
+    """Flujo del notebook: mapa sobre la imagen original y después LANCZOS completo."""
+    imagen = Image.open(ruta).convert("RGB")
+    for tipo in tipos:
+        mapa = canny_map(imagen) if tipo == "canny" else lineart_map(imagen)
+        mapa.resize((1024, 1024), Image.LANCZOS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocesado de ControlNet: sin caché vs. con caché")
+    parser.add_argument("--count", type=int, default=16, help="Bocetos sintéticos")
+    parser.add_argument("--size", type=int, default=2048, help="Ancho de los bocetos sintéticos")
+    parser.add_argument("--dir", help="Usar los bocetos de este directorio en lugar de sintéticos")
+    parser.add_argument("--iterations", type=int, default=5, help="Prompts probados sobre cada boceto")
+    parser.add_argument("--kinds", default="canny", help="Mapas separados por comas")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos del preprocesado por lotes")
+    args = parser.parse_args()
+
+    tipos = [tipo.strip() for tipo in args.kinds.split(",") if tipo.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            rutas = sorted(glob.glob(os.path.join(args.dir, "*.png")) + glob.glob(os.path.join(args.dir, "*.jpg")))
+        else:
+            print(f"Generando {args.count} bocetos de {args.size}px...")
+            rutas = _bocetos_sinteticos(tmp, args.count, args.size)
+
+        print(f"{len(rutas)} bocetos | mapas: {', '.join(tipos)} | {args.iterations} iteraciones | Canny con {_implementation('canny')}\n")
+
+        inicio = time.perf_counter()
+        for _ in range(args.iterations):
+            for ruta in rutas:
+                _original(ruta, tipos)
+        base = time.perf_counter() - inicio
+        print(f"{'Original (cada iteración)':<36} {base:>8.2f}s")
+
+        preprocesador = ControlPreprocessor(
+            cache=ResultCache(os.path.join(tmp, "cache")), num_workers=args.workers
+        )
+        tiempos = []
+        for _ in range(args.iterations):
+            inicio = time.perf_counter()
+            for mapas in preprocesador.process_batch(rutas, tipos):
+                # Decodificar lo que vendría de caché, como haría el pipeline
+                for imagen in mapas.values():
+                    imagen.load()
+            tiempos.append(time.perf_counter() - inicio)
+        total = sum(tiempos)
+        print(f"{'src.control (primera iteración)':<36} {tiempos[0]:>8.2f}s")
+        print(f"{'src.control (siguientes, media)':<36} {np.mean(tiempos[1:]) if len(tiempos) > 1 else 0:>8.2f}s")
+        print(f"{'src.control (total)':<36} {total:>8.2f}s")
+
+        print(f"\nAceleración: {base / total:.1f}x en total | {base / args.iterations / tiempos[0]:.1f}x en la primera iteración")
+
+
+if __name__ == "__main__":
+    main()
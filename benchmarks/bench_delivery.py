@@ -0,0 +1,116 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Benchmark: formato de las copias que se envían al navegador
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_delivery.py
+#   python benchmarks/bench_delivery.py --images results/portfolio --variants 4 --workers 4
+#   python benchmarks/bench_delivery.py --qualities 75 85 95
+#
+# Para cada formato y calidad codifica las copias de visualización y las
+# miniaturas (src.delivery) de `--variants` imágenes PNG, en serie (un hilo)
+# y con el pool de `--workers` hilos. Reporta los KB que recibe el navegador
+# frente al PNG original y el tiempo hasta tener todas las copias. Sin
+# `--images` usa imágenes sintéticas de 1024x1024 con degradados, texto y grano.
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import statistics
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.delivery import DISPLAY_FORMATS, DeliveryEncoder  # noqa: E402
+from src.storage import OutputStore  # noqa: E402
+
+
+def imagen_sintetica(indice: int, lado: int = 1024) -> bytes:
+    """PNG con degradado, formas, texto y grano, parecido a una lámina educativa."""
+    imagen = Image.linear_gradient("L").resize((lado, lado)).convert("RGB")
+    dibujo = ImageDraw.Draw(imagen)
+    for i in range(12):
+        x, y = (indice * 97 + i * 173) % lado, (indice * 61 + i * 131) % lado
+        dibujo.ellipse((x, y, x + lado // 6, y + lado // 6), fill=((i * 40) % 256, 120, (indice * 70) % 256), outline="black", width=4)
+        dibujo.text((x + 10, y + lado // 12), f"Etiqueta {i}", fill="white")
+    # Grano como el de un render real (un PNG de formas planas comprime demasiado bien)
+    ruido = Image.effect_noise((lado, lado), 24).convert("RGB")
+    imagen = Image.blend(imagen, ruido, 0.15)
+    salida = BytesIO()
+    imagen.save(salida, format="PNG")
+    return salida.getvalue()
+
+
+def cargar_imagenes(directorio: str, cantidad: int) -> list:
+    """PNG del directorio (o sintéticos si no se indica), repitiendo hasta `cantidad`."""
+    if not directorio:
+        return [imagen_sintetica(i) for i in range(cantidad)]
+    rutas = sorted(glob.glob(os.path.join(directorio, "*.png")))
+    if not rutas:
+        raise SystemExit(f"❌ No hay imágenes PNG en {directorio}")
+    imagenes = []
+    for i in range(cantidad):
+        with open(rutas[i % len(rutas)], 'rb') as f:
+            imagenes.append(f.read())
+    return imagenes
+
+
+def medir(formato: str, calidad: int, imagenes: list, hilos: int, args) -> dict:
+    """Codifica las copias de todas las imágenes y retorna tamaños y mediana de tiempos."""
+    tiempos, ultimo = [], {}
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            codificador = DeliveryEncoder(
+                OutputStore(tmp), display_format=formato, quality=calidad,
+                max_side=args.max_side, thumbnail_side=args.thumb_side, num_workers=hilos
+            )
+            inicio = time.perf_counter()
+            for pendiente in [codificador.submit(data) for data in imagenes]:
+                pendiente.result()
+            tiempos.append(time.perf_counter() - inicio)
+            ultimo = codificador.stats()
+    return {
+        "ms": statistics.median(tiempos) * 1000,
+        "display_kb": ultimo["display_bytes"] / len(imagenes) / 1024,
+        "thumb_kb": ultimo["thumbnail_bytes"] / len(imagenes) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copias de visualización: bytes y tiempo de codificación por formato")
+    parser.add_argument("--images", help="Directorio con PNG (por defecto, imágenes sintéticas)")
+    parser.add_argument("--variants", type=int, default=4, help="Imágenes por resultado")
+    parser.add_argument("--formats", nargs="+", default=list(DISPLAY_FORMATS), choices=list(DISPLAY_FORMATS))
+    parser.add_argument("--qualities", nargs="+", type=int, default=[85])
+    parser.add_argument("--workers", type=int, default=4, help="Hilos del pool")
+    parser.add_argument("--max-side", type=int, default=1024)
+    parser.add_argument("--thumb-side", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se reporta la mediana)")
+    args = parser.parse_args()
+
+    imagenes = cargar_imagenes(args.images, args.variants)
+    original_kb = sum(len(data) for data in imagenes) / len(imagenes) / 1024
+    print(f"{len(imagenes)} imágenes | PNG original {original_kb:.0f} KB de media | "
+          f"copia ≤{args.max_side}px, miniatura ≤{args.thumb_side}px\n")
+
+    print(f"{'Formato':<10} {'calidad':>7} {'copia KB':>9} {'mini KB':>8} {'ahorro':>7} "
+          f"{'1 hilo ms':>10} {f'{args.workers} hilos ms':>11} {'acel.':>6}")
+    print("-" * 75)
+    for formato in args.formats:
+        # La calidad no afecta a PNG
+        for calidad in (args.qualities if formato != "png" else args.qualities[:1]):
+            serie = medir(formato, calidad, imagenes, 1, args)
+            pool = medir(formato, calidad, imagenes, args.workers, args)
+            ahorro = 1 - serie["display_kb"] / original_kb
+            print(f"{formato:<10} {calidad if formato != 'png' else '-':>7} {serie['display_kb']:>9.0f} "
+                  f"{serie['thumb_kb']:>8.1f} {ahorro:>7.0%} {serie['ms']:>10.0f} {pool['ms']:>11.0f} "
+                  f"{serie['ms'] / pool['ms']:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Benchmark: cuadrícula en memoria vs. cuadrícula por franjas
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_grid.py --count 50 --size 1024 --cols 10
+#   python benchmarks/bench_grid.py --count 50 --tile 256
+#
+# Compara create_image_grid (todas las imágenes abiertas y la hoja completa
+# en RAM) con build_grid_streaming. Cada variante se ejecuta en un proceso
+# nuevo para medir su memoria residente máxima por separado.
+
+import os
+import sys
+import math
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.grid import build_grid_streaming  # noqa: E402
+from src.utils import create_image_grid  # noqa: E402
+
+
+def _imagenes_sinteticas(directorio: str, count: int, size: int) -> list:
+    """Escribe `count` PNG sintéticos (gradiente + ruido) y retorna sus rutas."""
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, size, dtype=np.float32)
+    gradiente = np.stack([np.add.outer(base, base) / 2] * 3, axis=-1)
+    plantilla = Image.fromarray(np.clip(gradiente + rng.normal(0, 25, gradiente.shape), 0, 255).astype(np.uint8))
+
+    rutas = []
+    for i in range(count):
+        ruta = os.path.join(directorio, f"img_{i:05d}.png")
+        plantilla.save(ruta, compress_level=1)
+        rutas.append(ruta)
+    return rutas
+
+
+def _en_memoria(rutas, salida, cols, tile):
+    imagenes = [Image.open(r).convert("RGB") for r in rutas]
+    if tile:
+        imagenes = [img.resize((tile, tile), Image.LANCZOS) for img in imagenes]
+    grid = create_image_grid(imagenes, rows=math.ceil(len(rutas) / cols), cols=cols)
+    grid.save(salida)
+
+
+def _por_franjas(rutas, salida, cols, tile):
+    build_grid_streaming(rutas, salida, cols=cols, tile_size=(tile, tile) if tile else None)
+
+
+def _medir(fn, rutas, salida, cols, tile, resultado):
+    start = time.perf_counter()
+    fn(rutas, salida, cols, tile)
+    # ru_maxrss está en KB en Linux
+    resultado.put((time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def _ejecutar(nombre, fn, rutas, salida, cols, tile):
+    resultado = multiprocessing.Queue()
+    proceso = multiprocessing.Process(target=_medir, args=(fn, rutas, salida, cols, tile, resultado))
+    proceso.start()
+    segundos, pico_mb = resultado.get()
+    proceso.join()
+    size_mb = os.path.getsize(salida) / (1024 * 1024)
+    print(f"{nombre:<24} {segundos:8.2f} s | pico RSS {pico_mb:8.1f} MB | archivo {size_mb:6.1f} MB")
+    return segundos, pico_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cuadrícula en memoria vs. por franjas")
+    parser.add_argument("--count", type=int, default=50, help="Imágenes sintéticas")
+    parser.add_argument("--size", type=int, default=1024, help="Lado de las imágenes")
+    parser.add_argument("--cols", type=int, default=10, help="Columnas de la cuadrícula")
+    parser.add_argument("--tile", type=int, default=0, help="Lado de cada celda (0 = tamaño original)")
+    args = parser.parse_args()
+
+    # fork heredaría la memoria del proceso padre y falsearía el pico
+    multiprocessing.set_start_method("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generando {args.count} imágenes de {args.size}x{args.size}...")
+        rutas = _imagenes_sinteticas(tmp, args.count, args.size)
+        print()
+
+        _, pico_base = _ejecutar("En memoria (original)", _en_memoria, rutas, os.path.join(tmp, "a.png"), args.cols, args.tile)
+        _, pico_franjas = _ejecutar("Por franjas", _por_franjas, rutas, os.path.join(tmp, "b.png"), args.cols, args.tile)
+
+        print(f"\nMemoria pico: {pico_base / pico_franjas:.1f}x menor")
+
+
+if __name__ == "__main__":
+    main()
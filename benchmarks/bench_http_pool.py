@@ -0,0 +1,82 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Micro-benchmark: cliente por petición vs. cliente compartido
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_http_pool.py --requests 200
+#
+# Levanta src.stub_server (imita el endpoint de imágenes de Together AI)
+# y mide el overhead por petición de:
+#   - antes:   Together(api_key=...) nuevo + requests.get() sin sesión
+#   - después: cliente Together compartido + sesión HTTP con keep-alive
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import requests
+from together import Together
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.clients import get_together_client, download_bytes  # noqa: E402
+from src.stub_server import StubServer  # noqa: E402
+
+
+def _medir(fn, n: int) -> list:
+    tiempos = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - start) * 1000)
+    return tiempos
+
+
+def _resumen(nombre: str, tiempos: list):
+    tiempos = sorted(tiempos)
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+    print(f"{nombre:<28} media {statistics.mean(tiempos):7.2f} ms | p50 {statistics.median(tiempos):7.2f} ms | p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead por petición del cliente HTTP")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    args = parser.parse_args()
+
+    server = StubServer(image_size=1).start()
+    base_url = server.base_url
+    os.environ["TOGETHER_BASE_URL"] = base_url
+    image_url = base_url.replace("/v1", "/images/0/0.png")
+
+    def generar_antes():
+        client = Together(api_key="stub")
+        client.images.generate(prompt="x", model="stub", n=1)
+        client.close()
+
+    def descargar_antes():
+        requests.get(image_url)
+
+    def generar_despues():
+        client = get_together_client("stub")
+        client.images.generate(prompt="x", model="stub", n=1)
+
+    def descargar_despues():
+        download_bytes(image_url)
+
+    # Calentamiento
+    generar_despues()
+    descargar_despues()
+
+    print(f"Servidor local: {base_url} | {args.requests} peticiones por escenario\n")
+    _resumen("API (antes)", _medir(generar_antes, args.requests))
+    _resumen("API (después)", _medir(generar_despues, args.requests))
+    _resumen("Descarga URL (antes)", _medir(descargar_antes, args.requests))
+    _resumen("Descarga URL (después)", _medir(descargar_despues, args.requests))
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Benchmark: métricas de calidad por imagen vs. por lotes
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_quality.py --count 2000 --size 1024
+#   python benchmarks/bench_quality.py --dir results/portfolio
+#
+# Compara calculate_image_quality_score (una imagen cada vez) con
+# calculate_image_quality_scores (lote vectorizado), a resolución completa
+# y sobre una copia reducida.
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.utils import calculate_image_quality_score, calculate_image_quality_scores  # noqa: E402
+
+
+def _imagenes_sinteticas(directorio: str, count: int, size: int) -> list:
+    """Escribe `count` PNG sintéticos (gradiente + ruido) y retorna sus rutas."""
+    rng = np.random.default_rng(0)
+    base = np.linspace(0, 255, size, dtype=np.float32)
+    gradiente = np.stack([np.add.outer(base, base) / 2] * 3, axis=-1)
+
+    # Unas pocas plantillas distintas reutilizadas para no tardar en generarlas
+    plantillas = []
+    for _ in range(min(count, 8)):
+        ruido = rng.normal(0, 25, gradiente.shape)
+        plantillas.append(Image.fromarray(np.clip(gradiente + ruido, 0, 255).astype(np.uint8)))
+
+    rutas = []
+    for i in range(count):
+        ruta = os.path.join(directorio, f"img_{i:05d}.png")
+        plantillas[i % len(plantillas)].save(ruta, compress_level=1)
+        rutas.append(ruta)
+    return rutas
+
+
+def _cronometrar(nombre: str, fn, count: int) -> float:
+    start = time.perf_counter()
+    fn()
+    total = time.perf_counter() - start
+    print(f"{nombre:<36} {total:8.2f} s | {count / total:8.1f} img/s")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Métricas de calidad: por imagen vs. por lotes")
+    parser.add_argument("--count", type=int, default=2000, help="Imágenes sintéticas a generar")
+    parser.add_argument("--size", type=int, default=1024, help="Lado de las imágenes sintéticas")
+    parser.add_argument("--dir", help="Usar las imágenes de este directorio en lugar de sintéticas")
+    parser.add_argument("--max-side", type=int, default=256, help="Lado máximo de la copia reducida")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            rutas = sorted(glob.glob(os.path.join(args.dir, "**", "*.png"), recursive=True))
+        else:
+            print(f"Generando {args.count} imágenes de {args.size}x{args.size}...")
+            rutas = _imagenes_sinteticas(tmp, args.count, args.size)
+
+        print(f"{len(rutas)} imágenes\n")
+
+        base = _cronometrar(
+            "Por imagen (original)",
+            lambda: [calculate_image_quality_score(Image.open(r)) for r in rutas],
+            len(rutas)
+        )
+        lote = _cronometrar(
+            "Lote vectorizado",
+            lambda: calculate_image_quality_scores(rutas),
+            len(rutas)
+        )
+        reducido = _cronometrar(
+            f"Lote vectorizado (max_side={args.max_side})",
+            lambda: calculate_image_quality_scores(rutas, max_side=args.max_side),
+            len(rutas)
+        )
+
+        print(f"\nAceleración: {base / lote:.1f}x (completo) | {base / reducido:.1f}x (reducido)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Benchmark: varias réplicas de app.py contra un mismo plan de API
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_replicas.py
+#   python benchmarks/bench_replicas.py --replicas 4 --requests 16 --unique 12 --quota-per-min 120
+#
+# Levanta un src.stub_server con un límite de tasa real (`--quota-per-min`,
+# común a todos los clientes, como el plan de Together) y lanza `--replicas`
+# procesos de app.py a la vez. Cada uno pide `--requests` generaciones
+# elegidas entre los mismos `--unique` prompts y cree tener el plan entero
+# para sí (EDUDIFF_RATE_PER_MIN = cuota). Modos:
+#   - independientes: caché y cubeta por réplica (sin EDUDIFF_SHARED_STATE)
+#   - compartido:     EDUDIFF_SHARED_STATE y caché en el mismo directorio
+#
+# Reporta las llamadas que recibe la API, cuántas se pagaron (200), los 429
+# y el tiempo total.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.stub_server import StubServer  # noqa: E402
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Se ejecuta en cada réplica; imprime el resumen como JSON en la última línea
+_SCRIPT_REPLICA = r"""
+import json, random, sys, time
+from concurrent.futures import ThreadPoolExecutor
+import app
+
+replica, peticiones, unicos, concurrencia = {replica}, {peticiones}, {unicos}, {concurrencia}
+rng = random.Random(replica)
+prompts = [f"Diagrama educativo número {{rng.randrange(unicos)}}" for _ in range(peticiones)]
+
+def pedir(prompt):
+    estado = app.generar_imagen(prompt, "📊 Infografía Profesional", 7.5, 20, 1, 1)[-1]
+    return estado.split(" | ")[0]
+
+inicio = time.perf_counter()
+with ThreadPoolExecutor(concurrencia) as pool:
+    estados = list(pool.map(pedir, prompts))
+origenes = {{}}
+for estado in estados:
+    origenes[estado] = origenes.get(estado, 0) + 1
+print(json.dumps({{
+    "elapsed": time.perf_counter() - inicio,
+    "origins": origenes,
+    "retries": app.planificador_api.stats()["retries"],
+}}))
+"""
+
+
+def _entorno(tmp: str, replica: int, compartido: bool, stub: StubServer, args) -> Dict[str, str]:
+    env = dict(os.environ)
+    for nombre in ("EDUDIFF_METRICS_PORT", "EDUDIFF_SHARED_STATE", "EDUDIFF_CACHE_DIR"):
+        env.pop(nombre, None)
+    env.update({
+        "EDUDIFF_BACKEND": "together",
+        "TOGETHER_API_KEY": "stub",
+        "TOGETHER_BASE_URL": stub.base_url,
+        "EDUDIFF_RATE_PER_MIN": str(args.quota_per_min),
+        "EDUDIFF_RATE_BURST": str(args.quota_burst),
+        "EDUDIFF_MAX_RETRIES": str(args.max_retries),
+        "EDUDIFF_WARMUP": "0",
+        "EDUDIFF_OUTPUT_DIR": os.path.join(tmp, f"salidas_{replica}"),
+    })
+    if compartido:
+        env["EDUDIFF_SHARED_STATE"] = os.path.join(tmp, "estado.db")
+    else:
+        env["EDUDIFF_CACHE_DIR"] = os.path.join(tmp, f"cache_{replica}")
+    return env
+
+
+def ejecutar(compartido: bool, stub: StubServer, args) -> dict:
+    """Lanza las réplicas a la vez y retorna el resumen del modo."""
+    antes = stub.stats()
+    with tempfile.TemporaryDirectory() as tmp:
+        inicio = time.perf_counter()
+        procesos = [
+            subprocess.Popen(
+                [sys.executable, "-c", _SCRIPT_REPLICA.format(
+                    replica=i, peticiones=args.requests, unicos=args.unique, concurrencia=args.concurrency
+                )],
+                cwd=RAIZ, env=_entorno(tmp, i, compartido, stub, args),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+            )
+            for i in range(args.replicas)
+        ]
+        replicas: List[dict] = []
+        for proceso in procesos:
+            salida, errores = proceso.communicate()
+            if proceso.returncode != 0:
+                raise RuntimeError(f"Una réplica falló:\n{errores}")
+            replicas.append(json.loads(salida.strip().splitlines()[-1]))
+        total = time.perf_counter() - inicio
+
+    despues = stub.stats()
+    llamadas = despues["requests"] - antes["requests"]
+    rechazadas = despues["rate_limited"] - antes["rate_limited"]
+    errores = despues["errors"] - antes["errors"]
+    origenes: Dict[str, int] = {}
+    for replica in replicas:
+        for origen, cantidad in replica["origins"].items():
+            origenes[origen] = origenes.get(origen, 0) + cantidad
+    return {
+        "api_calls": llamadas,
+        "paid": llamadas - rechazadas - errores,
+        "rate_limited": rechazadas,
+        "elapsed": total,
+        "origins": origenes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplicas de app.py con estado independiente vs. compartido")
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=16, help="Peticiones por réplica")
+    parser.add_argument("--unique", type=int, default=12, help="Prompts distintos entre todas las réplicas")
+    parser.add_argument("--concurrency", type=int, default=4, help="Peticiones simultáneas por réplica")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latencia de cada generación del stub (s)")
+    parser.add_argument("--quota-per-min", type=float, default=120, help="Límite de tasa del plan (llamadas/min)")
+    parser.add_argument("--quota-burst", type=float, default=4, help="Ráfaga del plan")
+    parser.add_argument("--max-retries", type=int, default=8, help="EDUDIFF_MAX_RETRIES de las réplicas")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    stub = StubServer(latency=args.latency, quota_per_min=args.quota_per_min, quota_burst=args.quota_burst).start()
+    print(f"🧪 {args.replicas} réplicas × {args.requests} peticiones sobre {args.unique} prompts distintos | "
+          f"plan de {args.quota_per_min:g} llamadas/min (ráfaga {args.quota_burst:g})\n")
+
+    resultados = {}
+    try:
+        for modo, compartido in (("independientes", False), ("compartido", True)):
+            # Que la cuota del stub se recupere de la ronda anterior
+            time.sleep(args.quota_burst / (args.quota_per_min / 60.0))
+            resultados[modo] = ejecutar(compartido, stub, args)
+    finally:
+        stub.stop()
+
+    peticiones = args.replicas * args.requests
+    print(f"{'Modo':<16} {'llamadas':>9} {'pagadas':>8} {'429':>6} {'tiempo s':>9} {'req/s':>7}")
+    print("-" * 60)
+    for modo, r in resultados.items():
+        print(f"{modo:<16} {r['api_calls']:>9} {r['paid']:>8} {r['rate_limited']:>6} "
+              f"{r['elapsed']:>9.2f} {peticiones / r['elapsed']:>7.2f}")
+    for modo, r in resultados.items():
+        print(f"\n{modo}: " + " · ".join(f"{origen} ×{cantidad}" for origen, cantidad in sorted(r["origins"].items())))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": resultados}, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Perfil de arranque: importaciones y tiempo hasta la primera petición
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --runs 5 --top 20 --json arranque.json
+#   python benchmarks/bench_startup.py --max-import-s 1.0 --max-first-request-s 8
+#
+# Cada medición se hace en un intérprete nuevo con el backend stub (latencia
+# 0) y directorios de caché vacíos, como un Space que despierta:
+#   1. Desglose de `python -X importtime -c "import app"` por paquete.
+#   2. Fases del arranque: importar app, construir la interfaz (con el
+#      precalentamiento del backend en paralelo, igual que `python app.py`),
+#      la primera petición y una segunda ya en caliente. "Hasta la primera
+#      petición" se mide desde que se lanza el proceso, sin servidor HTTP.
+#
+# Con --max-import-s / --max-first-request-s termina con código 1 si la
+# mediana supera el límite, para detectar regresiones.
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Se ejecuta en el proceso hijo; imprime las fases como JSON en la última línea
+_SCRIPT_FASES = r"""
+import json, sys, time, threading
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+if app.PRECALENTAR:
+    threading.Thread(target=app._precalentar, daemon=True).start()
+interfaz = {interfaz}
+if interfaz:
+    app.crear_interfaz()
+t2 = time.perf_counter()
+app.generar_imagen("Diagrama del ciclo del agua con flechas", "📊 Infografía Profesional", 7.5, 25, 1, 1)
+t3 = time.perf_counter()
+fin_primera = time.time()
+app.generar_imagen("Diagrama del ciclo del carbono con flechas", "📊 Infografía Profesional", 7.5, 25, 2, 1)
+t4 = time.perf_counter()
+print(json.dumps({{
+    "import_app": t1 - t0,
+    "interface": t2 - t1,
+    "first_request": t3 - t2,
+    "second_request": t4 - t3,
+    "first_request_wall": fin_primera,
+    "modules": sorted(m for m in ("gradio", "together", "torch", "diffusers") if m in sys.modules),
+}}))
+"""
+
+
+def _entorno(tmp: str, warmup: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.pop("EDUDIFF_METRICS_PORT", None)
+    env.update({
+        "EDUDIFF_BACKEND": "stub",
+        "EDUDIFF_STUB_LATENCY": "0",
+        "EDUDIFF_STUB_LATENCY_PER_STEP": "0",
+        "EDUDIFF_CACHE_DIR": os.path.join(tmp, "cache"),
+        "EDUDIFF_OUTPUT_DIR": os.path.join(tmp, "outputs"),
+        "EDUDIFF_WARMUP": "1" if warmup else "0",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def _desglose_importaciones(salida: str) -> Dict[str, float]:
+    """
+    Suma el tiempo propio de cada módulo por paquete raíz.
+
+    Args:
+        salida: stderr de `python -X importtime`
+
+    Returns:
+        Segundos por paquete (la suma es el tiempo total de importación)
+    """
+    por_paquete: Dict[str, float] = {}
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, _, modulo = linea[len("import time:"):].split("|")
+        raiz = modulo.strip().split(".")[0]
+        por_paquete[raiz] = por_paquete.get(raiz, 0.0) + int(propio) / 1e6
+    return por_paquete
+
+
+def medir_importaciones(runs: int) -> Dict[str, float]:
+    """Mediana por paquete del desglose de `import app` en `runs` procesos nuevos."""
+    muestras: List[Dict[str, float]] = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            resultado = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import app"],
+                cwd=RAIZ, env=_entorno(tmp, warmup=False), capture_output=True, text=True, check=True
+            )
+        muestras.append(_desglose_importaciones(resultado.stderr))
+
+    paquetes = {nombre for muestra in muestras for nombre in muestra}
+    return {nombre: statistics.median(m.get(nombre, 0.0) for m in muestras) for nombre in paquetes}
+
+
+def medir_fases(runs: int, interfaz: bool, warmup: bool) -> List[dict]:
+    """Ejecuta el arranque completo `runs` veces y retorna las fases de cada una."""
+    fases = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            inicio = time.time()
+            resultado = subprocess.run(
+                [sys.executable, "-c", _SCRIPT_FASES.format(interfaz=interfaz)],
+                cwd=RAIZ, env=_entorno(tmp, warmup), capture_output=True, text=True
+            )
+        if resultado.returncode != 0:
+            raise RuntimeError(f"El proceso de arranque falló:\n{resultado.stderr}")
+        fila = json.loads(resultado.stdout.strip().splitlines()[-1])
+        fila["process_to_first_request"] = fila.pop("first_request_wall") - inicio
+        fases.append(fila)
+    return fases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de arranque de la aplicación")
+    parser.add_argument("--runs", type=int, default=3, help="Procesos por medición (se reporta la mediana)")
+    parser.add_argument("--top", type=int, default=15, help="Paquetes a mostrar en el desglose")
+    parser.add_argument("--no-interface", action="store_true", help="No construir la interfaz (arranque de src.batch/src.sweep)")
+    parser.add_argument("--no-warmup", action="store_true", help="Sin precalentar el backend")
+    parser.add_argument("--max-import-s", type=float, help="Falla si `import app` supera estos segundos")
+    parser.add_argument("--max-first-request-s", type=float, help="Falla si la primera petición llega después de estos segundos")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    print(f"🧪 Arranque de app.py con {sys.executable} ({args.runs} procesos por medición)\n")
+
+    paquetes = medir_importaciones(args.runs)
+    total_import = sum(paquetes.values())
+    print(f"{'Paquete':<28} {'ms':>9} {'%':>6}")
+    print("-" * 45)
+    for nombre, segundos in sorted(paquetes.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{nombre:<28} {segundos * 1000:>9.1f} {segundos / total_import * 100:>5.1f}%")
+    print(f"{'Total':<28} {total_import * 1000:>9.1f}\n")
+
+    fases = medir_fases(args.runs, not args.no_interface, not args.no_warmup)
+    etiquetas = [
+        ("import_app", "import app"),
+        ("interface", "Interfaz" if not args.no_interface else "Interfaz (omitida)"),
+        ("first_request", "Primera petición"),
+        ("second_request", "Segunda petición"),
+        ("process_to_first_request", "Hasta la primera petición"),
+    ]
+    medianas = {clave: statistics.median(f[clave] for f in fases) for clave, _ in etiquetas}
+    print(f"{'Fase':<28} {'mediana ms':>11} {'min ms':>9} {'max ms':>9}")
+    print("-" * 60)
+    for clave, etiqueta in etiquetas:
+        valores = [f[clave] for f in fases]
+        print(f"{etiqueta:<28} {medianas[clave] * 1000:>11.1f} {min(valores) * 1000:>9.1f} {max(valores) * 1000:>9.1f}")
+    print(f"\nMódulos pesados cargados: {', '.join(fases[-1]['modules']) or 'ninguno'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "imports": paquetes, "phases": fases, "median": medianas}, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}")
+
+    fallos = []
+    if args.max_import_s is not None and medianas["import_app"] > args.max_import_s:
+        fallos.append(f"import app {medianas['import_app']:.2f}s > {args.max_import_s}s")
+    if args.max_first_request_s is not None and medianas["process_to_first_request"] > args.max_first_request_s:
+        fallos.append(f"primera petición {medianas['process_to_first_request']:.2f}s > {args.max_first_request_s}s")
+    if fallos:
+        print("❌ Regresión de arranque: " + "; ".join(fallos))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Benchmark: clasificación de temas con taxonomías grandes
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/bench_taxonomy.py
+#   python benchmarks/bench_taxonomy.py --subjects 40 --keywords 5000 --topics 2000
+#   python benchmarks/bench_taxonomy.py --taxonomy curriculo.json
+#
+# Compara la detección original (buscar cada palabra clave como subcadena
+# del tema, asignatura por asignatura) con src.taxonomy (autómata
+# Aho-Corasick compilado una vez) sobre una taxonomía sintética de
+# `--subjects` asignaturas con `--keywords` palabras clave cada una.
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.taxonomy import DEFAULT_TAXONOMY, Taxonomy, load_categories  # noqa: E402
+
+_LETRAS = "abcdefghijlmnoprstuv"
+
+
+def _palabra(rng: random.Random, relleno: bool = False) -> str:
+    # Las palabras de relleno empiezan por "z" y nunca coinciden con una palabra clave
+    palabra = "".join(rng.choice(_LETRAS) for _ in range(rng.randint(5, 9)))
+    return "z" + palabra if relleno else palabra
+
+
+def taxonomia_sintetica(asignaturas: int, palabras: int, seed: int = 0) -> dict:
+    """Asignaturas con palabras clave de 1 a 3 palabras inventadas y las plantillas por defecto."""
+    rng = random.Random(seed)
+    categorias = {}
+    for i in range(asignaturas):
+        categorias[f"asignatura_{i:02d}"] = {
+            "keywords": [" ".join(_palabra(rng) for _ in range(rng.choice((1, 1, 2, 3)))) for _ in range(palabras)],
+            "templates": [f"Lámina de asignatura {i} sobre {{topic}}"],
+        }
+    categorias["general"] = DEFAULT_TAXONOMY["general"]
+    return categorias
+
+
+def temas_sinteticos(categorias: dict, cantidad: int, seed: int = 1) -> list:
+    """Temas de 4 a 10 palabras; la mitad contiene alguna palabra clave."""
+    rng = random.Random(seed)
+    claves = [k for spec in categorias.values() for k in spec.get("keywords", [])]
+    temas = []
+    for i in range(cantidad):
+        palabras = [_palabra(rng, relleno=True) for _ in range(rng.randint(4, 10))]
+        if claves and i % 2 == 0:
+            palabras.insert(rng.randrange(len(palabras)), rng.choice(claves))
+        temas.append(" ".join(palabras).capitalize())
+    return temas
+
+
+def clasificar_original(categorias: dict, tema: str) -> str:
+    """Detección original: subcadenas en minúsculas, primera asignatura que coincide."""
+    tema_min = tema.lower()
+    for nombre, spec in categorias.items():
+        if any(palabra in tema_min for palabra in spec.get("keywords", [])):
+            return nombre
+    return "general"
+
+
+def _medir(funcion, temas: list, repeticiones: int) -> float:
+    """Mediana de microsegundos por tema."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for tema in temas:
+            funcion(tema)
+        tiempos.append((time.perf_counter() - inicio) / len(temas) * 1e6)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasificación de temas: subcadenas vs. Aho-Corasick")
+    parser.add_argument("--subjects", type=int, default=20, help="Asignaturas sintéticas")
+    parser.add_argument("--keywords", type=int, default=2000, help="Palabras clave por asignatura")
+    parser.add_argument("--topics", type=int, default=1000, help="Temas a clasificar")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se reporta la mediana)")
+    parser.add_argument("--taxonomy", help="Usar esta taxonomía JSON en lugar de la sintética")
+    args = parser.parse_args()
+
+    if args.taxonomy:
+        categorias = load_categories(args.taxonomy)
+    else:
+        categorias = taxonomia_sintetica(args.subjects, args.keywords)
+    inicio = time.perf_counter()
+    taxonomia = Taxonomy(categorias)
+    compilacion = time.perf_counter() - inicio
+
+    temas = temas_sinteticos(categorias, args.topics)
+    stats = taxonomia.stats()
+    print(f"{stats['categories']} asignaturas | {stats['keywords']} palabras clave | "
+          f"{len(temas)} temas | compilación {compilacion * 1000:.0f} ms\n")
+
+    filas = [
+        ("Original (subcadenas)", _medir(lambda t: clasificar_original(categorias, t), temas, 1)),
+        ("src.taxonomy (clasificar)", _medir(taxonomia.classify, temas, args.repeat)),
+        ("src.taxonomy (sugerencias)", _medir(taxonomia.suggestions, temas, args.repeat)),
+    ]
+
+    print(f"{'Método':<30} {'µs/tema':>12}")
+    print("-" * 43)
+    for nombre, microsegundos in filas:
+        print(f"{nombre:<30} {microsegundos:>12.1f}")
+    print(f"\nAceleración al clasificar: {filas[0][1] / filas[1][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Prueba de carga contra el servidor local (sin gastar créditos)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python benchmarks/load_test.py --concurrency 1,4,16,64 --requests 128 --latency 0.5
+#   python benchmarks/load_test.py --mode gradio --concurrency 1,8,32 --requests 64
+#   python benchmarks/load_test.py --rate-limit-rate 0.1 --rate-per-min 600 --json carga.json
+#
+# Levanta src.stub_server, apunta la aplicación a él y lanza `--requests`
+# generaciones por cada nivel de concurrencia. Modos:
+#   - async:  generar_imagen_async en el bucle de eventos (como la cola de Gradio)
+#   - sync:   generar_imagen desde un pool de hilos (como src.batch)
+#   - gradio: la interfaz completa vía gradio_client (HTTP + cola de Gradio)
+#
+# Reporta throughput y latencias p50/p95/p99 por nivel. Es la referencia
+# contra la que se mide cualquier cambio de rendimiento.
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.stub_server import StubServer  # noqa: E402
+
+ESTILO = "📊 Infografía Profesional"
+
+
+def _percentil(valores: list, p: float) -> float:
+    """Percentil por rango más cercano (valores ya ordenados)."""
+    if not valores:
+        return float("nan")
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def _prompts(nivel: int, total: int, repeticion: float, rng: random.Random) -> list:
+    """Prompts únicos, con una fracción `repeticion` tomada de un grupo pequeño de prompts frecuentes."""
+    frecuentes = [f"ciclo del agua {i}" for i in range(4)]
+    return [
+        rng.choice(frecuentes) if rng.random() < repeticion else f"carga c{nivel} #{i} {rng.random():.6f}"
+        for i in range(total)
+    ]
+
+
+def _resumen(nivel: int, latencias: list, errores: int, duracion: float) -> dict:
+    latencias = sorted(latencias)
+    return {
+        "concurrency": nivel,
+        "ok": len(latencias),
+        "errors": errores,
+        "duration_s": round(duracion, 3),
+        "throughput_rps": round(len(latencias) / duracion, 2) if duracion else 0.0,
+        "p50_ms": round(_percentil(latencias, 50) * 1000, 1),
+        "p95_ms": round(_percentil(latencias, 95) * 1000, 1),
+        "p99_ms": round(_percentil(latencias, 99) * 1000, 1),
+    }
+
+
+async def _nivel_async(app, nivel: int, prompts: list, args) -> dict:
+    semaforo = asyncio.Semaphore(nivel)
+    latencias, errores = [], 0
+
+    async def _una(prompt):
+        nonlocal errores
+        async with semaforo:
+            start = time.perf_counter()
+            imagen, *_ = await app.generar_imagen_async(prompt, ESTILO, 7.5, args.steps, -1, args.variantes)
+            if imagen is None:
+                errores += 1
+            else:
+                latencias.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[_una(p) for p in prompts])
+    return _resumen(nivel, latencias, errores, time.perf_counter() - start)
+
+
+def _nivel_hilos(llamar, nivel: int, prompts: list) -> dict:
+    latencias, errores = [], 0
+
+    def _una(prompt):
+        start = time.perf_counter()
+        try:
+            ok = llamar(prompt)
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=nivel) as pool:
+        for ok, latencia in pool.map(_una, prompts):
+            if ok:
+                latencias.append(latencia)
+            else:
+                errores += 1
+    return _resumen(nivel, latencias, errores, time.perf_counter() - start)
+
+
+def _imprimir(fila: dict, stub_stats: dict):
+    print(
+        f"{fila['concurrency']:>6} | {fila['ok']:>5} | {fila['errors']:>5} | {fila['throughput_rps']:>8.2f} | "
+        f"{fila['p50_ms']:>9.1f} | {fila['p95_ms']:>9.1f} | {fila['p99_ms']:>9.1f} | "
+        f"{stub_stats['rate_limited']:>5} | {stub_stats['errors']:>5}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de EduDiff XL contra el servidor local")
+    parser.add_argument("--mode", choices=["async", "sync", "gradio"], default="async")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="Niveles de concurrencia separados por comas")
+    parser.add_argument("--requests", type=int, default=128, help="Peticiones por nivel")
+    parser.add_argument("--steps", type=int, default=25)
+    parser.add_argument("--variantes", type=int, default=1)
+    parser.add_argument("--repeat", type=float, default=0.0, help="Fracción de prompts repetidos (caché/agrupación)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Latencia fija del servidor local (s)")
+    parser.add_argument("--latency-per-step", type=float, default=0.0, help="Latencia por step del servidor local (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--rate-per-min", type=float, default=1e6, help="EDUDIFF_RATE_PER_MIN de la aplicación")
+    parser.add_argument("--burst", type=float, default=1e6, help="EDUDIFF_RATE_BURST de la aplicación")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    niveles = [int(c) for c in args.concurrency.split(",")]
+    rng = random.Random(args.seed)
+
+    stub = StubServer(
+        latency=args.latency, latency_per_step=args.latency_per_step, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after, seed=args.seed
+    ).start()
+
+    tmp = tempfile.TemporaryDirectory()
+    # La configuración de la aplicación se lee al importarla
+    os.environ.update({
+        "EDUDIFF_BACKEND": "together",
+        "TOGETHER_BASE_URL": stub.base_url,
+        "TOGETHER_API_KEY": "stub",
+        "EDUDIFF_CACHE_DIR": os.path.join(tmp.name, "cache"),
+        "EDUDIFF_OUTPUT_DIR": os.path.join(tmp.name, "outputs"),
+        "EDUDIFF_RATE_PER_MIN": str(args.rate_per_min),
+        "EDUDIFF_RATE_BURST": str(args.burst),
+        "EDUDIFF_CONCURRENCY": str(max(niveles)),
+        "EDUDIFF_QUEUE_MAX": str(max(niveles) * 4),
+    })
+    import app
+
+    cliente = interfaz = None
+    if args.mode == "gradio":
+        from gradio_client import Client
+
+        # Solo este modo necesita gradio: los demás no construyen la interfaz
+        interfaz = app.crear_interfaz()
+        interfaz.launch(prevent_thread_lock=True, quiet=True)
+        cliente = Client(interfaz.local_url, verbose=False)
+
+    def _llamar_sync(prompt):
+        return app.generar_imagen(prompt, ESTILO, 7.5, args.steps, -1, args.variantes)[0] is not None
+
+    def _llamar_gradio(prompt):
+        imagen, *_ = cliente.predict(
+            prompt, ESTILO, 7.5, args.steps, -1, args.variantes, False,
+            api_name="/generar_imagen_progresivo"
+        )
+        return imagen is not None
+
+    print(f"🧪 Servidor local {stub.base_url} | modo {args.mode} | {args.requests} peticiones por nivel | "
+          f"latencia {args.latency}s + {args.latency_per_step}s/step\n")
+    print("  conc |    ok |   err |    req/s |   p50 ms |   p95 ms |   p99 ms |   429 |   500")
+    print("-" * 86)
+
+    # Un solo bucle para todos los niveles: el cliente asíncrono compartido queda ligado a él
+    bucle = asyncio.new_event_loop()
+    resultados = []
+    try:
+        for nivel in niveles:
+            antes = stub.stats()
+            prompts = _prompts(nivel, args.requests, args.repeat, rng)
+            if args.mode == "async":
+                fila = bucle.run_until_complete(_nivel_async(app, nivel, prompts, args))
+            else:
+                fila = _nivel_hilos(_llamar_gradio if cliente else _llamar_sync, nivel, prompts)
+
+            despues = stub.stats()
+            stub_stats = {k: despues[k] - antes[k] for k in despues}
+            fila.update({"stub_" + k: v for k, v in stub_stats.items()})
+            resultados.append(fila)
+            _imprimir(fila, stub_stats)
+    finally:
+        bucle.close()
+        if interfaz is not None:
+            interfaz.close()
+        stub.stop()
+        tmp.cleanup()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": resultados}, f, indent=2)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
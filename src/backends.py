@@ -0,0 +1,352 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Backends de generación de imágenes
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# La aplicación solo conoce la interfaz GenerationBackend. El backend se
+# elige con EDUDIFF_BACKEND:
+#   - together: API de Together AI (por defecto)
+#   - stub:     servidor local src.stub_server, sin gastar créditos
+#   - local:    diffusers en este proceso (src.pipelines), sin API
+
+import os
+import time
+import base64
+import asyncio
+import importlib.util
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import List, Optional
+
+from src.clients import (
+    get_together_client,
+    get_async_together_client,
+    download_bytes,
+    download_bytes_async
+)
+from src.metrics import record_stage, stage
+
+
+class GenerationBackend(ABC):
+    """
+    Interfaz común de los backends de generación.
+
+    Cada llamada genera `n` variantes de un mismo prompt y retorna los bytes
+    codificados de cada imagen (PNG/JPEG tal como los produce el backend).
+    """
+
+    name = "base"
+    # Genera de una en una: las peticiones esperan a las que están en curso
+    sequential = False
+    # Estado mostrado al usuario cuando is_configured() es False
+    not_configured_message = "⚙️ Error: el backend de generación no está configurado."
+
+    def is_configured(self) -> bool:
+        """Indica si el backend tiene lo necesario (credenciales, modelo...) para generar."""
+        return True
+
+    def warmup(self, model: str):
+        """
+        Prepara el backend antes de la primera petición (por defecto no hace nada).
+
+        Args:
+            model: Modelo que se va a usar
+        """
+
+    @abstractmethod
+    def generate(
+        self,
+        prompt: str,
+        model: str,
+        steps: int,
+        seed: int,
+        n: int,
+        width: int,
+        height: int,
+        guidance_scale: float
+    ) -> List[bytes]:
+        """
+        Genera las variantes de un prompt.
+
+        Args:
+            prompt: Prompt completo (incluye el estilo)
+            model: Identificador del modelo
+            steps: Pasos de inferencia
+            seed: Semilla
+            n: Número de variantes
+            width: Ancho de la imagen
+            height: Alto de la imagen
+            guidance_scale: Escala de guía
+
+        Returns:
+            Bytes de cada imagen recibida
+        """
+
+    async def generate_async(
+        self,
+        prompt: str,
+        model: str,
+        steps: int,
+        seed: int,
+        n: int,
+        width: int,
+        height: int,
+        guidance_scale: float
+    ) -> List[bytes]:
+        """Versión asíncrona de generate; por defecto la ejecuta en un hilo."""
+        return await asyncio.to_thread(
+            self.generate, prompt, model, steps, seed, n, width, height, guidance_scale
+        )
+
+
+def _read_response(response) -> list:
+    """
+    Extrae las imágenes de una respuesta de la API.
+
+    Returns:
+        list: Una tupla (bytes decodificados o None, URL o None) por imagen
+    """
+    results = []
+    for item in response.data or []:
+        img_b64 = getattr(item, "b64_json", None)
+        if img_b64:
+            with stage("b64_decode"):
+                results.append((base64.b64decode(img_b64), None))
+        else:
+            # Si hay URL en lugar de base64
+            results.append((None, getattr(item, "url", None)))
+    return results
+
+
+class TogetherBackend(GenerationBackend):
+    """
+    Backend sobre la API de imágenes de Together AI.
+
+    Usa los clientes compartidos de src.clients (pool keep-alive). La API key
+    se lee de TOGETHER_API_KEY en cada llamada salvo que se pase explícita.
+    Mide por separado las etapas "api", "b64_decode" y "download".
+    """
+
+    name = "together"
+    not_configured_message = "❌ Error: API Key de Together AI no configurada. Añade TOGETHER_API_KEY en los Secrets del Space."
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self._api_key = api_key
+        self.base_url = base_url
+
+    @property
+    def api_key(self) -> str:
+        return self._api_key or os.environ.get("TOGETHER_API_KEY", "")
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key)
+
+    def warmup(self, model: str):
+        # Importa el SDK de Together y abre el pool de conexiones
+        get_together_client(self.api_key, self.base_url)
+
+    def generate(self, prompt, model, steps, seed, n, width, height, guidance_scale) -> List[bytes]:
+        client = get_together_client(self.api_key, self.base_url)
+
+        with stage("api"):
+            response = client.images.generate(
+                prompt=prompt,
+                model=model,
+                steps=steps,
+                seed=seed,
+                n=n,
+                width=width,
+                height=height,
+                guidance_scale=guidance_scale
+            )
+
+        results = _read_response(response)
+        with stage("download"):
+            return [
+                img_data if img_data is not None else download_bytes(img_url)
+                for img_data, img_url in results
+                if img_data is not None or img_url
+            ]
+
+    async def generate_async(self, prompt, model, steps, seed, n, width, height, guidance_scale) -> List[bytes]:
+        client = get_async_together_client(self.api_key, self.base_url)
+
+        with stage("api"):
+            response = await client.images.generate(
+                prompt=prompt,
+                model=model,
+                steps=steps,
+                seed=seed,
+                n=n,
+                width=width,
+                height=height,
+                guidance_scale=guidance_scale
+            )
+
+        async def _resolve(img_data, img_url):
+            return img_data if img_data is not None else await download_bytes_async(img_url)
+
+        results = _read_response(response)
+        with stage("download"):
+            return list(await asyncio.gather(*[
+                _resolve(img_data, img_url)
+                for img_data, img_url in results
+                if img_data is not None or img_url
+            ]))
+
+
+class LocalDiffusersBackend(GenerationBackend):
+    """
+    Backend que ejecuta el modelo con diffusers en este mismo proceso.
+
+    Los pipelines se obtienen del registro compartido de src.pipelines: el
+    primer uso de cada modelo lo carga y los siguientes lo reutilizan.
+
+    Con `max_batch_size` > 1, las peticiones concurrentes con el mismo
+    modelo, tamaño, steps y guidance se agrupan (src.microbatch) en una sola
+    llamada al pipeline, con un prompt y un generador por imagen.
+    """
+
+    name = "local"
+    sequential = True
+    not_configured_message = "⚙️ Error: backend local no disponible. Instala torch, diffusers, transformers y accelerate."
+
+    def __init__(self, registry=None, max_batch_size: int = 1, max_wait: float = 0.025):
+        if registry is None:
+            from src.pipelines import get_pipeline_registry
+            registry = get_pipeline_registry()
+        self.registry = registry
+
+        self.batcher = None
+        if max_batch_size > 1:
+            from src.microbatch import MicroBatcher
+            self.batcher = MicroBatcher(self._run_batch, max_batch_size, max_wait, name="edudiff-local-batch")
+
+    def is_configured(self) -> bool:
+        return all(importlib.util.find_spec(module) is not None for module in ("torch", "diffusers"))
+
+    def warmup(self, model: str):
+        # Carga el pipeline en el registro: la primera petición lo encuentra caliente
+        with self.registry.use(model):
+            pass
+
+    def _run_batch(self, key: tuple, requests: list) -> list:
+        """
+        Ejecuta varias peticiones compatibles en una sola llamada al pipeline.
+
+        Args:
+            key: (modelo, steps, ancho, alto, guidance) comunes
+            requests: Tuplas (prompt, seed, n)
+
+        Returns:
+            list: Por petición, (imágenes PIL, segundos de inferencia del lote)
+        """
+        import torch
+
+        model, steps, width, height, guidance_scale = key
+        prompts, generators = [], []
+        for prompt, seed, n in requests:
+            for i in range(n):
+                prompts.append(prompt)
+                # Generador en CPU y semilla por variante: misma imagen para una
+                # semilla en cualquier dispositivo y con o sin agrupación
+                generators.append(torch.Generator("cpu").manual_seed(int(seed) + i))
+
+        with self.registry.use(model) as pipe:
+            start = time.perf_counter()
+            result = pipe(
+                prompt=prompts,
+                num_inference_steps=steps,
+                guidance_scale=guidance_scale,
+                width=width,
+                height=height,
+                generator=generators
+            )
+            elapsed = time.perf_counter() - start
+
+        outputs, offset = [], 0
+        for _, _, n in requests:
+            outputs.append((result.images[offset:offset + n], elapsed))
+            offset += n
+        return outputs
+
+    @staticmethod
+    def _encode(images: list, inference: float, waited: float) -> List[bytes]:
+        if waited > 0:
+            record_stage("batch_wait", waited)
+        record_stage("inference", inference)
+        with stage("encode"):
+            return [_encode_png(image) for image in images]
+
+    def generate(self, prompt, model, steps, seed, n, width, height, guidance_scale) -> List[bytes]:
+        key = (model, int(steps), int(width), int(height), float(guidance_scale))
+        start = time.perf_counter()
+        if self.batcher is None:
+            [(images, inference)] = self._run_batch(key, [(prompt, seed, n)])
+            return self._encode(images, inference, 0.0)
+
+        images, inference = self.batcher.submit(key, (prompt, seed, n), size=n).result()
+        return self._encode(images, inference, time.perf_counter() - start - inference)
+
+    async def generate_async(self, prompt, model, steps, seed, n, width, height, guidance_scale) -> List[bytes]:
+        if self.batcher is None:
+            return await super().generate_async(prompt, model, steps, seed, n, width, height, guidance_scale)
+
+        # Esperar el lote sin ocupar un hilo; cancelar antes de que empiece lo saca de la cola
+        key = (model, int(steps), int(width), int(height), float(guidance_scale))
+        start = time.perf_counter()
+        images, inference = await asyncio.wrap_future(self.batcher.submit(key, (prompt, seed, n), size=n))
+        return await asyncio.to_thread(self._encode, images, inference, time.perf_counter() - start - inference)
+
+
+def _encode_png(image) -> bytes:
+    buffer = BytesIO()
+    # Compresión rápida: el PNG va a la caché y al disco, no por la red
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def create_backend(name: Optional[str] = None) -> GenerationBackend:
+    """
+    Crea el backend indicado (o el de EDUDIFF_BACKEND).
+
+    Con "stub" se levanta en segundo plano un src.stub_server configurado
+    con EDUDIFF_STUB_LATENCY, EDUDIFF_STUB_LATENCY_PER_STEP,
+    EDUDIFF_STUB_ERROR_RATE y EDUDIFF_STUB_RATE_LIMIT_RATE. Con "local" se
+    usa el registro de pipelines compartido (los modelos se cargan al
+    primer uso) y se agrupan las peticiones concurrentes según
+    EDUDIFF_MAX_BATCH y EDUDIFF_BATCH_WAIT_MS.
+
+    Args:
+        name: "together", "stub" o "local"
+
+    Returns:
+        Backend listo para usar
+
+    Raises:
+        ValueError: Si el nombre no corresponde a ningún backend
+    """
+    name = (name or os.environ.get("EDUDIFF_BACKEND", "together")).lower()
+
+    if name == "together":
+        return TogetherBackend()
+
+    if name == "stub":
+        from src.stub_server import StubServer
+
+        server = StubServer(
+            latency=float(os.environ.get("EDUDIFF_STUB_LATENCY", "0.5")),
+            latency_per_step=float(os.environ.get("EDUDIFF_STUB_LATENCY_PER_STEP", "0")),
+            error_rate=float(os.environ.get("EDUDIFF_STUB_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.environ.get("EDUDIFF_STUB_RATE_LIMIT_RATE", "0")),
+        ).start()
+        backend = TogetherBackend(api_key="stub", base_url=server.base_url)
+        backend.name = "stub"
+        return backend
+
+    if name == "local":
+        return LocalDiffusersBackend(
+            max_batch_size=int(os.environ.get("EDUDIFF_MAX_BATCH", "4")),
+            max_wait=float(os.environ.get("EDUDIFF_BATCH_WAIT_MS", "25")) / 1000
+        )
+
+    raise ValueError(f"Backend desconocido: {name}")
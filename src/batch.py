@@ -0,0 +1,259 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Generación masiva por línea de comandos (reanudable)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.batch prompts.jsonl --output-dir results/curso_biologia --workers 4
+#   python -m src.batch prompts.csv --estilo "🔬 Científico Detallado" --steps 30
+#
+# Los metadatos de cada imagen se guardan en un almacén SQLite
+# (--metadata-db, por defecto <output-dir>/metadata.db).
+#
+# Cada fila/línea acepta los campos: prompt (obligatorio), estilo, steps,
+# guidance, seed, variantes e id. Los campos ausentes toman los valores por
+# defecto de la línea de comandos. El progreso se guarda en un checkpoint,
+# así que volver a lanzar el mismo comando continúa donde se quedó.
+
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Set
+
+import app
+from src.scheduler import PRIORITY_BATCH
+from src.metadata import MetadataStore
+
+# Mensajes de generar_imagen tras los que no tiene sentido seguir: créditos
+# agotados, API key inválida o ausente, backend sin configurar o límite de
+# tasa tras agotar reintentos
+_ERRORES_FATALES = ("💰", "⏳", "API Key", "⚙️")
+
+
+def _es_fatal(estado: str) -> bool:
+    return any(marca in estado for marca in _ERRORES_FATALES)
+
+
+def read_items(path: str) -> Iterator[Dict]:
+    """
+    Lee los prompts de un archivo JSONL o CSV de forma perezosa.
+
+    Args:
+        path: Ruta al archivo (.jsonl o .csv)
+
+    Yields:
+        Diccionario con los campos de cada fila
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield {k: v for k, v in row.items() if v not in (None, "")}
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def item_id(item: Dict) -> str:
+    """Identificador estable de un elemento: su campo id o un hash de sus parámetros."""
+    if item.get("id"):
+        return str(item["id"])
+    payload = json.dumps(
+        {k: item[k] for k in ("prompt", "estilo", "steps", "guidance", "seed", "variantes")},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class Checkpoint:
+    """Registro append-only de los elementos terminados."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        self.done.add(json.loads(line)["id"])
+
+    def mark(self, uid: str, estado: str):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"id": uid, "estado": estado}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add(uid)
+
+
+def _con_valores_por_defecto(item: Dict, args) -> Dict:
+    return {
+        "id": item.get("id"),
+        "prompt": item["prompt"],
+        "estilo": item.get("estilo", args.estilo),
+        "steps": int(item.get("steps", args.steps)),
+        "guidance": float(item.get("guidance", args.guidance)),
+        "seed": int(item.get("seed", args.seed)),
+        "variantes": int(item.get("variantes", args.variantes)),
+    }
+
+
+def process_item(item: Dict, output_dir: str) -> tuple:
+    """
+    Genera un elemento y copia sus imágenes al directorio de salida.
+
+    Returns:
+        tuple: (éxito, mensaje de estado, registros de metadatos)
+    """
+    uid = item_id(item)
+    start = time.time()
+
+    # La semilla efectiva se fija antes de generar: con -1 se sortea y debe ser la registrada
+    prompt_completo, seed, _ = app.preparar_peticion(item["prompt"], item["estilo"], item["seed"], item["variantes"])
+    imagen, galeria, _, estado = app.generar_imagen(
+        item["prompt"], item["estilo"], item["guidance"], item["steps"], seed,
+        item["variantes"], prioridad=PRIORITY_BATCH
+    )
+    if imagen is None:
+        return False, estado, []
+
+    generation_time = time.time() - start
+
+    registros: List[Dict] = []
+    for i, ruta in enumerate(galeria):
+        destino = os.path.join(output_dir, f"{uid}_{i}{os.path.splitext(ruta)[1]}")
+        shutil.copyfile(ruta, destino)
+
+        registros.append({
+            "image_path": destino,
+            "id": uid,
+            "prompt": item["prompt"],
+            "full_prompt": prompt_completo,
+            "style": item["estilo"],
+            "steps": item["steps"],
+            "guidance": item["guidance"],
+            "seed": seed,
+            "variant": i,
+            "resolution": f"{app.ANCHO}x{app.ALTO}",
+            "generation_time": round(generation_time, 2),
+            "status": estado,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    return True, estado, registros
+
+
+def _ejecutar(args, checkpoint: Checkpoint, pendientes: Dict, detener: threading.Event, recoger):
+    """Recorre la entrada manteniendo como mucho `workers` elementos en vuelo."""
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for raw in read_items(args.input):
+            if detener.is_set():
+                break
+
+            item = _con_valores_por_defecto(raw, args)
+            uid = item_id(item)
+            if uid in checkpoint.done:
+                skipped += 1
+                continue
+
+            # Mantener como mucho `workers` elementos en vuelo
+            while len(pendientes) >= args.workers:
+                done, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                recoger(done)
+
+            pendientes[pool.submit(process_item, item, args.output_dir)] = uid
+
+        while pendientes:
+            done, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            recoger(done)
+    return skipped
+
+
+def run(args) -> int:
+    """
+    Ejecuta el lote con concurrencia acotada.
+
+    Returns:
+        Código de salida (0 si todo terminó, 1 si hubo fallos o se detuvo)
+    """
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.output_dir, "checkpoint.jsonl"))
+    store = MetadataStore(args.metadata_db or os.path.join(args.output_dir, "metadata.db"))
+
+    # Un elemento solo se marca como hecho cuando sus metadatos están en disco
+    por_marcar: List[tuple] = []
+
+    def _marcar_escritos():
+        for uid, estado in por_marcar:
+            checkpoint.mark(uid, estado)
+        por_marcar.clear()
+
+    ok = failed = skipped = 0
+    detener = threading.Event()
+    pendientes = {}
+
+    def _recoger(done):
+        nonlocal ok, failed
+        for future in done:
+            uid = pendientes.pop(future)
+            try:
+                exito, estado, registros = future.result()
+            except Exception as e:
+                exito, estado, registros = False, f"❌ Error: {e}", []
+
+            if exito:
+                ok += 1
+                por_marcar.append((uid, estado))
+                if any([store.add(r) for r in registros]):
+                    _marcar_escritos()
+                print(f"✅ {uid} | {estado}")
+            else:
+                failed += 1
+                print(f"❌ {uid} | {estado}", file=sys.stderr)
+                if _es_fatal(estado):
+                    detener.set()
+
+    try:
+        skipped = _ejecutar(args, checkpoint, pendientes, detener, _recoger)
+    finally:
+        # Escribir el último lote aunque el proceso se interrumpa
+        store.close()
+        _marcar_escritos()
+
+    print(f"\n📦 Terminado: {ok} generados | {skipped} ya hechos | {failed} fallidos")
+    if detener.is_set():
+        print("⏸️ Detenido por cuota/credenciales. Vuelve a lanzar el comando para reanudar.", file=sys.stderr)
+
+    return 0 if failed == 0 and not detener.is_set() else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generación masiva de material educativo con EduDiff XL")
+    parser.add_argument("input", help="Archivo .jsonl o .csv con los prompts")
+    parser.add_argument("--output-dir", default="results/batch", help="Directorio de salida")
+    parser.add_argument("--workers", type=int, default=4, help="Generaciones simultáneas")
+    parser.add_argument("--checkpoint", help="Archivo de checkpoint (por defecto en el directorio de salida)")
+    parser.add_argument("--metadata-db", help="Base SQLite de metadatos (por defecto en el directorio de salida)")
+    parser.add_argument("--estilo", default="📊 Infografía Profesional", choices=list(app.ESTILOS.keys()))
+    parser.add_argument("--steps", type=int, default=25)
+    parser.add_argument("--guidance", type=float, default=7.5)
+    parser.add_argument("--seed", type=int, default=-1)
+    parser.add_argument("--variantes", type=int, default=1)
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Caché de resultados de generación
+# ═══════════════════════════════════════════════════════════════════════════════
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def generation_key(
+    prompt_completo: str,
+    model: str,
+    steps: int,
+    guidance_scale: float,
+    seed: int,
+    width: int,
+    height: int,
+    **extra
+) -> str:
+    """
+    Calcula la clave de contenido (SHA-256) de una petición de generación.
+
+    Args:
+        prompt_completo: Prompt final enviado al modelo (incluye el estilo)
+        model: Identificador del modelo
+        steps: Pasos de inferencia
+        guidance_scale: Escala de guía
+        seed: Semilla
+        width: Ancho de la imagen
+        height: Alto de la imagen
+        **extra: Parámetros adicionales que alteran el resultado
+
+    Returns:
+        Clave hexadecimal
+    """
+    params = {
+        "prompt": prompt_completo,
+        "model": model,
+        "steps": int(steps),
+        "guidance": float(guidance_scale),
+        "seed": int(seed),
+        "width": int(width),
+        "height": int(height),
+    }
+    params.update(extra)
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Caché de dos niveles para imágenes generadas.
+
+    Nivel 1: LRU en memoria (número de entradas acotado).
+    Nivel 2: Almacén en disco con desalojo por tamaño total (los archivos
+    menos usados recientemente se eliminan primero).
+
+    El tamaño en disco se lleva en memoria y solo se recorre el directorio
+    al superar el límite. Si varios procesos comparten el directorio, cada
+    uno ve solo lo que escribe él: con `rescan_interval` el tamaño se vuelve
+    a medir como mucho cada tantos segundos.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_memory_items: int = 32,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+        rescan_interval: Optional[float] = None
+    ):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.rescan_interval = rescan_interval
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self._scanned_at = 0.0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def __contains__(self, key: str) -> bool:
+        """Comprueba si una clave está en caché sin alterar los contadores."""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._path(key))
+
+    def keys(self) -> List[str]:
+        """Claves guardadas en disco (sin alterar los contadores)."""
+        return [name[:-len(".bin")] for _, _, name in self._scan_disk()]
+
+    def peek(self, key: str) -> Optional[bytes]:
+        """Lee una entrada de disco sin alterar los contadores ni el orden de desalojo."""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Busca una entrada en memoria y después en disco.
+
+        Args:
+            key: Clave de la generación
+
+        Returns:
+            Bytes de la imagen o None si no está en caché
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+
+        path = self._path(key)
+        if data is not None:
+            # El desalojo en disco es por mtime: las entradas más usadas se
+            # sirven de memoria y no deben parecer las más antiguas
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            return data
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Actualizar mtime para que el desalojo sea LRU
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Guarda una entrada en ambos niveles.
+
+        Args:
+            key: Clave de la generación
+            data: Bytes de la imagen
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        # Al sobrescribir una entrada (regeneración, otra réplica) solo cambia la diferencia
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._remember(key, data)
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data) - replaced
+
+        self._evict_disk()
+
+    def _remember(self, key: str, data: bytes):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".bin"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def _evict_disk(self):
+        with self._lock:
+            # Otros procesos pudieron escribir en el directorio desde la última medición
+            stale = self.rescan_interval is not None and time.monotonic() - self._scanned_at >= self.rescan_interval
+            if not stale and self._disk_bytes is not None and self._disk_bytes <= self.max_disk_bytes:
+                return
+
+        entries = self._scan_disk()
+        total = sum(size for _, size, _ in entries)
+
+        # Eliminar primero los menos usados recientemente
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk_bytes = total
+            self._scanned_at = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna los contadores de aciertos y fallos de la caché.
+
+        Returns:
+            Diccionario con aciertos por nivel, fallos y tasa de aciertos
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "memory_items": len(self._memory),
+            }
@@ -0,0 +1,181 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Clientes HTTP compartidos (pool de conexiones keep-alive)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+import os
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    # Together, httpx y requests tardan en importarse: se cargan al crear el
+    # primer cliente, no al arrancar la aplicación
+    import httpx
+    import requests
+    from together import Together, AsyncTogether
+
+
+CONNECT_TIMEOUT = float(os.environ.get("EDUDIFF_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.environ.get("EDUDIFF_READ_TIMEOUT", "120"))
+POOL_SIZE = int(os.environ.get("EDUDIFF_POOL_SIZE", "20"))
+
+_lock = threading.Lock()
+_together_client: Optional["Together"] = None
+_together_key: Optional[Tuple[str, Optional[str]]] = None
+_session: Optional["requests.Session"] = None
+_async_together_client: Optional["AsyncTogether"] = None
+_async_together_key: Optional[Tuple[str, Optional[str]]] = None
+_async_http_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_timeouts() -> Tuple[float, float]:
+    """Retorna los timeouts (conexión, lectura) configurados en segundos."""
+    return CONNECT_TIMEOUT, READ_TIMEOUT
+
+
+def _httpx_timeout() -> "httpx.Timeout":
+    import httpx
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def _httpx_limits() -> "httpx.Limits":
+    import httpx
+    return httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+
+
+def get_together_client(api_key: str, base_url: Optional[str] = None) -> "Together":
+    """
+    Retorna el cliente de Together AI compartido por todo el proceso.
+
+    El cliente se crea una sola vez (o de nuevo si cambia la API key o la
+    URL base) y reutiliza un pool de conexiones keep-alive entre peticiones.
+
+    Args:
+        api_key: API Key de Together AI
+        base_url: URL base alternativa (p. ej. src.stub_server); por defecto
+            la de TOGETHER_BASE_URL o la oficial
+
+    Returns:
+        Cliente de Together AI
+    """
+    global _together_client, _together_key
+
+    with _lock:
+        if _together_client is None or _together_key != (api_key, base_url):
+            import httpx
+            from together import Together
+
+            http_client = httpx.Client(timeout=_httpx_timeout(), limits=_httpx_limits())
+            _together_client = Together(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=_httpx_timeout(),
+                # Los reintentos (429, 5xx, red) los gestiona src.scheduler
+                max_retries=0,
+                http_client=http_client
+            )
+            _together_key = (api_key, base_url)
+        return _together_client
+
+
+def get_http_session() -> "requests.Session":
+    """
+    Retorna la sesión HTTP compartida para descargas de imágenes.
+
+    Returns:
+        Sesión de requests con pool de conexiones
+    """
+    global _session
+
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def download_bytes(url: str) -> bytes:
+    """
+    Descarga el contenido de una URL usando la sesión compartida.
+
+    Args:
+        url: URL de la imagen
+
+    Returns:
+        Contenido descargado
+
+    Raises:
+        requests.HTTPError: Si la respuesta no es 2xx
+        requests.Timeout: Si se supera el timeout de conexión o lectura
+    """
+    response = get_http_session().get(url, timeout=get_timeouts())
+    response.raise_for_status()
+    return response.content
+
+
+def get_async_together_client(api_key: str, base_url: Optional[str] = None) -> "AsyncTogether":
+    """
+    Retorna el cliente asíncrono de Together AI compartido por el proceso.
+
+    Pensado para el bucle de eventos de Gradio: muchas generaciones en
+    vuelo comparten el mismo pool sin ocupar un hilo por petición.
+
+    Args:
+        api_key: API Key de Together AI
+        base_url: URL base alternativa; por defecto la de TOGETHER_BASE_URL
+
+    Returns:
+        Cliente asíncrono de Together AI
+    """
+    global _async_together_client, _async_together_key
+
+    with _lock:
+        if _async_together_client is None or _async_together_key != (api_key, base_url):
+            import httpx
+            from together import AsyncTogether
+
+            http_client = httpx.AsyncClient(timeout=_httpx_timeout(), limits=_httpx_limits())
+            _async_together_client = AsyncTogether(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=_httpx_timeout(),
+                max_retries=0,
+                http_client=http_client
+            )
+            _async_together_key = (api_key, base_url)
+        return _async_together_client
+
+
+def _get_async_http_client() -> "httpx.AsyncClient":
+    global _async_http_client
+
+    with _lock:
+        if _async_http_client is None:
+            import httpx
+
+            _async_http_client = httpx.AsyncClient(timeout=_httpx_timeout(), limits=_httpx_limits())
+        return _async_http_client
+
+
+async def download_bytes_async(url: str) -> bytes:
+    """
+    Versión asíncrona de download_bytes.
+
+    Args:
+        url: URL de la imagen
+
+    Returns:
+        Contenido descargado
+
+    Raises:
+        httpx.HTTPStatusError: Si la respuesta no es 2xx
+        httpx.TimeoutException: Si se supera el timeout de conexión o lectura
+    """
+    response = await _get_async_http_client().get(url)
+    response.raise_for_status()
+    return response.content
@@ -0,0 +1,432 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Preprocesado de imágenes de control para ControlNet (con caché)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.control bocetos/ --kinds canny,lineart --output-dir mapas/
+#   python -m src.control boceto.png --width 1024 --height 768 --low 50 --high 150
+#
+# Cada imagen de entrada se identifica por el hash de su contenido. Su versión
+# redimensionada y cada mapa (bordes Canny, lineart) se guardan en una caché
+# de dos niveles (src.cache): iterar sobre prompts con el mismo boceto de un
+# docente no repite el preprocesado, y peticiones concurrentes con el mismo
+# boceto lo calculan una sola vez (src.singleflight).
+#
+# Canny usa OpenCV si está instalado (como el notebook) y si no una versión en
+# NumPy; la implementación forma parte de la clave de caché.
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from src.cache import ResultCache
+from src.singleflight import SingleFlight
+from src.utils import resize_image_for_controlnet
+
+CONTROL_CACHE_DIR = os.environ.get(
+    "EDUDIFF_CONTROL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "edudiff_control_cache")
+)
+CONTROL_CACHE_MAX_MB = int(os.environ.get("EDUDIFF_CONTROL_CACHE_MAX_MB", "256"))
+
+# Cambiar si cambia el resultado de algún mapa: invalida las entradas antiguas
+_VERSION = 2
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+_lock = threading.Lock()
+_preprocessor: Optional["ControlPreprocessor"] = None
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    """Convierte a RGB; las zonas transparentes (p. ej. un lienzo de dibujo) quedan en blanco."""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, image).convert("RGB")
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _hysteresis(weak: np.ndarray, strong: np.ndarray) -> np.ndarray:
+    """
+    Conserva los componentes 8-conexos de `weak` que contienen algún píxel de `strong`.
+
+    Trabaja solo sobre los píxeles débiles (pocos frente a la imagen): une
+    cada uno con sus vecinos y comprime las etiquetas (union-find por
+    saltos de puntero), así que el número de pasadas no depende de la
+    longitud de los bordes.
+    """
+    ys, xs = np.nonzero(weak)
+    node = np.full((weak.shape[0] + 2, weak.shape[1] + 2), -1, dtype=np.int64)
+    node[ys + 1, xs + 1] = np.arange(len(ys))
+
+    # Aristas hacia los vecinos de la derecha y de la fila siguiente (cada par una vez)
+    first, second = [], []
+    for dy, dx in ((0, 1), (1, -1), (1, 0), (1, 1)):
+        neighbor = node[ys + 1 + dy, xs + 1 + dx]
+        linked = neighbor >= 0
+        first.append(np.nonzero(linked)[0])
+        second.append(neighbor[linked])
+    first, second = np.concatenate(first), np.concatenate(second)
+
+    labels = np.arange(len(ys))
+    while True:
+        a, b = labels[first], labels[second]
+        if np.array_equal(a, b):
+            break
+        low = np.minimum(a, b)
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+    kept = np.isin(labels, labels[strong[ys, xs]])
+    edges = np.zeros(weak.shape, dtype=bool)
+    edges[ys[kept], xs[kept]] = True
+    return edges
+
+
+def _canny_numpy(gray: np.ndarray, low: int, high: int) -> np.ndarray:
+    """
+    Canny en NumPy con el mismo criterio que cv2.Canny por defecto.
+
+    Sobel 3x3 con magnitud L1, supresión de no máximos en 4 direcciones e
+    histéresis por componentes conexos: un borde débil se conserva entero si
+    toca algún píxel fuerte, sin importar su longitud.
+    """
+    g = np.pad(gray.astype(np.int32), 1, mode="edge")
+    gx = (g[:-2, 2:] + 2 * g[1:-1, 2:] + g[2:, 2:]) - (g[:-2, :-2] + 2 * g[1:-1, :-2] + g[2:, :-2])
+    gy = (g[2:, :-2] + 2 * g[2:, 1:-1] + g[2:, 2:]) - (g[:-2, :-2] + 2 * g[:-2, 1:-1] + g[:-2, 2:])
+    magnitude = np.abs(gx) + np.abs(gy)
+
+    # Dirección cuantizada: 0°, 45°, 90° o 135° (tan 22.5° ≈ 0.4142)
+    ax, ay = np.abs(gx), np.abs(gy)
+    horizontal = ay * 10000 <= ax * 4142
+    vertical = ay * 10000 >= ax * 24142
+    diagonal = ~(horizontal | vertical)
+    same_sign = (gx ^ gy) >= 0
+
+    m = np.pad(magnitude, 1)
+    center = m[1:-1, 1:-1]
+    keep = np.zeros(gray.shape, dtype=bool)
+    keep |= horizontal & (center > m[1:-1, :-2]) & (center >= m[1:-1, 2:])
+    keep |= vertical & (center > m[:-2, 1:-1]) & (center >= m[2:, 1:-1])
+    # En coordenadas de imagen (y hacia abajo) gx·gy > 0 es la diagonal ↘
+    keep |= diagonal & same_sign & (center > m[:-2, :-2]) & (center > m[2:, 2:])
+    keep |= diagonal & ~same_sign & (center > m[:-2, 2:]) & (center > m[2:, :-2])
+
+    weak = keep & (magnitude > low)
+    edges = _hysteresis(weak, weak & (magnitude > high))
+    return edges.astype(np.uint8) * 255
+
+
+def canny_map(image: Image.Image, low_threshold: int = 100, high_threshold: int = 200) -> Image.Image:
+    """
+    Mapa de bordes Canny (bordes blancos sobre negro, RGB).
+
+    Args:
+        image: Imagen RGB ya redimensionada
+        low_threshold: Umbral bajo
+        high_threshold: Umbral alto
+
+    Returns:
+        Imagen de control para ControlNet Canny
+    """
+    gray = np.asarray(image.convert("L"))
+    if cv2 is not None:
+        edges = cv2.Canny(gray, low_threshold, high_threshold)
+    else:
+        edges = _canny_numpy(gray, low_threshold, high_threshold)
+    return Image.fromarray(edges, "L").convert("RGB")
+
+
+def lineart_map(image: Image.Image) -> Image.Image:
+    """
+    Mapa lineart de un boceto: trazos oscuros sobre papel claro pasan a
+    líneas blancas sobre negro, con el contraste estirado.
+
+    Args:
+        image: Imagen RGB ya redimensionada
+
+    Returns:
+        Imagen de control para ControlNet lineart/sketch
+    """
+    lines = ImageOps.autocontrast(ImageOps.invert(image.convert("L")), cutoff=1)
+    return lines.convert("RGB")
+
+
+# Mapas disponibles: función y parámetros que admite (forman parte de la clave)
+CONTROL_MAPS: Dict[str, Tuple[Callable[..., Image.Image], Tuple[str, ...]]] = {
+    "canny": (canny_map, ("low_threshold", "high_threshold")),
+    "lineart": (lineart_map, ()),
+}
+
+
+def _implementation(kind: str) -> str:
+    if kind == "canny":
+        return "cv2" if cv2 is not None else "numpy"
+    return "pil"
+
+
+def _open_scaled(data: bytes, size: Tuple[int, int]) -> Image.Image:
+    """Abre los bytes de una imagen; los JPEG se decodifican ya a la escala más cercana a `size`."""
+    image = Image.open(BytesIO(data))
+    # draft() modifica el objeto: solo sobre imágenes abiertas aquí
+    image.draft("RGB", size)
+    return image
+
+
+def _fingerprint(image) -> Tuple[str, Callable[[Tuple[int, int]], Image.Image]]:
+    """
+    Hash del contenido de la entrada y función que la abre para un tamaño objetivo.
+
+    Las rutas y los bytes se identifican por el archivo tal cual (sin
+    decodificar); las imágenes PIL por su modo, tamaño y píxeles.
+    """
+    if isinstance(image, Image.Image):
+        digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest(), lambda size: image
+
+    if isinstance(image, (str, os.PathLike)):
+        with open(image, 'rb') as f:
+            image = f.read()
+    data = bytes(image)
+    return hashlib.sha256(data).hexdigest(), lambda size: _open_scaled(data, size)
+
+
+def _encode_png(image: Image.Image) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+class ControlPreprocessor:
+    """
+    Prepara imágenes de control y cachea el resultado por contenido.
+
+    Para cada entrada produce "image" (la imagen redimensionada, lista para
+    ControlNet) y los mapas pedidos. Cada mapa se cachea por separado, así
+    que pedir más adelante otro tipo de mapa reutiliza la imagen ya
+    redimensionada.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[ResultCache] = None,
+        width: int = 1024,
+        height: int = 1024,
+        keep_aspect: bool = True,
+        num_workers: int = 4
+    ):
+        """
+        Args:
+            cache: Caché de mapas (por defecto una nueva en CONTROL_CACHE_DIR)
+            width: Ancho objetivo
+            height: Alto objetivo
+            keep_aspect: Conservar la proporción (la imagen cabe en width x height
+                con lados múltiplos de 8) en lugar de deformarla al tamaño exacto
+            num_workers: Hilos para process_batch
+        """
+        if cache is None:
+            cache = ResultCache(CONTROL_CACHE_DIR, max_memory_items=32, max_disk_bytes=CONTROL_CACHE_MAX_MB * 1024 * 1024)
+        self.cache = cache
+        self.width = width
+        self.height = height
+        self.keep_aspect = keep_aspect
+        self.num_workers = num_workers
+        self._inflight = SingleFlight()
+        self._lock = threading.Lock()
+
+        self.computed = 0
+        self.cached = 0
+
+    def _key(self, source: str, kind: str, params: Dict[str, int]) -> str:
+        fields = {
+            "v": _VERSION,
+            "source": source,
+            "kind": kind,
+            "width": self.width,
+            "height": self.height,
+            "keep_aspect": self.keep_aspect,
+        }
+        if kind != "image":
+            fields["impl"] = _implementation(kind)
+            fields.update({name: params[name] for name in CONTROL_MAPS[kind][1] if name in params})
+        payload = json.dumps(fields, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _compute(self, keys: Dict[str, str], missing: List[str], load: Callable[[Tuple[int, int]], Image.Image], params) -> Dict[str, Image.Image]:
+        results: Dict[str, Image.Image] = {}
+
+        # La imagen redimensionada pudo salir de la caché desde la consulta
+        data = None if "image" in missing else self.cache.get(keys["image"])
+        if data is None:
+            resized = resize_image_for_controlnet(
+                _to_rgb(load((self.width, self.height))), self.width, self.height, keep_aspect=self.keep_aspect
+            )
+            self.cache.put(keys["image"], _encode_png(resized))
+            results["image"] = resized
+        else:
+            resized = Image.open(BytesIO(data)).convert("RGB")
+
+        for kind in missing:
+            if kind == "image":
+                continue
+            fn, accepted = CONTROL_MAPS[kind]
+            control = fn(resized, **{name: params[name] for name in accepted if name in params})
+            self.cache.put(keys[kind], _encode_png(control))
+            results[kind] = control
+        return results
+
+    def process(self, image, kinds: Sequence[str] = ("canny",), **params) -> Dict[str, Image.Image]:
+        """
+        Prepara una imagen de control.
+
+        Args:
+            image: Imagen PIL, ruta o bytes
+            kinds: Mapas a calcular (claves de CONTROL_MAPS)
+            **params: Parámetros de los mapas (low_threshold, high_threshold)
+
+        Returns:
+            Diccionario con "image" (redimensionada) y un mapa por tipo pedido
+
+        Raises:
+            ValueError: Si algún tipo de mapa no existe
+        """
+        unknown = [kind for kind in kinds if kind not in CONTROL_MAPS]
+        if unknown:
+            raise ValueError(f"Mapas desconocidos: {', '.join(unknown)} (disponibles: {', '.join(CONTROL_MAPS)})")
+
+        source, load = _fingerprint(image)
+        wanted = ["image"] + list(dict.fromkeys(kinds))
+        keys = {kind: self._key(source, kind, params) for kind in wanted}
+
+        results: Dict[str, Image.Image] = {}
+        missing = []
+        for kind in wanted:
+            data = self.cache.get(keys[kind])
+            if data is None:
+                missing.append(kind)
+            else:
+                results[kind] = Image.open(BytesIO(data))
+
+        if missing:
+            flight_key = ":".join(keys[kind] for kind in missing)
+            computed, shared = self._inflight.do(flight_key, self._compute, keys, missing, load, params)
+            results.update(computed)
+        with self._lock:
+            if missing and not shared:
+                self.computed += len(missing)
+            self.cached += len(wanted) - len(missing)
+        return results
+
+    def process_batch(self, images: Iterable, kinds: Sequence[str] = ("canny",), **params) -> List[Dict[str, Image.Image]]:
+        """
+        Prepara varias imágenes de control en paralelo.
+
+        Args:
+            images: Imágenes PIL, rutas o bytes
+            kinds: Mapas a calcular para cada imagen
+            **params: Parámetros de los mapas
+
+        Returns:
+            Un diccionario por imagen (ver process), en el orden de entrada
+        """
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            return list(pool.map(lambda image: self.process(image, kinds, **params), images))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas del preprocesado.
+
+        Returns:
+            Diccionario con mapas calculados, servidos desde caché y estado de la caché
+        """
+        with self._lock:
+            stats = {"computed": self.computed, "cached": self.cached}
+        stats.update({f"cache_{k}": v for k, v in self.cache.stats().items()})
+        return stats
+
+
+def get_control_preprocessor() -> ControlPreprocessor:
+    """
+    Retorna el preprocesador compartido por todo el proceso (1024x1024,
+    conservando la proporción, caché en EDUDIFF_CONTROL_CACHE_DIR).
+
+    Returns:
+        Preprocesador de imágenes de control
+    """
+    global _preprocessor
+
+    with _lock:
+        if _preprocessor is None:
+            _preprocessor = ControlPreprocessor()
+        return _preprocessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocesado de imágenes de control para ControlNet")
+    parser.add_argument("inputs", nargs="+", help="Imágenes o directorios de bocetos")
+    parser.add_argument("--kinds", default="canny", help=f"Mapas separados por comas ({', '.join(CONTROL_MAPS)})")
+    parser.add_argument("--output-dir", default="control_maps", help="Directorio de salida")
+    parser.add_argument("--width", type=int, default=1024, help="Ancho objetivo")
+    parser.add_argument("--height", type=int, default=1024, help="Alto objetivo")
+    parser.add_argument("--stretch", action="store_true", help="Deformar al tamaño exacto en lugar de conservar la proporción")
+    parser.add_argument("--low", type=int, default=100, help="Umbral bajo de Canny")
+    parser.add_argument("--high", type=int, default=200, help="Umbral alto de Canny")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos de preprocesado")
+    args = parser.parse_args()
+
+    from src.dedup import iter_image_paths
+
+    paths = list(iter_image_paths(args.inputs))
+    if not paths:
+        print("⚠️ No se encontraron imágenes")
+        sys.exit(1)
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    preprocessor = ControlPreprocessor(
+        cache=get_control_preprocessor().cache,
+        width=args.width,
+        height=args.height,
+        keep_aspect=not args.stretch,
+        num_workers=args.workers
+    )
+    print(f"🖌️ {len(paths)} imágenes | mapas: {', '.join(kinds)} | Canny con {_implementation('canny')}")
+
+    try:
+        results = preprocessor.process_batch(paths, kinds, low_threshold=args.low, high_threshold=args.high)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for path, maps in zip(paths, results):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for kind, image in maps.items():
+            image.save(os.path.join(args.output_dir, f"{stem}_{kind}.png"))
+
+    stats = preprocessor.stats()
+    print(f"✅ {len(paths)} imágenes en {args.output_dir} | {stats['computed']} mapas calculados, {stats['cached']} desde caché")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Índice de hashes perceptuales para detectar casi-duplicados
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.dedup results/portfolio results/experiments --max-distance 8
+#   python -m src.dedup results/ --index results/dedup_index.npz
+
+import os
+import sys
+import json
+import argparse
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Lado de la imagen reducida para pHash (DCT de 32x32, se usan 8x8 coeficientes)
+_PHASH_SIDE = 32
+_HASH_SIDE = 8
+
+# Número de bits a 1 de cada byte posible, para contar bits sin np.bitwise_count (NumPy < 2.0)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_PHASH_SIDE)
+
+
+def _load_gray(image, side: int) -> Image.Image:
+    """Abre (si es ruta o bytes) y reduce a escala de grises barata antes del resize final."""
+    if isinstance(image, (bytes, bytearray, str, os.PathLike)):
+        source = BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+        with Image.open(source) as opened:
+            # draft() permite a JPEG decodificar directamente a menor escala
+            # (solo sobre imágenes abiertas aquí: modifica el objeto)
+            opened.draft("L", (side * 4, side * 4))
+            return _reduce_gray(opened, side)
+    return _reduce_gray(image, side)
+
+
+def _reduce_gray(image: Image.Image, side: int) -> Image.Image:
+    """Copia reducida en escala de grises (sin modificar la imagen)."""
+    factor = min(image.size) // (side * 4)
+    if factor > 1:
+        image = image.reduce(factor)
+    return image.convert("L")
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int(np.packbits(bits.ravel()).view(">u8")[0])
+
+
+def dhash(image, size: int = _HASH_SIDE) -> int:
+    """
+    Hash de diferencias (dHash) de 64 bits.
+
+    Args:
+        image: Imagen PIL, ruta o bytes
+
+    Returns:
+        Hash como entero sin signo de 64 bits
+    """
+    gray = _load_gray(image, size).resize((size + 1, size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image, size: int = _HASH_SIDE) -> int:
+    """
+    Hash perceptual (pHash) de 64 bits basado en la DCT.
+
+    Args:
+        image: Imagen PIL, ruta o bytes
+
+    Returns:
+        Hash como entero sin signo de 64 bits
+    """
+    gray = _load_gray(image, _PHASH_SIDE).resize((_PHASH_SIDE, _PHASH_SIDE), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float32)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:size, :size]
+    # La mediana excluye el término DC, que solo refleja el brillo medio
+    median = np.median(coefficients.ravel()[1:])
+    return _pack_bits(coefficients > median)
+
+
+def image_hashes(image) -> Tuple[int, int]:
+    """
+    Calcula ambos hashes decodificando la imagen una sola vez.
+
+    Args:
+        image: Imagen PIL, ruta o bytes
+
+    Returns:
+        Tuple (dHash, pHash)
+    """
+    gray = _load_gray(image, _PHASH_SIDE)
+    return dhash(gray), phash(gray)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Bits a 1 de cada elemento de un array uint64 (misma forma que la entrada)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    as_bytes = np.ascontiguousarray(values).view(np.uint8)
+    return _POPCOUNT[as_bytes].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.int32)
+
+
+class HashIndex:
+    """
+    Índice en memoria de hashes perceptuales (dHash + pHash).
+
+    Los hashes se guardan en un array uint64 de forma (N, 2) que crece por
+    duplicación, y las búsquedas calculan la distancia de Hamming contra
+    todo el índice de forma vectorizada. Dos imágenes se consideran
+    casi-duplicadas cuando ambos hashes difieren en como mucho
+    `max_distance` bits.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hashes = np.zeros((64, 2), dtype=np.uint64)
+        self._labels: List[str] = []
+        self._positions: Dict[str, int] = {}
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._labels)
+
+    def __contains__(self, label: str) -> bool:
+        with self._lock:
+            return label in self._positions
+
+    def add(self, label: str, hashes: Tuple[int, int]):
+        """
+        Añade (o sustituye) una entrada.
+
+        Args:
+            label: Identificador de la imagen (ruta o clave de caché)
+            hashes: Tuple (dHash, pHash)
+        """
+        row = np.array(hashes, dtype=np.uint64)
+        with self._lock:
+            position = self._positions.get(label)
+            if position is None:
+                position = len(self._labels)
+                if position == len(self._hashes):
+                    self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+                self._labels.append(label)
+                self._positions[label] = position
+            self._hashes[position] = row
+
+    def add_image(self, label: str, image) -> Tuple[int, int]:
+        """Calcula los hashes de una imagen y la añade al índice."""
+        hashes = image_hashes(image)
+        self.add(label, hashes)
+        return hashes
+
+    def _distances(self, hashes: Tuple[int, int]) -> np.ndarray:
+        query = np.array(hashes, dtype=np.uint64)
+        with self._lock:
+            stored = self._hashes[:len(self._labels)]
+        # Distancia = la mayor de las dos, así ambos hashes deben coincidir
+        return _popcount(stored ^ query).max(axis=1)
+
+    def search(self, hashes: Tuple[int, int], max_distance: int = 8, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Busca entradas casi idénticas.
+
+        Args:
+            hashes: Tuple (dHash, pHash) de la imagen consultada
+            max_distance: Bits distintos permitidos (de 64)
+            limit: Número máximo de resultados
+
+        Returns:
+            Lista de (etiqueta, distancia) de la más parecida a la menos
+        """
+        distances = self._distances(hashes)
+        matches = np.flatnonzero(distances <= max_distance)
+        matches = matches[np.argsort(distances[matches], kind="stable")][:limit]
+        with self._lock:
+            return [(self._labels[i], int(distances[i])) for i in matches]
+
+    def duplicates(self, max_distance: int = 8, block_size: int = 128) -> List[List[str]]:
+        """
+        Agrupa todas las entradas casi idénticas entre sí.
+
+        Compara el índice consigo mismo por bloques (memoria acotada), solo
+        contra las filas posteriores y filtrando primero por pHash, y une los
+        pares encontrados con union-find.
+
+        Args:
+            max_distance: Bits distintos permitidos (de 64)
+            block_size: Filas comparadas a la vez
+
+        Returns:
+            Grupos de etiquetas con dos o más elementos
+        """
+        with self._lock:
+            count = len(self._labels)
+            stored = self._hashes[:count].copy()
+            labels = list(self._labels)
+
+        parent = np.arange(count)
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for start in range(0, count, block_size):
+            block = stored[start:start + block_size]
+            rest = stored[start:]
+            rows, cols = np.nonzero(_popcount(block[:, None, 1] ^ rest[None, :, 1]) <= max_distance)
+            close = _popcount(block[rows, 0] ^ rest[cols, 0]) <= max_distance
+            for i, j in zip(rows[close] + start, cols[close] + start):
+                if i < j:
+                    parent[find(i)] = find(j)
+
+        groups: Dict[int, List[str]] = {}
+        for i in range(count):
+            groups.setdefault(find(i), []).append(labels[i])
+        return [group for group in groups.values() if len(group) > 1]
+
+    def save(self, path: Optional[str] = None):
+        """Guarda el índice en un archivo .npz (escritura atómica)."""
+        path = path or self.path
+        with self._lock:
+            hashes = self._hashes[:len(self._labels)].copy()
+            labels = np.array(self._labels, dtype=object)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, hashes=hashes, labels=labels.astype(str))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Carga un índice guardado con save."""
+        with np.load(path) as data:
+            hashes = data["hashes"]
+            labels = [str(label) for label in data["labels"]]
+
+        with self._lock:
+            self._hashes = np.zeros((max(64, len(labels) * 2), 2), dtype=np.uint64)
+            self._hashes[:len(labels)] = hashes
+            self._labels = labels
+            self._positions = {label: i for i, label in enumerate(labels)}
+
+
+def iter_image_paths(roots: Iterable[str]) -> Iterable[str]:
+    """Recorre recursivamente los directorios y devuelve las rutas de imágenes."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        for directory, _, names in os.walk(root):
+            for name in sorted(names):
+                if name.lower().endswith(_IMAGE_EXTENSIONS):
+                    yield os.path.join(directory, name)
+
+
+def index_paths(index: HashIndex, paths: Iterable[str], num_workers: int = 4) -> int:
+    """
+    Añade al índice las imágenes que aún no estén, en paralelo.
+
+    Returns:
+        Número de imágenes indexadas
+    """
+    pending = [path for path in paths if path not in index]
+
+    def _hash(path):
+        try:
+            return path, image_hashes(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Omitido {path}: {e}", file=sys.stderr)
+            return path, None
+
+    added = 0
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        for path, hashes in pool.map(_hash, pending):
+            if hashes is not None:
+                index.add(path, hashes)
+                added += 1
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Busca imágenes casi idénticas con hashes perceptuales")
+    parser.add_argument("roots", nargs="+", help="Directorios o imágenes a analizar")
+    parser.add_argument("--max-distance", type=int, default=8, help="Bits distintos permitidos (de 64)")
+    parser.add_argument("--index", help="Archivo .npz donde guardar/reutilizar los hashes")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    index = HashIndex(args.index)
+    added = index_paths(index, iter_image_paths(args.roots), args.workers)
+    if args.index:
+        index.save()
+
+    groups = index.duplicates(args.max_distance)
+    if args.json:
+        print(json.dumps(groups, ensure_ascii=False, indent=2))
+        return
+
+    print(f"🔍 {len(index)} imágenes indexadas ({added} nuevas) | {len(groups)} grupos de casi-duplicados")
+    for group in groups:
+        print(f"\n♻️ {len(group)} imágenes:")
+        for label in group:
+            print(f"   {label}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Copias de visualización y miniaturas para la interfaz
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Los originales (PNG sin pérdida, 1-2 MB a 1024x1024) se guardan tal cual
+# para descargarlos. Al navegador se envían una copia de visualización en
+# WebP o JPEG (~100 KB) y miniaturas para la galería. Cada original se
+# decodifica una sola vez y las copias se codifican en un pool de hilos
+# (Pillow libera el GIL al codificar), en paralelo entre variantes y con
+# la escritura de los originales y de la cuadrícula.
+
+import os
+import time
+import hashlib
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from src.storage import OutputStore
+
+# Formato -> (extensión, formato de Pillow)
+DISPLAY_FORMATS: Dict[str, Tuple[str, str]] = {
+    "webp": (".webp", "WEBP"),
+    "jpeg": (".jpg", "JPEG"),
+    "png": (".png", "PNG"),
+}
+
+# WebP método 2: la mitad de tiempo que el 4 (por defecto) con ~2% más de bytes
+_WEBP_METHOD = 2
+
+
+class Rendition(NamedTuple):
+    """Copias de una imagen para la interfaz."""
+
+    display: str
+    thumbnail: str
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA", "P"):
+        # JPEG no admite transparencia: aplanar sobre blanco
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+class DeliveryEncoder:
+    """
+    Codifica las copias de visualización y las miniaturas en un pool de hilos.
+
+    Las copias se escriben en el almacén de salidas (con su TTL y límite de
+    tamaño). Las de las imágenes codificadas recientemente se recuerdan por
+    contenido, de modo que un resultado servido desde caché no se vuelve a
+    codificar mientras sus copias sigan en el almacén.
+    """
+
+    def __init__(
+        self,
+        store: OutputStore,
+        display_format: str = "webp",
+        quality: int = 85,
+        max_side: int = 1024,
+        thumbnail_side: int = 256,
+        num_workers: int = 4,
+        remember: int = 256
+    ):
+        """
+        Args:
+            store: Almacén donde se escriben las copias
+            display_format: "webp", "jpeg" o "png"
+            quality: Calidad de WebP/JPEG (1-100)
+            max_side: Lado máximo de la copia de visualización
+            thumbnail_side: Lado máximo de las miniaturas
+            num_workers: Hilos de codificación
+            remember: Imágenes cuyas copias se recuerdan por contenido
+        """
+        if display_format not in DISPLAY_FORMATS:
+            raise ValueError(f"Formato de visualización desconocido: {display_format} (usa {', '.join(DISPLAY_FORMATS)})")
+
+        self.store = store
+        self.display_format = display_format
+        self.quality = quality
+        self.max_side = max_side
+        self.thumbnail_side = thumbnail_side
+        self.remember = remember
+
+        self._pool = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="edudiff-delivery")
+        self._lock = threading.Lock()
+        self._recent: "OrderedDict[str, Rendition]" = OrderedDict()
+
+        self.encoded = 0
+        self.reused = 0
+        self.original_bytes = 0
+        self.display_bytes = 0
+        self.thumbnail_bytes = 0
+        self.encode_seconds = 0.0
+
+    def _save(self, image: Image.Image) -> str:
+        suffix, pil_format = DISPLAY_FORMATS[self.display_format]
+        options = {}
+        if pil_format == "WEBP":
+            options = {"quality": self.quality, "method": _WEBP_METHOD}
+        elif pil_format == "JPEG":
+            options = {"quality": self.quality, "optimize": True}
+            image = _to_rgb(image)
+        elif pil_format == "PNG":
+            options = {"compress_level": 1}
+        return self.store.save_with(lambda path: image.save(path, format=pil_format, **options), suffix=suffix)
+
+    def _fit(self, image: Image.Image, side: int) -> Image.Image:
+        if max(image.size) <= side:
+            return image
+        copy = image.copy()
+        # reducing_gap: reducción por bloques antes del filtro final (mucho más rápido)
+        copy.thumbnail((side, side), Image.LANCZOS, reducing_gap=3.0)
+        return copy
+
+    def _lookup(self, digest: str) -> Optional[Rendition]:
+        with self._lock:
+            rendition = self._recent.get(digest)
+            if rendition is None:
+                return None
+            try:
+                # Renovar la antigüedad para que la recolección no las borre mientras se muestran
+                os.utime(rendition.display)
+                os.utime(rendition.thumbnail)
+            except OSError:
+                # El almacén ya recolectó las copias
+                del self._recent[digest]
+                return None
+            self._recent.move_to_end(digest)
+            self.reused += 1
+            return rendition
+
+    def _encode(self, data: bytes) -> Rendition:
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        rendition = self._lookup(digest)
+        if rendition is not None:
+            return rendition
+
+        start = time.perf_counter()
+        with Image.open(BytesIO(data)) as image:
+            image.load()
+            display = self._fit(image, self.max_side)
+            if display is image and self.display_format == "png":
+                # Sin reducir ni cambiar de formato: la copia es el original tal cual
+                display_path = self.store.save_bytes(data, suffix=".png")
+            else:
+                display_path = self._save(display)
+            rendition = Rendition(display_path, self._save(self._fit(display, self.thumbnail_side)))
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._recent[digest] = rendition
+            while len(self._recent) > self.remember:
+                self._recent.popitem(last=False)
+            self.encoded += 1
+            self.original_bytes += len(data)
+            self.display_bytes += os.path.getsize(rendition.display)
+            self.thumbnail_bytes += os.path.getsize(rendition.thumbnail)
+            self.encode_seconds += elapsed
+        return rendition
+
+    def submit(self, data: bytes) -> "Future[Rendition]":
+        """
+        Encola la codificación de las copias de una imagen.
+
+        Args:
+            data: Bytes del original
+
+        Returns:
+            Future con la Rendition (rutas de la copia y de la miniatura)
+        """
+        return self._pool.submit(self._encode, data)
+
+    def _encode_file(self, path: str) -> str:
+        with Image.open(path) as image:
+            image.load()
+            return self._save(self._fit(image, self.max_side))
+
+    def submit_file(self, path: str) -> "Future[str]":
+        """
+        Encola la copia de visualización (sin miniatura) de un archivo, p. ej. una cuadrícula.
+
+        Args:
+            path: Ruta del original
+
+        Returns:
+            Future con la ruta de la copia
+        """
+        return self._pool.submit(self._encode_file, path)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas de codificación.
+
+        Returns:
+            Diccionario con imágenes codificadas y reutilizadas, bytes de los
+            originales, de las copias y de las miniaturas, segundos de
+            codificación y la fracción de bytes que se ahorra al enviar las copias
+        """
+        with self._lock:
+            return {
+                "encoded": self.encoded,
+                "reused": self.reused,
+                "original_bytes": self.original_bytes,
+                "display_bytes": self.display_bytes,
+                "thumbnail_bytes": self.thumbnail_bytes,
+                "encode_seconds": round(self.encode_seconds, 3),
+                "savings": round(1 - self.display_bytes / self.original_bytes, 3) if self.original_bytes else 0.0,
+            }
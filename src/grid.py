@@ -0,0 +1,222 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Cuadrículas y hojas de contacto con memoria acotada
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.grid results/exp3_styles_comparison.png results/experiments/*.png --cols 6
+#   python -m src.grid hoja.png results/portfolio/*.png --cols 10 --tile 256
+#
+# A diferencia de src.utils.create_image_grid, las imágenes se leen desde
+# disco fila a fila y la hoja se codifica en PNG por franjas: la memoria
+# pico depende del tamaño de una fila de la cuadrícula, no del número total
+# de imágenes.
+
+import os
+import zlib
+import math
+import struct
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Tamaño a partir del cual se vacía un chunk IDAT
+_IDAT_CHUNK_BYTES = 256 * 1024
+
+
+class PNGStripWriter:
+    """
+    Codificador PNG RGB de 8 bits que recibe la imagen por franjas horizontales.
+
+    Cada franja se filtra (filtro Sub, vectorizado con NumPy) y se pasa a un
+    compresor zlib incremental; los datos comprimidos se escriben en chunks
+    IDAT a medida que se acumulan, sin tener nunca la imagen completa en RAM.
+    """
+
+    def __init__(self, f: BinaryIO, width: int, height: int, compress_level: int = 6):
+        self._f = f
+        self.width = width
+        self.height = height
+        self._rows_written = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._buffer = bytearray()
+
+        f.write(_PNG_SIGNATURE)
+        # Ancho, alto, 8 bits, color RGB (2), compresión, filtro y sin entrelazado
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self._f.write(struct.pack(">I", len(data)))
+        self._f.write(kind)
+        self._f.write(data)
+        self._f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def _emit(self, data: bytes, final: bool = False):
+        self._buffer += data
+        if self._buffer and (final or len(self._buffer) >= _IDAT_CHUNK_BYTES):
+            self._chunk(b"IDAT", bytes(self._buffer))
+            self._buffer.clear()
+
+    def write_strip(self, strip: np.ndarray):
+        """
+        Añade una franja de filas.
+
+        Args:
+            strip: Array uint8 (filas, width, 3)
+        """
+        rows = strip.shape[0]
+        if strip.shape[1:] != (self.width, 3):
+            raise ValueError(f"La franja debe tener forma (n, {self.width}, 3)")
+        if self._rows_written + rows > self.height:
+            raise ValueError("Se han escrito más filas que el alto de la imagen")
+
+        flat = strip.reshape(rows, -1)
+        filtered = np.empty((rows, flat.shape[1] + 1), dtype=np.uint8)
+        # Filtro Sub: cada byte menos el del píxel anterior (módulo 256)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = flat[:, :3]
+        np.subtract(flat[:, 3:], flat[:, :-3], out=filtered[:, 4:])
+
+        self._emit(self._compressor.compress(filtered.tobytes()))
+        self._rows_written += rows
+
+    def close(self):
+        """Vacía el compresor y escribe el final del archivo."""
+        if self._rows_written != self.height:
+            raise ValueError(f"Faltan filas: {self._rows_written}/{self.height}")
+        self._emit(self._compressor.flush(), final=True)
+        self._chunk(b"IEND", b"")
+
+
+def load_tile(path: str, size: Tuple[int, int]) -> Image.Image:
+    """
+    Abre una imagen y la lleva a `size` decodificando lo mínimo posible.
+
+    JPEG se decodifica directamente a menor escala con draft(); para otros
+    formatos se aplica reduce() por un factor entero antes del LANCZOS final.
+
+    Args:
+        path: Ruta de la imagen
+        size: Tamaño (ancho, alto) de la celda
+
+    Returns:
+        Imagen RGB del tamaño pedido
+    """
+    with Image.open(path) as img:
+        img.draft("RGB", size)
+        factor = min(img.width // size[0], img.height // size[1])
+        if factor > 1:
+            img = img.reduce(factor)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+        else:
+            img.load()
+        return img
+
+
+def build_grid_streaming(
+    paths: Sequence[str],
+    output_path: str,
+    cols: int = 3,
+    tile_size: Optional[Tuple[int, int]] = None,
+    padding: int = 10,
+    bg_color: Tuple[int, int, int] = (255, 255, 255),
+    num_workers: int = 4,
+    compress_level: int = 6
+) -> Tuple[int, int]:
+    """
+    Crea una cuadrícula PNG a partir de rutas sin cargarlas todas a la vez.
+
+    Las celdas de cada fila se cargan y redimensionan en un pool de hilos
+    (la fila siguiente se prepara mientras se codifica la actual) y la hoja
+    se escribe franja a franja con PNGStripWriter.
+
+    Args:
+        paths: Rutas de las imágenes, en orden de lectura
+        output_path: Ruta del PNG de salida
+        cols: Número de columnas
+        tile_size: Tamaño (ancho, alto) de cada celda; por defecto el de la
+            primera imagen
+        padding: Espacio entre imágenes
+        bg_color: Color de fondo RGB
+        num_workers: Hilos para decodificar y redimensionar
+        compress_level: Nivel de compresión zlib (0-9)
+
+    Returns:
+        Tamaño (ancho, alto) de la cuadrícula
+    """
+    if not paths:
+        raise ValueError("La lista de imágenes no puede estar vacía")
+
+    if tile_size is None:
+        # Image.open solo lee la cabecera
+        with Image.open(paths[0]) as first:
+            tile_size = first.size
+
+    tile_w, tile_h = tile_size
+    rows = math.ceil(len(paths) / cols)
+    grid_w = cols * tile_w + (cols + 1) * padding
+    grid_h = rows * tile_h + (rows + 1) * padding
+
+    background = np.array(bg_color, dtype=np.uint8)
+    gap = np.broadcast_to(background, (padding, grid_w, 3))
+
+    def _row_paths(row: int) -> List[str]:
+        return list(paths[row * cols:(row + 1) * cols])
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool, open(output_path, 'wb') as f:
+        writer = PNGStripWriter(f, grid_w, grid_h, compress_level)
+
+        def _submit(row: int):
+            return [pool.submit(load_tile, p, tile_size) for p in _row_paths(row)]
+
+        pending = _submit(0)
+        for row in range(rows):
+            # Preparar la fila siguiente mientras se compone y codifica esta
+            upcoming = _submit(row + 1) if row + 1 < rows else []
+
+            strip = np.empty((tile_h, grid_w, 3), dtype=np.uint8)
+            strip[:] = background
+            for col, future in enumerate(pending):
+                x = padding + col * (tile_w + padding)
+                strip[:, x:x + tile_w] = np.asarray(future.result())
+
+            if padding:
+                writer.write_strip(gap)
+            writer.write_strip(strip)
+            pending = upcoming
+
+        if padding:
+            writer.write_strip(gap)
+        writer.close()
+
+    return grid_w, grid_h
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea una hoja de contacto PNG con memoria acotada")
+    parser.add_argument("output", help="PNG de salida")
+    parser.add_argument("images", nargs="+", help="Imágenes de entrada")
+    parser.add_argument("--cols", type=int, default=0, help="Columnas (por defecto, cuadrícula cuadrada)")
+    parser.add_argument("--tile", type=int, help="Lado de cada celda en píxeles (por defecto, el de la primera imagen)")
+    parser.add_argument("--padding", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    cols = args.cols or math.ceil(math.sqrt(len(args.images)))
+    tile_size = (args.tile, args.tile) if args.tile else None
+    width, height = build_grid_streaming(
+        args.images, args.output, cols=cols, tile_size=tile_size,
+        padding=args.padding, num_workers=args.workers
+    )
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"🖼️ {args.output}: {len(args.images)} imágenes | {width}x{height} | {size_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
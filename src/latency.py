@@ -0,0 +1,331 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Modelo de latencia, tiempo estimado (ETA) y control de admisión
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# El modelo aprende de las generaciones observadas cuánto tarda cada backend
+# según los steps, las variantes y la resolución. Con él y la cola del
+# planificador se estima el tiempo hasta el resultado y, si la espera
+# prevista supera el SLO configurado, la petición se rechaza o se aligera
+# (menos steps o variantes) en lugar de dejar que expire.
+
+import time
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Tuple
+
+# Referencia mientras no hay observaciones: ~0.34 s por step y por imagen a
+# 1024x1024 (results/experiments.md, experimento 2: 15 → 5s, 30 → 10s, 50 → 17s)
+PRIOR_SECONDS_PER_STEP = 0.34
+_REFERENCE_PIXELS = 1024 * 1024
+
+
+def _median(values: List[float]) -> float:
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+class LatencyModel:
+    """
+    Latencia de generación por (backend, resolución) con ventana deslizante.
+
+    Cada observación es (steps × variantes, segundos). La predicción usa la
+    mediana de las últimas muestras con el mismo trabajo si hay suficientes
+    y, si no, una recta tiempo = a + b·trabajo ajustada sobre la ventana.
+    Sin observaciones se usa la referencia de results/experiments.md
+    escalada por número de píxeles.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        min_samples: int = 3,
+        recent: int = 20,
+        prior_seconds_per_step: float = PRIOR_SECONDS_PER_STEP
+    ):
+        """
+        Args:
+            window: Observaciones que se conservan por grupo
+            min_samples: Muestras con el mismo trabajo para usar su mediana
+            recent: Cuántas de esas muestras (las más recientes) entran en la mediana
+            prior_seconds_per_step: Segundos por step e imagen a 1024x1024 sin datos
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.recent = recent
+        self.prior_seconds_per_step = prior_seconds_per_step
+
+        self._lock = threading.Lock()
+        self._groups: Dict[Tuple[str, int, int], Deque[Tuple[int, float]]] = {}
+        self.observations = 0
+
+    def observe(self, backend: str, width: int, height: int, steps: int, n: int, seconds: float):
+        """
+        Registra la duración de una generación (sin la espera en cola).
+
+        Args:
+            backend: Nombre del backend
+            width: Ancho de la imagen
+            height: Alto de la imagen
+            steps: Pasos de inferencia
+            n: Número de variantes
+            seconds: Duración observada
+        """
+        key = (backend, int(width), int(height))
+        with self._lock:
+            samples = self._groups.get(key)
+            if samples is None:
+                samples = self._groups[key] = deque(maxlen=self.window)
+            samples.append((int(steps) * int(n), float(seconds)))
+            self.observations += 1
+
+    def predict(self, backend: str, width: int, height: int, steps: int, n: int) -> float:
+        """
+        Predice la duración de una generación.
+
+        Args:
+            backend: Nombre del backend
+            width: Ancho de la imagen
+            height: Alto de la imagen
+            steps: Pasos de inferencia
+            n: Número de variantes
+
+        Returns:
+            Segundos previstos
+        """
+        work = int(steps) * int(n)
+        with self._lock:
+            samples = list(self._groups.get((backend, int(width), int(height)), ()))
+
+        if not samples:
+            return self.prior_seconds_per_step * work * (int(width) * int(height)) / _REFERENCE_PIXELS
+
+        same = [seconds for sample_work, seconds in samples if sample_work == work]
+        if len(same) >= self.min_samples:
+            return _median(same[-self.recent:])
+
+        # Recta por mínimos cuadrados sobre la ventana (pendiente e intercepto no negativos)
+        xs = [sample_work for sample_work, _ in samples]
+        ys = [seconds for _, seconds in samples]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x == 0:
+            # Un solo trabajo observado: escalar proporcionalmente
+            return mean_y * work / mean_x if mean_x else mean_y
+        slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x)
+        intercept = max(0.0, mean_y - slope * mean_x)
+        return intercept + slope * work
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas del modelo.
+
+        Returns:
+            Diccionario con grupos (backend, resolución) y observaciones
+        """
+        with self._lock:
+            return {"groups": len(self._groups), "observations": self.observations}
+
+
+class Admission(NamedTuple):
+    """Decisión de admisión de una petición."""
+
+    accepted: bool
+    steps: int
+    variants: int
+    wait: float
+    service: float
+    # Aviso para el usuario si la petición se rechaza o se ajusta ("" si no)
+    message: str
+
+    @property
+    def eta(self) -> float:
+        return self.wait + self.service
+
+
+class AdmissionController:
+    """
+    Estima la espera de cada petición y decide si se admite.
+
+    La espera es la de la cola de la API (`queue_wait(prioridad)`) más, en
+    backends que generan de una en una (`sequential`), el trabajo previsto
+    que queda de las generaciones en curso. Con `slo_seconds` > 0, una
+    petición cuya espera supera el SLO se rechaza; si la espera cabe pero
+    espera + generación no, se reducen los steps (hasta `min_steps`) y
+    después las variantes.
+    """
+
+    def __init__(
+        self,
+        model: LatencyModel,
+        backend: str,
+        width: int,
+        height: int,
+        queue_wait: Callable[[int], float],
+        sequential: bool = False,
+        slo_seconds: float = 0.0,
+        min_steps: int = 10
+    ):
+        """
+        Args:
+            model: Modelo de latencia
+            backend: Nombre del backend
+            width: Ancho de las imágenes
+            height: Alto de las imágenes
+            queue_wait: Función que estima la espera en cola para una prioridad
+            sequential: El backend ejecuta las generaciones de una en una
+            slo_seconds: Tiempo máximo aceptable hasta el resultado (0 = sin control)
+            min_steps: Steps mínimos al aligerar una petición
+        """
+        self.model = model
+        self.backend = backend
+        self.width = width
+        self.height = height
+        self.queue_wait = queue_wait
+        self.sequential = sequential
+        self.slo_seconds = slo_seconds
+        self.min_steps = min_steps
+
+        self._lock = threading.Lock()
+        self._running: Dict[int, Tuple[float, float]] = {}
+        self._ids = itertools.count()
+
+        self.accepted = 0
+        self.downgraded = 0
+        self.rejected = 0
+
+    def predict(self, steps: int, n: int) -> float:
+        """Duración prevista de una generación en este backend y resolución."""
+        return self.model.predict(self.backend, self.width, self.height, steps, n)
+
+    @contextmanager
+    def running(self, steps: int, n: int) -> Iterator[None]:
+        """
+        Marca una generación en curso: cuenta como trabajo pendiente para las
+        que lleguen después y, al terminar sin error, alimenta el modelo.
+
+        Args:
+            steps: Pasos de inferencia
+            n: Número de variantes
+        """
+        run_id = next(self._ids)
+        start = time.monotonic()
+        with self._lock:
+            self._running[run_id] = (start, self.predict(steps, n))
+        try:
+            yield
+            self.model.observe(self.backend, self.width, self.height, steps, n, time.monotonic() - start)
+        finally:
+            with self._lock:
+                del self._running[run_id]
+
+    def _backlog(self) -> float:
+        """Trabajo previsto que queda de las generaciones en curso (backends secuenciales)."""
+        now = time.monotonic()
+        with self._lock:
+            running = list(self._running.values())
+        if not running:
+            return 0.0
+        oldest = min(start for start, _ in running)
+        return max(0.0, sum(predicted for _, predicted in running) - (now - oldest))
+
+    def estimate(self, steps: int, n: int, priority: int = 0) -> Tuple[float, float]:
+        """
+        Estima la espera y la duración de una petición que llegara ahora.
+
+        Args:
+            steps: Pasos de inferencia
+            n: Número de variantes
+            priority: Prioridad en la cola de la API
+
+        Returns:
+            Tuple (segundos de espera, segundos de generación)
+        """
+        wait = self.queue_wait(priority)
+        if self.sequential:
+            wait += self._backlog()
+        return wait, self.predict(steps, n)
+
+    def evaluate(self, steps: int, n: int, priority: int = 0) -> Admission:
+        """
+        Calcula la decisión de admisión sin registrarla (p. ej. para mostrarla antes de generar).
+
+        Args:
+            steps: Pasos de inferencia pedidos
+            n: Número de variantes pedidas
+            priority: Prioridad en la cola de la API
+
+        Returns:
+            Admission con los parámetros a usar y el tiempo estimado
+        """
+        steps, n = int(steps), int(n)
+        wait, service = self.estimate(steps, n, priority)
+
+        if not self.slo_seconds or wait + service <= self.slo_seconds:
+            return Admission(True, steps, n, wait, service, "")
+
+        if wait > self.slo_seconds:
+            return Admission(
+                False, steps, n, wait, service,
+                f"⏳ Servicio saturado: espera estimada {wait:.0f}s (límite {self.slo_seconds:.0f}s). "
+                f"Inténtalo de nuevo en unos segundos."
+            )
+
+        budget = self.slo_seconds - wait
+        new_steps, new_n = steps, n
+        while new_steps > self.min_steps and self.predict(new_steps, new_n) > budget:
+            new_steps -= 1
+        while new_n > 1 and self.predict(new_steps, new_n) > budget:
+            new_n -= 1
+        if (new_steps, new_n) == (steps, n):
+            # Ya en el mínimo: se admite aunque no llegue al SLO
+            return Admission(True, steps, n, wait, service, "")
+
+        changes = [f"{new_steps} steps"] if new_steps != steps else []
+        if new_n != n:
+            changes.append(f"{new_n} variante{'s' if new_n > 1 else ''}")
+        service = self.predict(new_steps, new_n)
+        return Admission(
+            True, new_steps, new_n, wait, service,
+            f"⚙️ Carga alta: ajustado a {' y '.join(changes)} (~{wait + service:.0f}s)"
+        )
+
+    def decide(self, steps: int, n: int, priority: int = 0) -> Admission:
+        """
+        Decide si una petición se admite tal cual, aligerada o no se admite.
+
+        Args:
+            steps: Pasos de inferencia pedidos
+            n: Número de variantes pedidas
+            priority: Prioridad en la cola de la API
+
+        Returns:
+            Admission con los parámetros a usar y el tiempo estimado
+        """
+        admission = self.evaluate(steps, n, priority)
+        with self._lock:
+            if not admission.accepted:
+                self.rejected += 1
+            elif (admission.steps, admission.variants) != (int(steps), int(n)):
+                self.downgraded += 1
+            else:
+                self.accepted += 1
+        return admission
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas de admisión.
+
+        Returns:
+            Diccionario con peticiones admitidas, aligeradas, rechazadas y en curso
+        """
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "downgraded": self.downgraded,
+                "rejected": self.rejected,
+                "running": len(self._running),
+                "slo_seconds": self.slo_seconds,
+            }
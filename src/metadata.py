@@ -0,0 +1,292 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Almacén indexado de metadatos de generación (SQLite, WAL)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.metadata import results/ --db results/metadata.db
+#   python -m src.metadata query --db results/metadata.db --seed 456 --steps 30
+#   python -m src.metadata styles --db results/metadata.db
+
+import os
+import sys
+import glob
+import json
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Columnas indexables; el resto de campos se guarda en `extra` como JSON
+_COLUMNS = (
+    "image_path", "prompt", "full_prompt", "style", "steps", "guidance",
+    "seed", "resolution", "generation_time", "timestamp", "status",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    image_path TEXT,
+    prompt TEXT,
+    full_prompt TEXT,
+    style TEXT,
+    steps INTEGER,
+    guidance REAL,
+    seed INTEGER,
+    resolution TEXT,
+    generation_time REAL,
+    timestamp TEXT,
+    status TEXT,
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_generations_image ON generations(image_path);
+CREATE INDEX IF NOT EXISTS idx_generations_style ON generations(style);
+CREATE INDEX IF NOT EXISTS idx_generations_seed_steps ON generations(seed, steps);
+CREATE INDEX IF NOT EXISTS idx_generations_timestamp ON generations(timestamp);
+"""
+
+
+def _to_row(record: Dict) -> tuple:
+    extra = {k: v for k, v in record.items() if k not in _COLUMNS}
+    return tuple(record.get(c) for c in _COLUMNS) + (json.dumps(extra, ensure_ascii=False) if extra else None,)
+
+
+def _from_row(row: sqlite3.Row) -> Dict:
+    record = {k: row[k] for k in row.keys() if k != "extra" and row[k] is not None}
+    if row["extra"]:
+        record.update(json.loads(row["extra"]))
+    return record
+
+
+class MetadataStore:
+    """
+    Metadatos de todas las generaciones en una sola base SQLite.
+
+    La base usa modo WAL, de modo que las lecturas no bloquean la escritura.
+    Los registros se acumulan en memoria y se insertan por lotes en una sola
+    transacción (add + flush), en lugar de escribir un JSON por imagen.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 64):
+        self.db_path = db_path
+        self.batch_size = batch_size
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # LIKE de SQLite solo ignora mayúsculas en ASCII ("Célula" vs "CÉLULA")
+        self._conn.create_function("casefold", 1, lambda t: t.casefold() if t else t, deterministic=True)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Escritura
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def add(self, record: Dict) -> bool:
+        """
+        Añade un registro al lote pendiente.
+
+        Args:
+            record: Metadatos de una imagen (mismos campos que save_generation_metadata)
+
+        Returns:
+            True si el lote se escribió en disco con esta llamada
+        """
+        with self._lock:
+            self._pending.append(_to_row(record))
+            if len(self._pending) < self.batch_size:
+                return False
+            self._write_pending()
+        return True
+
+    def add_many(self, records: Iterable[Dict]) -> int:
+        """
+        Inserta varios registros en una sola transacción.
+
+        Returns:
+            Número de registros insertados
+        """
+        rows = [_to_row(r) for r in records]
+        with self._lock:
+            self._pending.extend(rows)
+            self._write_pending()
+        return len(rows)
+
+    def flush(self):
+        """Escribe en disco los registros pendientes."""
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        placeholders = ", ".join("?" * (len(_COLUMNS) + 1))
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO generations ({', '.join(_COLUMNS)}, extra) VALUES ({placeholders})",
+                self._pending
+            )
+        self._pending.clear()
+
+    @property
+    def pending(self) -> int:
+        """Registros añadidos que aún no se han escrito."""
+        with self._lock:
+            return len(self._pending)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Consultas
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def query(
+        self,
+        prompt: Optional[str] = None,
+        style: Optional[str] = None,
+        seed: Optional[int] = None,
+        steps: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Busca generaciones por sus parámetros.
+
+        Args:
+            prompt: Texto contenido en el prompt (sin distinguir mayúsculas)
+            style: Estilo exacto
+            seed: Semilla exacta
+            steps: Pasos exactos
+            since: Fecha ISO mínima (incluida)
+            until: Fecha ISO máxima (excluida)
+            limit: Número máximo de resultados
+
+        Returns:
+            Lista de registros, del más reciente al más antiguo
+        """
+        conditions, params = [], []
+        if prompt:
+            conditions.append("casefold(prompt) LIKE ?")
+            params.append(f"%{prompt.casefold()}%")
+        for column, value in (("style", style), ("seed", seed), ("steps", steps)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+
+        sql = "SELECT * FROM generations"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        self.flush()
+        with self._lock:
+            return [_from_row(row) for row in self._conn.execute(sql, params)]
+
+    def style_summary(self) -> List[Dict]:
+        """
+        Agrega las generaciones por estilo.
+
+        Returns:
+            Lista con estilo, número de imágenes y tiempo medio de generación
+        """
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT style, COUNT(*) AS images, AVG(generation_time) AS avg_time "
+                "FROM generations GROUP BY style ORDER BY images DESC"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def close(self):
+        """Escribe lo pendiente y cierra la conexión."""
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def import_json_sidecars(store: MetadataStore, root: str) -> int:
+    """
+    Importa los archivos *_metadata.json existentes bajo un directorio.
+
+    Args:
+        store: Almacén de destino
+        root: Directorio a recorrer recursivamente
+
+    Returns:
+        Número de registros importados
+    """
+    records = []
+    for json_path in glob.glob(os.path.join(root, "**", "*_metadata.json"), recursive=True):
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Omitido {json_path}: {e}", file=sys.stderr)
+            continue
+
+        # Localizar la imagen junto al JSON si el registro no la indica
+        if "image_path" not in record:
+            base = json_path[:-len("_metadata.json")]
+            candidates = [p for p in glob.glob(glob.escape(base) + ".*") if not p.endswith(".json")]
+            record["image_path"] = candidates[0] if candidates else base
+        records.append(record)
+
+    return store.add_many(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén de metadatos de EduDiff XL")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="Importar archivos *_metadata.json")
+    p_import.add_argument("root")
+    p_import.add_argument("--db", default="results/metadata.db")
+
+    p_query = sub.add_parser("query", help="Buscar generaciones")
+    p_query.add_argument("--db", default="results/metadata.db")
+    p_query.add_argument("--prompt")
+    p_query.add_argument("--style")
+    p_query.add_argument("--seed", type=int)
+    p_query.add_argument("--steps", type=int)
+    p_query.add_argument("--since")
+    p_query.add_argument("--until")
+    p_query.add_argument("--limit", type=int, default=50)
+
+    p_styles = sub.add_parser("styles", help="Resumen por estilo")
+    p_styles.add_argument("--db", default="results/metadata.db")
+
+    args = parser.parse_args()
+    store = MetadataStore(args.db)
+
+    if args.command == "import":
+        print(f"📥 Importados {import_json_sidecars(store, args.root)} registros en {args.db}")
+    elif args.command == "query":
+        for record in store.query(args.prompt, args.style, args.seed, args.steps, args.since, args.until, args.limit):
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        for row in store.style_summary():
+            avg = f"{row['avg_time']:.2f}s" if row["avg_time"] is not None else "—"
+            print(f"{row['style']}: {row['images']} imágenes | {avg} de media")
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Métricas de latencia por etapa (Prometheus) y logs estructurados
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Cada etapa instrumentada (`with stage("api"):`) alimenta un histograma
+# global y, si hay una petición en curso en el contexto actual, su desglose
+# de tiempos. El desglose se muestra en el estado de la interfaz y, con
+# EDUDIFF_LOG_JSON=1, se escribe una línea JSON por petición en stderr.
+
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Límites superiores (s) de los buckets: de 1 ms a 2 minutos
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+# Nombre corto de cada etapa en el estado de la interfaz
+STAGE_LABELS = {
+    "cache_lookup": "Caché",
+    "queue": "Cola",
+    "backoff": "Reintentos",
+    "api": "API",
+    "batch_wait": "Espera de lote",
+    "inference": "Inferencia",
+    "encode": "Codificación",
+    "b64_decode": "Base64",
+    "download": "Descarga",
+    "cache_write": "Guardar caché",
+    "output_write": "Disco",
+    "grid": "Cuadrícula",
+    "display_encode": "Vista",
+    "draft": "Borrador (en paralelo)",
+}
+
+JSON_LOGS = os.environ.get("EDUDIFF_LOG_JSON", "").lower() in ("1", "true", "yes")
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus (buckets, suma y cuenta)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """
+    Registro de histogramas, contadores e indicadores del proceso.
+
+    Los indicadores (gauges) se leen en el momento de exportar a partir de
+    funciones que retornan diccionarios, como los stats() de la caché, el
+    planificador o el almacén de salidas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._help: Dict[str, str] = {}
+        self._gauge_sources: List[Tuple[str, Callable[[], Dict[str, float]]]] = []
+
+    def observe(self, name: str, value: float, help_text: str = "", **labels):
+        """Añade una observación a un histograma."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if help_text:
+                self._help.setdefault(name, help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, help_text: str = "", **labels):
+        """Incrementa un contador."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if help_text:
+                self._help.setdefault(name, help_text)
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def register_gauges(self, prefix: str, source: Callable[[], Dict[str, float]]):
+        """
+        Expone como indicadores los valores numéricos de `source()`.
+
+        Args:
+            prefix: Prefijo de los nombres (p. ej. "edudiff_cache")
+            source: Función que retorna un diccionario de valores
+        """
+        with self._lock:
+            self._gauge_sources.append((prefix, source))
+
+    def render(self) -> str:
+        """
+        Exporta todas las métricas en el formato de texto de Prometheus.
+
+        Returns:
+            Texto para el endpoint /metrics
+        """
+        with self._lock:
+            histograms = {k: (h.buckets, h.cumulative(), h.sum, h.count) for k, h in self._histograms.items()}
+            counters = dict(self._counters)
+            help_texts = dict(self._help)
+            sources = list(self._gauge_sources)
+
+        lines: List[str] = []
+        seen = set()
+
+        def _header(name: str, kind: str):
+            if name not in seen:
+                seen.add(name)
+                if name in help_texts:
+                    lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            _header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+
+        for (name, labels), (buckets, cumulative, total, count) in sorted(histograms.items()):
+            _header(name, "histogram")
+            for bound, value in zip(buckets, cumulative):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {value}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for prefix, source in sources:
+            try:
+                values = source()
+            except Exception:
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    name = f"{prefix}_{key}"
+                    _header(name, "gauge")
+                    lines.append(f"{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+_current_request: contextvars.ContextVar[Optional["RequestTimer"]] = contextvars.ContextVar(
+    "edudiff_request", default=None
+)
+
+
+class RequestTimer:
+    """
+    Desglose de tiempos de una petición.
+
+    Las etapas pueden ejecutarse en hilos auxiliares (asyncio.to_thread copia
+    el contexto), por eso el acumulado está protegido con un lock. Si dos
+    etapas se solapan, ambas cuentan su duración completa. Una petición
+    abierta dentro de otra (`parent`) le transmite también sus etapas.
+    """
+
+    def __init__(self, handler: str, parent: Optional["RequestTimer"] = None):
+        self.handler = handler
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.fields: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if self.parent is not None:
+            self.parent.add(name, seconds)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Ejecuta fn con esta petición como contexto actual (p. ej. dentro de asyncio.to_thread)."""
+        token = _current_request.set(self)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_request.reset(token)
+
+    async def run_async(self, fn: Callable, *args, **kwargs):
+        """Versión asíncrona de run: fn retorna una corrutina. Pensada para asyncio.create_task."""
+        token = _current_request.set(self)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _current_request.reset(token)
+
+    def summary(self, min_seconds: float = 0.005) -> str:
+        """
+        Resumen corto para el estado de la interfaz.
+
+        Returns:
+            Texto como "⏱️ API 11.82s · Disco 0.01s · Total 11.90s"
+        """
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1], reverse=True)
+        parts = [f"{STAGE_LABELS.get(name, name)} {seconds:.2f}s" for name, seconds in stages if seconds >= min_seconds]
+        parts.append(f"Total {self.elapsed():.2f}s")
+        return "⏱️ " + " · ".join(parts)
+
+    def finish(self, outcome: str):
+        """
+        Cierra la petición: histograma total, contador y log JSON opcional.
+
+        Args:
+            outcome: Origen del resultado o "error"
+        """
+        total = self.elapsed()
+        registry.observe(
+            "edudiff_request_seconds", total, "Duración total de las peticiones de generación",
+            handler=self.handler, outcome=outcome
+        )
+        registry.inc(
+            "edudiff_requests_total", 1, "Peticiones de generación atendidas",
+            handler=self.handler, outcome=outcome
+        )
+
+        if JSON_LOGS:
+            with self._lock:
+                stages = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+            record = {
+                "ts": datetime.now(timezone.utc).isoformat(),
+                "handler": self.handler,
+                "outcome": outcome,
+                "total_s": round(total, 4),
+                "stages": stages,
+                **self.fields,
+            }
+            print(json.dumps(record, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Mide una etapa: la registra en el histograma global y en la petición actual.
+
+    Args:
+        name: Identificador de la etapa (ver STAGE_LABELS)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_stage(name: str, seconds: float):
+    """
+    Registra una etapa medida por otro medio (p. ej. en otro hilo).
+
+    Args:
+        name: Identificador de la etapa
+        seconds: Duración
+    """
+    registry.observe("edudiff_stage_seconds", seconds, "Duración de cada etapa de la generación", stage=name)
+    current = _current_request.get()
+    if current is not None:
+        current.add(name, seconds)
+
+
+@contextmanager
+def request_timer(handler: str) -> Iterator[RequestTimer]:
+    """
+    Abre una petición en el contexto actual (hilo o tarea asyncio).
+
+    Si ya hay una petición en curso (p. ej. un barrido que llama a
+    generar_imagen), la nueva le transmite sus etapas. No usar dentro de
+    generadores asíncronos: el contexto puede cambiar entre yields. En ese
+    caso crear un RequestTimer y usar run/run_async.
+
+    Args:
+        handler: Nombre del manejador (etiqueta de las métricas)
+    """
+    timer = RequestTimer(handler, parent=_current_request.get())
+    token = _current_request.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_request.reset(token)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Sirve /metrics en un hilo en segundo plano.
+
+    Args:
+        port: Puerto TCP
+        host: Interfaz de escucha
+
+    Returns:
+        Servidor HTTP en marcha
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="edudiff-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,175 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Micro-lotes dinámicos para la inferencia local
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Las peticiones compatibles (misma clave: modelo, tamaño, steps y guidance)
+# que llegan dentro de una ventana corta se ejecutan juntas en una sola
+# llamada al pipeline, que aprovecha mucho mejor la GPU que varias llamadas
+# seguidas. Un lote se lanza en cuanto se llena o cuando su petición más
+# antigua ha esperado `max_wait` segundos.
+
+import time
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class _Request:
+    __slots__ = ("payload", "size", "future", "submitted")
+
+    def __init__(self, payload: Any, size: int):
+        self.payload = payload
+        self.size = size
+        self.future: Future = Future()
+        self.submitted = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones compatibles y las ejecuta por lotes en un hilo propio.
+
+    `run_batch(key, payloads)` recibe la clave común y la lista de payloads
+    y debe retornar un resultado por payload, en el mismo orden. Cada
+    petición ocupa `size` plazas del lote (p. ej. sus variantes); una
+    petición nunca se divide entre lotes.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[Hashable, List[Any]], List[Any]],
+        max_batch_size: int = 4,
+        max_wait: float = 0.025,
+        name: str = "edudiff-microbatch"
+    ):
+        """
+        Args:
+            run_batch: Función que ejecuta un lote
+            max_batch_size: Plazas máximas por lote
+            max_wait: Segundos máximos que espera una petición a que se llene su lote
+            name: Nombre del hilo despachador
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._pending: Dict[Hashable, List[_Request]] = {}
+        self._closed = False
+
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+        self.full_batches = 0
+
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Hashable, payload: Any, size: int = 1) -> Future:
+        """
+        Encola una petición.
+
+        Args:
+            key: Clave de compatibilidad (solo se agrupan peticiones con la misma)
+            payload: Datos de la petición para run_batch
+            size: Plazas que ocupa en el lote
+
+        Returns:
+            Future con el resultado de la petición
+        """
+        request = _Request(payload, size)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher cerrado")
+            self._pending.setdefault(key, []).append(request)
+            self._cond.notify()
+        return request.future
+
+    def _take(self, key: Hashable) -> List[_Request]:
+        """Saca de la cola de `key` las peticiones que caben en un lote (al menos una)."""
+        queue = self._pending[key]
+        batch, used = [], 0
+        while queue and (not batch or used + queue[0].size <= self.max_batch_size):
+            request = queue.pop(0)
+            # Las peticiones canceladas mientras esperaban no ocupan plaza
+            if request.future.set_running_or_notify_cancel():
+                batch.append(request)
+                used += request.size
+        if not queue:
+            del self._pending[key]
+        return batch
+
+    def _next_batch(self) -> Optional[Tuple[Hashable, List[_Request]]]:
+        """Espera hasta que algún grupo esté listo y lo retorna (None al cerrar)."""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._closed:
+                        return None
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                ready, next_deadline = None, None
+                for key, queue in self._pending.items():
+                    deadline = queue[0].submitted + self.max_wait
+                    full = sum(r.size for r in queue) >= self.max_batch_size
+                    if full or deadline <= now or self._closed:
+                        # Entre los listos, el que lleva más tiempo esperando
+                        if ready is None or queue[0].submitted < self._pending[ready][0].submitted:
+                            ready = key
+                    elif next_deadline is None or deadline < next_deadline:
+                        next_deadline = deadline
+
+                if ready is not None:
+                    batch = self._take(ready)
+                    if batch:
+                        return ready, batch
+                    continue
+                self._cond.wait(next_deadline - now)
+
+    def _loop(self):
+        while True:
+            item = self._next_batch()
+            if item is None:
+                return
+            key, batch = item
+
+            size = sum(r.size for r in batch)
+            with self._cond:
+                self.batches += 1
+                self.requests += len(batch)
+                self.items += size
+                self.full_batches += size >= self.max_batch_size
+
+            try:
+                results = self.run_batch(key, [r.payload for r in batch])
+            except BaseException as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+    def close(self, timeout: Optional[float] = None):
+        """Ejecuta lo pendiente sin esperar la ventana y detiene el hilo."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas de agrupación.
+
+        Returns:
+            Diccionario con lotes, peticiones, plazas usadas, tamaño medio y cola
+        """
+        with self._cond:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "items": self.items,
+                "full_batches": self.full_batches,
+                "avg_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+                "queued": sum(len(q) for q in self._pending.values()),
+            }
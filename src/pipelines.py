@@ -0,0 +1,348 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Registro de pipelines locales de diffusers (carga perezosa)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Cada modelo se carga la primera vez que se usa y se mantiene en memoria
+# entre peticiones. Los pipelines ociosos se descargan al superar el
+# presupuesto de memoria o tras un tiempo sin uso, en lugar de vaciar toda
+# la memoria con src.utils.clear_memory.
+#
+# torch y diffusers solo se importan al cargar el primer pipeline: la
+# aplicación funciona sin ellos con los backends remotos.
+
+import gc
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.singleflight import SingleFlight
+
+# Valores aceptados para la descarga a CPU
+OFFLOAD_MODES = ("none", "model", "sequential")
+
+DEVICE = os.environ.get("EDUDIFF_DEVICE", "auto")
+DTYPE = os.environ.get("EDUDIFF_DTYPE", "auto")
+ATTENTION_SLICING = os.environ.get("EDUDIFF_ATTENTION_SLICING", "").lower() in ("1", "true", "yes")
+CPU_OFFLOAD = os.environ.get("EDUDIFF_CPU_OFFLOAD", "none").lower()
+PIPELINE_MEMORY_MB = int(os.environ.get("EDUDIFF_PIPELINE_MEMORY_MB", "0"))
+PIPELINE_IDLE_MIN = float(os.environ.get("EDUDIFF_PIPELINE_IDLE_MIN", "0"))
+MODEL_VARIANT = os.environ.get("EDUDIFF_MODEL_VARIANT") or None
+
+_lock = threading.Lock()
+_registry: Optional["PipelineRegistry"] = None
+
+
+def resolve_device(device: str = "auto") -> str:
+    """Dispositivo efectivo: "auto" elige cuda si está disponible."""
+    if device != "auto":
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def resolve_dtype(dtype: str, device: str):
+    """
+    Tipo de los pesos: "auto" usa float16 en GPU y float32 en CPU.
+
+    Args:
+        dtype: "auto", "float16", "bfloat16" o "float32"
+        device: Dispositivo efectivo
+
+    Returns:
+        torch.dtype
+    """
+    import torch
+    if dtype == "auto":
+        return torch.float16 if device.startswith("cuda") else torch.float32
+    return getattr(torch, dtype)
+
+
+def pipeline_memory_bytes(pipe) -> int:
+    """Bytes de parámetros y buffers de todos los módulos torch del pipeline."""
+    import torch
+    total = 0
+    for component in getattr(pipe, "components", {}).values():
+        if isinstance(component, torch.nn.Module):
+            for tensor in list(component.parameters()) + list(component.buffers()):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class _Entry:
+    """Pipeline cargado con su uso, tamaño y lock de ejecución."""
+
+    def __init__(self, pipe, size_bytes: int):
+        self.pipe = pipe
+        self.size_bytes = size_bytes
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        # Los pipelines de diffusers no admiten llamadas concurrentes
+        self.run_lock = threading.Lock()
+
+
+class PipelineRegistry:
+    """
+    Registro de pipelines de diffusers compartido por todo el proceso.
+
+    Los pipelines se cargan bajo demanda (cargas concurrentes del mismo
+    modelo se agrupan en una sola) y se mantienen calientes. Antes de cargar
+    uno nuevo y al liberar uno en uso se descargan, del menos usado
+    recientemente al más, los pipelines ociosos que excedan
+    `max_memory_bytes` o lleven más de `idle_seconds` sin usarse.
+    """
+
+    def __init__(
+        self,
+        device: str = "auto",
+        dtype: str = "auto",
+        attention_slicing: bool = False,
+        cpu_offload: str = "none",
+        max_memory_bytes: int = 0,
+        idle_seconds: float = 0.0,
+        variant: Optional[str] = None
+    ):
+        """
+        Args:
+            device: "auto", "cpu", "cuda", "cuda:1", "mps"...
+            dtype: "auto", "float16", "bfloat16" o "float32"
+            attention_slicing: Calcular la atención por partes (menos memoria, algo más lento)
+            cpu_offload: "none", "model" (por componente) o "sequential" (por capa, mínimo de VRAM)
+            max_memory_bytes: Presupuesto para pipelines cargados (0 = sin límite)
+            idle_seconds: Descargar pipelines sin uso durante este tiempo (0 = nunca)
+            variant: Variante de pesos a descargar (p. ej. "fp16")
+        """
+        if cpu_offload not in OFFLOAD_MODES:
+            raise ValueError(f"cpu_offload debe ser uno de {OFFLOAD_MODES}")
+        self.device = device
+        self.dtype = dtype
+        self.attention_slicing = attention_slicing
+        self.cpu_offload = cpu_offload
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_seconds = idle_seconds
+        self.variant = variant
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._known_sizes: Dict[str, int] = {}
+        self._loading = SingleFlight()
+
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+        if idle_seconds > 0:
+            # Sin peticiones no se llama a collect(): revisar periódicamente
+            threading.Thread(target=self._reap, name="edudiff-pipelines", daemon=True).start()
+
+    def _reap(self):
+        interval = max(1.0, self.idle_seconds / 4)
+        while True:
+            time.sleep(interval)
+            self.collect()
+
+    def _load(self, model_id: str) -> _Entry:
+        """Descarga/lee el modelo y aplica las optimizaciones configuradas."""
+        from diffusers import AutoPipelineForText2Image, DPMSolverMultistepScheduler
+
+        device = resolve_device(self.device)
+        start = time.perf_counter()
+        print(f"🔄 Cargando {model_id} en {device.upper()}...")
+
+        kwargs: Dict[str, Any] = {"torch_dtype": resolve_dtype(self.dtype, device)}
+        if self.variant:
+            kwargs["variant"] = self.variant
+        pipe = AutoPipelineForText2Image.from_pretrained(model_id, **kwargs)
+
+        # Mismo scheduler que en el notebook: buena calidad con pocos steps
+        pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+        if getattr(pipe, "safety_checker", None) is not None:
+            pipe.safety_checker = None
+        pipe.set_progress_bar_config(disable=True)
+
+        if self.attention_slicing:
+            pipe.enable_attention_slicing()
+
+        if self.cpu_offload == "model":
+            pipe.enable_model_cpu_offload()
+        elif self.cpu_offload == "sequential":
+            pipe.enable_sequential_cpu_offload()
+        else:
+            pipe = pipe.to(device)
+
+        if device.startswith("cuda"):
+            try:
+                pipe.enable_xformers_memory_efficient_attention()
+            except Exception:
+                pass
+
+        entry = _Entry(pipe, pipeline_memory_bytes(pipe))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._entries[model_id] = entry
+            self._known_sizes[model_id] = entry.size_bytes
+            self.loads += 1
+            self.load_seconds += elapsed
+        print(f"✅ {model_id} cargado en {elapsed:.1f}s ({entry.size_bytes / 2**20:.0f} MB)")
+        return entry
+
+    def _acquire(self, model_id: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry is not None:
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                return entry
+
+        # Hacer sitio con lo que se sabe del modelo antes de cargarlo
+        self.collect(reserve_bytes=self._known_sizes.get(model_id, 0))
+
+        loaded, _ = self._loading.do(model_id, self._load, model_id)
+        with self._lock:
+            # Si se descargó entre la carga y la reserva, se vuelve a registrar
+            entry = self._entries.setdefault(model_id, loaded)
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+
+        self.collect()
+        return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+        self.collect()
+
+    @contextmanager
+    def use(self, model_id: str) -> Iterator[Any]:
+        """
+        Reserva un pipeline (cargándolo si hace falta) para una llamada.
+
+        La reserva impide que se descargue mientras se usa y serializa las
+        llamadas al mismo pipeline.
+
+        Args:
+            model_id: Identificador de Hugging Face o ruta local
+
+        Yields:
+            Pipeline de diffusers listo para llamar
+        """
+        entry = self._acquire(model_id)
+        try:
+            with entry.run_lock:
+                yield entry.pipe
+        finally:
+            self._release(entry)
+
+    def collect(self, reserve_bytes: int = 0) -> List[str]:
+        """
+        Descarga los pipelines ociosos caducados o que no caben en el presupuesto.
+
+        Args:
+            reserve_bytes: Memoria que se quiere dejar libre además de la usada
+
+        Returns:
+            Modelos descargados
+        """
+        names = self._pop_evictable(reserve_bytes)
+        if names:
+            # Sin referencias a los pipelines descargados: ya se pueden liberar
+            self._free_device_memory()
+            print(f"🧹 Pipelines descargados: {', '.join(names)}")
+        return names
+
+    def _pop_evictable(self, reserve_bytes: int) -> List[str]:
+        now = time.monotonic()
+        names: List[str] = []
+        with self._lock:
+            idle = sorted(
+                (name for name, e in self._entries.items() if e.in_use == 0),
+                key=lambda name: self._entries[name].last_used
+            )
+            used = sum(e.size_bytes for e in self._entries.values())
+            for name in idle:
+                last_used = self._entries[name].last_used
+                expired = self.idle_seconds and now - last_used > self.idle_seconds
+                over_budget = self.max_memory_bytes and used + reserve_bytes > self.max_memory_bytes
+                if expired or over_budget:
+                    used -= self._entries.pop(name).size_bytes
+                    names.append(name)
+            self.evictions += len(names)
+        return names
+
+    def evict(self, model_id: str) -> bool:
+        """Descarga un pipeline concreto si no está en uso."""
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry is None or entry.in_use:
+                return False
+            del self._entries[model_id], entry
+            self.evictions += 1
+        self._free_device_memory()
+        return True
+
+    def clear(self):
+        """Descarga todos los pipelines que no estén en uso."""
+        for model_id in self.loaded():
+            self.evict(model_id)
+
+    def loaded(self) -> List[str]:
+        """Modelos cargados actualmente."""
+        with self._lock:
+            return list(self._entries)
+
+    @staticmethod
+    def _free_device_memory():
+        gc.collect()
+        try:
+            import torch
+        except ImportError:
+            return
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas del registro.
+
+        Returns:
+            Diccionario con pipelines cargados, memoria estimada, cargas y descargas
+        """
+        with self._lock:
+            return {
+                "loaded": len(self._entries),
+                "in_use": sum(1 for e in self._entries.values() if e.in_use),
+                "memory_bytes": sum(e.size_bytes for e in self._entries.values()),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 3),
+            }
+
+
+def get_pipeline_registry() -> PipelineRegistry:
+    """
+    Retorna el registro de pipelines compartido por todo el proceso.
+
+    Se crea la primera vez con la configuración de EDUDIFF_DEVICE,
+    EDUDIFF_DTYPE, EDUDIFF_ATTENTION_SLICING, EDUDIFF_CPU_OFFLOAD,
+    EDUDIFF_PIPELINE_MEMORY_MB, EDUDIFF_PIPELINE_IDLE_MIN y
+    EDUDIFF_MODEL_VARIANT.
+
+    Returns:
+        Registro de pipelines
+    """
+    global _registry
+
+    with _lock:
+        if _registry is None:
+            _registry = PipelineRegistry(
+                device=DEVICE,
+                dtype=DTYPE,
+                attention_slicing=ATTENTION_SLICING,
+                cpu_offload=CPU_OFFLOAD,
+                max_memory_bytes=PIPELINE_MEMORY_MB * 1024 * 1024,
+                idle_seconds=PIPELINE_IDLE_MIN * 60,
+                variant=MODEL_VARIANT
+            )
+        return _registry
@@ -0,0 +1,378 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Planificador de llamadas a la API con límite de tasa
+# ═══════════════════════════════════════════════════════════════════════════════
+
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from src.metrics import stage
+
+# Prioridades: menor valor = se atiende antes
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Errores de red o de tiempo de espera del SDK de Together, httpx y requests
+_TRANSIENT_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException", "ConnectionError", "Timeout",
+}
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens: `rate` tokens por segundo con ráfagas de hasta `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        """Tokens disponibles ahora mismo (sin consumirlos)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Intenta consumir tokens.
+
+        Args:
+            tokens: Tokens a consumir
+
+        Returns:
+            0.0 si se consumieron, o los segundos hasta que haya suficientes
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """
+        Vacía la cubeta y la deja en deuda: el siguiente token llega dentro de `seconds`.
+
+        Args:
+            seconds: Segundos sin tokens (p. ej. el Retry-After de un 429)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0, 1.0 - seconds * self.rate)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Indica si una excepción corresponde a una respuesta HTTP 429."""
+    return _status_code(error) == 429
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Indica si una excepción es un fallo pasajero que conviene reintentar.
+
+    Respuestas 5xx y 408, conexiones caídas o rechazadas y tiempos de espera
+    agotados (sin importar qué cliente HTTP los lanzó).
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500 or status == 408
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Lee la cabecera Retry-After (en segundos) de la respuesta de un error.
+
+    Returns:
+        Segundos a esperar, o None si la cabecera no existe o no es numérica
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class RateLimitScheduler:
+    """
+    Cola con prioridad delante de la API.
+
+    Cada llamada espera turno (por prioridad y orden de llegada) y un token
+    de la cubeta antes de ejecutarse. Si la API responde 429, se reintenta
+    con backoff exponencial con jitter, respetando Retry-After cuando viene
+    en la respuesta, y la cubeta se vacía durante el Retry-After para que
+    las demás llamadas (o réplicas, con src.shared.SharedTokenBucket) no
+    insistan mientras tanto. Los fallos pasajeros (5xx, conexiones caídas,
+    timeouts) se reintentan con el mismo backoff pero sin vaciar la cubeta:
+    afectan a una llamada, no al plan. Sirve tanto para hilos como para
+    corrutinas; las llamadas en espera se despiertan cuando cambia la cola.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0
+    ):
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        # Despierta a los hilos en espera cuando cambia la cabeza de la cola
+        self._changed = threading.Condition(self._lock)
+        # Futures de las corrutinas en espera -> su bucle de eventos
+        self._async_waiters: Dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+        self._heap: list = []
+        self._seq = itertools.count()
+
+        self.acquired = 0
+        self.retries = 0
+        self.transient_retries = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Turno en la cola
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _notify_locked(self):
+        """Con el lock tomado: despierta a todas las llamadas en espera."""
+        self._changed.notify_all()
+        for waiter, loop in self._async_waiters.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, waiter)
+        self._async_waiters.clear()
+
+    def _enqueue_locked(self, priority: int) -> tuple:
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._heap, ticket)
+        if self._heap[0] == ticket:
+            # Una llamada más prioritaria pasa a ser la cabeza de la cola
+            self._notify_locked()
+        return ticket
+
+    def _try_take_locked(self, ticket: tuple) -> Optional[float]:
+        """
+        Con el lock tomado: 0.0 si el ticket obtuvo turno y token, None si no
+        es su turno, o los segundos hasta que haya un token.
+        """
+        if self._heap[0] != ticket:
+            return None
+        wait = self.bucket.try_acquire()
+        if wait == 0.0:
+            heapq.heappop(self._heap)
+            self._notify_locked()
+        return wait
+
+    def _abandon_locked(self, ticket: tuple):
+        try:
+            self._heap.remove(ticket)
+            heapq.heapify(self._heap)
+        except ValueError:
+            return
+        self._notify_locked()
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.last_wait = waited
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        Bloquea hasta obtener turno y token.
+
+        Args:
+            priority: Prioridad de la llamada
+
+        Returns:
+            Segundos esperados en la cola
+        """
+        start = time.monotonic()
+        with self._changed:
+            ticket = self._enqueue_locked(priority)
+            try:
+                while True:
+                    wait = self._try_take_locked(ticket)
+                    if wait == 0.0:
+                        break
+                    # Sin turno: hasta que cambie la cola; con turno: hasta el siguiente token
+                    self._changed.wait(wait)
+            except BaseException:
+                self._abandon_locked(ticket)
+                raise
+
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    async def acquire_async(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """Versión asíncrona de acquire."""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            ticket = self._enqueue_locked(priority)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_take_locked(ticket)
+                    if wait == 0.0:
+                        break
+                    waiter = loop.create_future()
+                    self._async_waiters[waiter] = loop
+                try:
+                    await asyncio.wait({waiter}, timeout=wait)
+                finally:
+                    with self._lock:
+                        self._async_waiters.pop(waiter, None)
+                    waiter.cancel()
+        except BaseException:
+            with self._lock:
+                self._abandon_locked(ticket)
+            raise
+
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    def estimate_wait(self, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """
+        Estima cuánto esperaría en la cola una llamada que llegara ahora.
+
+        Cuenta las llamadas en cola que se atenderían antes (misma prioridad
+        o mejor) y los tokens que faltan para todas ellas y la nueva. No
+        incluye reintentos futuros ante 429.
+
+        Args:
+            priority: Prioridad de la llamada
+
+        Returns:
+            Segundos de espera previstos
+        """
+        with self._lock:
+            ahead = sum(1 for ticket_priority, _ in self._heap if ticket_priority <= priority)
+        missing = ahead + 1 - self.bucket.available()
+        return max(0.0, missing / self.bucket.rate)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Ejecución con reintentos
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _retry(self, attempt: int, error: Exception) -> Optional[float]:
+        """Segundos a esperar antes de reintentar, o None si el error no se reintenta."""
+        if attempt == self.max_retries:
+            return None
+        if is_rate_limit_error(error):
+            with self._lock:
+                self.retries += 1
+            return self._backoff(attempt, error, pause=True)
+        if is_transient_error(error):
+            with self._lock:
+                self.transient_retries += 1
+            return self._backoff(attempt, error, pause=False)
+        return None
+
+    def _backoff(self, attempt: int, error: Exception, pause: bool) -> float:
+        retry_after = retry_after_seconds(error)
+        if pause:
+            # La API está saturada para todos: ninguna otra llamada sale hasta que pase
+            self.bucket.pause(min(retry_after or 0.0, self.max_delay))
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Backoff exponencial con jitter completo
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[..., Any], *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        """
+        Ejecuta fn respetando la cola y reintentando ante 429 y fallos pasajeros.
+
+        Args:
+            fn: Función que llama a la API
+            *args, **kwargs: Argumentos para fn
+            priority: Prioridad de la llamada
+
+        Returns:
+            Resultado de fn
+
+        Raises:
+            La última excepción de fn si se agotan los reintentos
+        """
+        for attempt in range(self.max_retries + 1):
+            with stage("queue"):
+                self.acquire(priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry(attempt, e)
+                if delay is None:
+                    raise
+                with stage("backoff"):
+                    time.sleep(delay)
+
+    async def call_async(self, fn: Callable[..., Awaitable[Any]], *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        """Versión asíncrona de call: fn retorna una corrutina."""
+        for attempt in range(self.max_retries + 1):
+            with stage("queue"):
+                await self.acquire_async(priority)
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry(attempt, e)
+                if delay is None:
+                    raise
+                with stage("backoff"):
+                    await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas de la cola.
+
+        Returns:
+            Diccionario con profundidad de la cola, tiempos de espera y
+            reintentos (ante 429 y ante fallos pasajeros)
+        """
+        with self._lock:
+            return {
+                "queue_depth": len(self._heap),
+                "acquired": self.acquired,
+                "retries": self.retries,
+                "transient_retries": self.transient_retries,
+                "avg_wait": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait": round(self.max_wait, 3),
+                "last_wait": round(self.last_wait, 3),
+            }
@@ -0,0 +1,400 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Estado compartido entre réplicas (SQLite, WAL)
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.shared status --db /datos/edudiff_state.db
+#
+# Varias copias de app.py detrás de un balanceador comparten, a través de
+# una base SQLite en un disco común (EDUDIFF_SHARED_STATE):
+#   - La cubeta de tokens del plan de la API: el límite de tasa es global,
+#     no por réplica, y un 429 vacía la cubeta para todas.
+#   - Concesiones (leases) por clave de generación: la primera réplica que
+#     pide una imagen la genera y las demás esperan a que aparezca en la
+#     caché compartida (EDUDIFF_CACHE_DIR en el mismo disco) en lugar de
+#     pagarla otra vez.
+#
+# Los tiempos son de reloj de pared (time.time()), comunes a todos los
+# procesos de la máquina. SQLite sobre NFS no es fiable: el directorio debe
+# ser un volumen local compartido por las réplicas.
+
+import os
+import sys
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+# Intervalo de sondeo de la caché mientras otra réplica genera
+_POLL_INTERVAL = 0.1
+
+
+class SharedState:
+    """
+    Conexión a la base de estado compartido de una réplica.
+
+    Las escrituras usan transacciones BEGIN IMMEDIATE: toman el bloqueo de
+    escritura de la base al empezar, de modo que leer y actualizar una fila
+    es atómico entre procesos.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        """
+        Args:
+            db_path: Archivo SQLite compartido por las réplicas
+            timeout: Segundos de espera máxima por el bloqueo de escritura
+        """
+        self.db_path = db_path
+        # Identifica a esta réplica en las concesiones
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transacción de escritura exclusiva entre procesos."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        """Consulta de solo lectura."""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SharedTokenBucket:
+    """
+    Cubeta de tokens compartida por todas las réplicas.
+
+    Misma interfaz que src.scheduler.TokenBucket: `rate` tokens por segundo
+    con ráfagas de hasta `capacity`, pero el saldo vive en la base
+    compartida, de modo que N réplicas juntas no superan el plan de la API.
+    """
+
+    def __init__(self, state: SharedState, rate: float, capacity: float, name: str = "api"):
+        """
+        Args:
+            state: Estado compartido
+            rate: Tokens por segundo (para todas las réplicas juntas)
+            capacity: Ráfaga máxima
+            name: Nombre de la cubeta en la base
+        """
+        self.state = state
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+
+    def _refilled(self, row: Optional[tuple], now: float) -> float:
+        if row is None:
+            return self.capacity
+        # max(0, ...): un reloj que retrocede no debe restar tokens
+        return min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+
+    def _update(self, change: Callable[[float], float]) -> float:
+        """Aplica `change` al saldo repuesto y retorna el saldo anterior al cambio."""
+        with self.state.transaction() as conn:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = self._refilled(row, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, change(tokens), now)
+            )
+        return tokens
+
+    def available(self) -> float:
+        """Tokens disponibles ahora mismo (sin consumirlos ni bloquear la base)."""
+        rows = self.state.query("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,))
+        return self._refilled(rows[0] if rows else None, time.time())
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Intenta consumir tokens.
+
+        Args:
+            tokens: Tokens a consumir
+
+        Returns:
+            0.0 si se consumieron, o los segundos hasta que haya suficientes
+        """
+        before = self._update(lambda current: current - tokens if current >= tokens else current)
+        if before >= tokens:
+            return 0.0
+        return (tokens - before) / self.rate
+
+    def pause(self, seconds: float):
+        """
+        Vacía la cubeta de todas las réplicas: el siguiente token llega dentro de `seconds`.
+
+        Args:
+            seconds: Segundos sin tokens (p. ej. el Retry-After de un 429)
+        """
+        self._update(lambda current: min(current, 0.0, 1.0 - seconds * self.rate))
+
+
+class SharedLeases:
+    """
+    Concesiones por clave para que una sola réplica genere cada imagen.
+
+    La réplica que obtiene la concesión de una clave la genera y la guarda
+    en la caché compartida. Las demás esperan a que el resultado aparezca
+    en la caché o a que la concesión se libere (si la generación falló) o
+    caduque (si la réplica murió), y entonces lo intentan ellas. Mientras
+    genera, la réplica renueva la concesión cada ttl/3: una generación que
+    pasa mucho tiempo en cola o en backoff no la pierde (y nadie la paga
+    otra vez) mientras la réplica siga viva.
+    """
+
+    def __init__(self, state: SharedState, ttl: float = 120.0, poll_interval: float = _POLL_INTERVAL):
+        """
+        Args:
+            state: Estado compartido
+            ttl: Segundos que dura una concesión sin liberar
+            poll_interval: Intervalo de sondeo de la caché al esperar
+        """
+        self.state = state
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self.leased = 0
+        self.waited = 0
+        self.takeovers = 0
+        self.renewals = 0
+
+    @property
+    def renew_interval(self) -> float:
+        """Segundos entre renovaciones de una concesión mientras se genera."""
+        return self.ttl / 3
+
+    def try_acquire(self, key: str) -> bool:
+        """
+        Intenta obtener la concesión de una clave.
+
+        Args:
+            key: Clave de la generación
+
+        Returns:
+            True si esta réplica debe generar la clave
+        """
+        with self.state.transaction() as conn:
+            now = time.time()
+            row = conn.execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now and row[0] != self.state.owner:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                (key, self.state.owner, now + self.ttl)
+            )
+            # Concesiones abandonadas por réplicas que murieron
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+        with self._lock:
+            self.leased += 1
+            if row is not None and row[0] != self.state.owner:
+                self.takeovers += 1
+        return True
+
+    def renew(self, key: str) -> bool:
+        """
+        Extiende la concesión de una clave otro `ttl` desde ahora.
+
+        Args:
+            key: Clave de la generación
+
+        Returns:
+            False si la concesión ya no es de esta réplica
+        """
+        with self.state.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET expires = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.ttl, key, self.state.owner)
+            )
+        renewed = cursor.rowcount > 0
+        if renewed:
+            with self._lock:
+                self.renewals += 1
+        return renewed
+
+    @contextmanager
+    def _heartbeat(self, key: str) -> Iterator[None]:
+        """Renueva la concesión en un hilo mientras dura el bloque."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.renew_interval):
+                self.renew(key)
+
+        thread = threading.Thread(target=beat, name="edudiff-lease", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    async def _heartbeat_async(self, key: str):
+        """Renueva la concesión hasta que se cancele la tarea."""
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await asyncio.to_thread(self.renew, key)
+
+    def release(self, key: str):
+        """Libera la concesión de una clave si es de esta réplica."""
+        with self.state.transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.state.owner))
+
+    def held_elsewhere(self, key: str) -> bool:
+        """Indica si otra réplica tiene una concesión vigente sobre la clave."""
+        rows = self.state.query(
+            "SELECT 1 FROM leases WHERE key = ? AND owner != ? AND expires > ?",
+            (key, self.state.owner, time.time())
+        )
+        return bool(rows)
+
+    def _count_wait(self):
+        with self._lock:
+            self.waited += 1
+
+    def run(self, key: str, produce: Callable[[], Any], lookup: Callable[[], Optional[Any]]) -> Tuple[Any, bool]:
+        """
+        Obtiene el resultado de una clave generándolo a lo sumo una vez entre réplicas.
+
+        Args:
+            key: Clave de la generación
+            produce: Genera el resultado (y lo guarda donde `lookup` lo encuentre)
+            lookup: Busca el resultado ya generado; None si aún no existe
+
+        Returns:
+            Tuple (resultado, compartido) donde compartido indica si lo generó otra réplica
+        """
+        while True:
+            if self.try_acquire(key):
+                try:
+                    # Otra réplica pudo terminar entre el fallo de caché y la concesión
+                    found = lookup()
+                    if found is not None:
+                        return found, True
+                    with self._heartbeat(key):
+                        return produce(), False
+                finally:
+                    self.release(key)
+
+            self._count_wait()
+            while self.held_elsewhere(key):
+                time.sleep(self.poll_interval)
+                found = lookup()
+                if found is not None:
+                    return found, True
+            found = lookup()
+            if found is not None:
+                return found, True
+
+    async def run_async(
+        self,
+        key: str,
+        produce: Callable[[], Awaitable[Any]],
+        lookup: Callable[[], Optional[Any]]
+    ) -> Tuple[Any, bool]:
+        """Versión asíncrona de run: `produce` retorna una corrutina y `lookup` se ejecuta en un hilo."""
+        while True:
+            if await asyncio.to_thread(self.try_acquire, key):
+                try:
+                    found = await asyncio.to_thread(lookup)
+                    if found is not None:
+                        return found, True
+                    heartbeat = asyncio.create_task(self._heartbeat_async(key))
+                    try:
+                        return await produce(), False
+                    finally:
+                        heartbeat.cancel()
+                finally:
+                    # Síncrono: también se libera si la corrutina fue cancelada
+                    self.release(key)
+
+            self._count_wait()
+            while await asyncio.to_thread(self.held_elsewhere, key):
+                await asyncio.sleep(self.poll_interval)
+                found = await asyncio.to_thread(lookup)
+                if found is not None:
+                    return found, True
+            found = await asyncio.to_thread(lookup)
+            if found is not None:
+                return found, True
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Retorna las métricas de las concesiones de esta réplica.
+
+        Returns:
+            Diccionario con concesiones obtenidas, esperas a otra réplica,
+            concesiones caducadas retomadas y renovaciones
+        """
+        with self._lock:
+            return {
+                "leased": self.leased,
+                "waited": self.waited,
+                "takeovers": self.takeovers,
+                "renewals": self.renewals,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estado compartido entre réplicas de EduDiff XL")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    status = subparsers.add_parser("status", help="Cubetas y concesiones vigentes")
+    status.add_argument("--db", required=True, help="Base SQLite compartida")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ No existe la base {args.db}")
+        sys.exit(1)
+
+    state = SharedState(args.db)
+    now = time.time()
+    for name, tokens, updated in state.query("SELECT name, tokens, updated FROM buckets ORDER BY name"):
+        print(f"🪣 Cubeta {name}: {tokens:.2f} tokens (actualizada hace {now - updated:.1f}s)")
+    leases = state.query("SELECT key, owner, expires FROM leases WHERE expires > ? ORDER BY expires", (now,))
+    print(f"🔒 Concesiones vigentes: {len(leases)}")
+    for key, owner, expires in leases:
+        print(f"   {key[:16]}  {owner}  caduca en {expires - now:.0f}s")
+    state.close()
+
+
+if __name__ == "__main__":
+    main()
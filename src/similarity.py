@@ -0,0 +1,260 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Normalización de prompts e índice de similitud (MinHash + LSH)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+# Palabras vacías frecuentes en los prompts (español e inglés), ya sin acentos.
+# Las negaciones ("sin", "no", "without") no lo son: cambian lo que se dibuja.
+STOPWORDS = frozenset("""
+a al como con de del desde e el en entre es esta este hacia la las lo los mas o
+para pero por que se sobre su sus un una unas uno unos y
+an and as at by for from in into is of on or the to with
+""".split())
+
+# Palabras de presentación que no cambian el contenido de la imagen: dos
+# prompts solo se consideran casi idénticos si difieren en palabras de esta lista
+STYLE_WORDS = frozenset("""
+diagrama diagramas ilustracion ilustraciones imagen imagenes dibujo dibujos
+infografia esquema grafico representacion visual lamina detallado detallada
+detallados detalladas etiquetado etiquetada etiquetados etiquetadas etiqueta
+etiquetas claro clara simple sencillo sencilla bonito bonita colorido colorida
+colores educativo educativa educativos educativas didactico didactica muy alta
+calidad hd 4k estilo moderno moderna profesional
+diagram illustration image picture drawing detailed labeled labelled labels
+colorful clean educational high quality style modern professional
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def fold_accents(text: str) -> str:
+    """Elimina tildes y diacríticos ("célula" -> "celula", "ñ" -> "n")."""
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def prompt_tokens(prompt: str) -> FrozenSet[str]:
+    """
+    Conjunto de palabras significativas de un prompt.
+
+    Ignora mayúsculas, tildes, puntuación, espacios y palabras vacías, y al
+    ser un conjunto también el orden de las palabras.
+
+    Args:
+        prompt: Texto escrito por el usuario
+
+    Returns:
+        Conjunto de tokens normalizados
+    """
+    words = _TOKEN_RE.findall(fold_accents(prompt).casefold())
+    tokens = frozenset(w for w in words if w not in STOPWORDS)
+    # Un prompt hecho solo de palabras vacías se compara por sus palabras
+    return tokens or frozenset(words)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Forma canónica de un prompt: sus tokens normalizados ordenados."""
+    return " ".join(sorted(prompt_tokens(prompt)))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Similitud de Jaccard entre dos conjuntos de tokens."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """
+    Firmas MinHash de conjuntos de tokens calculadas con NumPy.
+
+    Cada permutación es una función hash (a * x + b) mod 2^64 con a impar;
+    la fracción de posiciones iguales entre dos firmas estima su Jaccard.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _token_hashes(tokens: FrozenSet[str]) -> np.ndarray:
+        return np.array(
+            [int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little") for t in tokens],
+            dtype=np.uint64
+        )
+
+    def signature(self, tokens: FrozenSet[str]) -> np.ndarray:
+        """
+        Calcula la firma de un conjunto de tokens.
+
+        Returns:
+            Array uint64 de longitud num_perm
+        """
+        if not tokens:
+            return np.full(self.num_perm, _MASK64, dtype=np.uint64)
+        hashes = self._token_hashes(tokens)
+        # El desbordamiento de uint64 implementa el módulo 2^64
+        with np.errstate(over="ignore"):
+            permuted = hashes[:, None] * self._a[None, :] + self._b[None, :]
+        return permuted.min(axis=0)
+
+
+class PromptIndex:
+    """
+    Índice de prompts ya generados para encontrar peticiones casi idénticas.
+
+    Por cada estilo se guarda la firma MinHash de cada prompt repartida en
+    bandas (LSH): dos prompts son candidatos si coinciden en alguna banda, y
+    los candidatos se confirman con la similitud de Jaccard exacta. Además,
+    las palabras en que difieren deben ser todas de `ignorable`: "célula
+    animal" y "célula vegetal" superan el umbral pero no son el mismo dibujo.
+    Si se indica `path`, las entradas se añaden a un JSONL y se recargan al
+    iniciar.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        ignorable: FrozenSet[str] = STYLE_WORDS
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+
+        self.path = path
+        self.threshold = threshold
+        self.ignorable = ignorable
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[str, FrozenSet[str], Dict[str, Any]]] = []
+        self._buckets: Dict[Tuple[str, int, bytes], List[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _band_keys(self, style: str, tokens: FrozenSet[str]) -> List[Tuple[str, int, bytes]]:
+        signature = self._hasher.signature(tokens)
+        return [
+            (style, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _insert(self, style: str, tokens: FrozenSet[str], entry: Dict[str, Any]):
+        keys = self._band_keys(style, tokens)
+        with self._lock:
+            position = len(self._entries)
+            self._entries.append((style, tokens, entry))
+            for key in keys:
+                self._buckets.setdefault(key, []).append(position)
+
+    def add(self, style: str, prompt: str, entry: Dict[str, Any]):
+        """
+        Registra un prompt generado.
+
+        Args:
+            style: Estilo visual (cada estilo es un índice independiente)
+            prompt: Texto escrito por el usuario, sin el sufijo del estilo
+            entry: Datos para recuperar el resultado (claves de caché, parámetros...)
+        """
+        tokens = prompt_tokens(prompt)
+        self._insert(style, tokens, entry)
+
+        if self.path:
+            line = json.dumps({"style": style, "tokens": sorted(tokens), "entry": entry}, ensure_ascii=False)
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+
+    def _load(self, path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Última línea a medio escribir si el proceso se interrumpió
+                    continue
+                entry = record["entry"]
+                # Volver a tokenizar: los tokens guardados pueden venir de otra lista de palabras vacías
+                tokens = prompt_tokens(entry["prompt"]) if "prompt" in entry else frozenset(record["tokens"])
+                self._insert(record["style"], tokens, entry)
+
+    def query(
+        self,
+        style: str,
+        prompt: str,
+        accept: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """
+        Busca el prompt más parecido del mismo estilo.
+
+        Args:
+            style: Estilo visual
+            prompt: Texto escrito por el usuario
+            accept: Filtro opcional sobre las entradas candidatas
+
+        Returns:
+            Tuple (similitud, entrada) de la mejor coincidencia que supera el
+            umbral y solo difiere en palabras ignorables, o None si no hay ninguna
+        """
+        tokens = prompt_tokens(prompt)
+        keys = self._band_keys(style, tokens)
+
+        with self._lock:
+            candidates = {i for key in keys for i in self._buckets.get(key, ())}
+            scored = sorted(
+                (
+                    (jaccard(tokens, self._entries[i][1]), i) for i in candidates
+                    if tokens ^ self._entries[i][1] <= self.ignorable
+                ),
+                reverse=True
+            )
+            entries = [(score, self._entries[i][2]) for score, i in scored if score >= self.threshold]
+
+        # Entre empates se prefiere la entrada más reciente
+        for score, entry in entries:
+            if accept is None or accept(entry):
+                with self._lock:
+                    self.hits += 1
+                return score, entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna el tamaño del índice y sus aciertos.
+
+        Returns:
+            Diccionario con entradas, aciertos y fallos
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
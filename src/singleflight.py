@@ -0,0 +1,123 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Deduplicación de peticiones idénticas en vuelo (single-flight)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+
+    La primera llamada (líder) ejecuta la función; las que llegan mientras
+    está en vuelo esperan el mismo futuro y reciben el mismo resultado (o la
+    misma excepción). Funciona tanto desde hilos como desde corrutinas, y
+    ambos tipos de llamada pueden compartir una misma clave. Si el líder es
+    cancelado, las llamadas en espera vuelven a intentarlo y una de ellas
+    pasa a ser el nuevo líder.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: str):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Ejecuta fn una sola vez por clave entre las llamadas concurrentes.
+
+        Args:
+            key: Clave normalizada de la petición
+            fn: Función a ejecutar
+            *args, **kwargs: Argumentos para fn
+
+        Returns:
+            Tuple (resultado, compartido) donde compartido indica si el
+            resultado proviene de otra llamada en vuelo
+        """
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except CancelledError:
+                continue
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    async def do_async(self, key: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Versión asíncrona de do: fn es una función que retorna una corrutina.
+
+        Returns:
+            Tuple (resultado, compartido)
+        """
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # shield: cancelar esta espera no debe cancelar el futuro compartido
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except asyncio.CancelledError:
+                # Reintentar solo si se canceló el líder, no esta llamada
+                if not future.cancelled():
+                    raise
+
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._finish(key)
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna los contadores de ejecución.
+
+        Returns:
+            Diccionario con llamadas ejecutadas, agrupadas y en vuelo
+        """
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
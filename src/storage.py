@@ -0,0 +1,188 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Almacén acotado de imágenes de salida
+# ═══════════════════════════════════════════════════════════════════════════════
+
+import os
+import time
+import uuid
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from PIL import Image
+
+
+def detect_extension(data: bytes) -> str:
+    """
+    Detecta la extensión de archivo a partir de la firma de los bytes.
+
+    Args:
+        data: Contenido de la imagen
+
+    Returns:
+        Extensión con punto (".png", ".jpg", ".webp")
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if data[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ".png"
+
+
+class OutputStore:
+    """
+    Directorio de salidas con recolección de basura por antigüedad y tamaño.
+
+    Los archivos más antiguos que ttl_seconds se eliminan, y si el total
+    supera max_bytes se eliminan los más antiguos hasta volver al límite.
+    La recolección se ejecuta como mucho una vez cada gc_interval segundos.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 1024 * 1024 * 1024,
+        gc_interval: float = 60
+    ):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+
+        self._lock = threading.Lock()
+        self._gc_lock = threading.Lock()
+        self._bytes = 0
+        self._files = 0
+        self._last_gc = 0.0
+        self.removed_files = 0
+
+        os.makedirs(root, exist_ok=True)
+        self.collect()
+
+    def _new_path(self, suffix: str) -> str:
+        return os.path.join(self.root, f"{uuid.uuid4().hex}{suffix}")
+
+    def _track(self, size: int):
+        with self._lock:
+            self._bytes += size
+            self._files += 1
+            due = time.monotonic() - self._last_gc >= self.gc_interval or self._bytes > self.max_bytes
+        if due:
+            self.collect()
+
+    def save_bytes(self, data: bytes, suffix: Optional[str] = None) -> str:
+        """
+        Escribe los bytes tal cual, sin decodificar ni recodificar.
+
+        Args:
+            data: Contenido de la imagen
+            suffix: Extensión; si es None se detecta por la firma
+
+        Returns:
+            Ruta del archivo guardado
+        """
+        path = self._new_path(suffix or detect_extension(data))
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._track(len(data))
+        return path
+
+    def save_image(self, image: Image.Image, suffix: str = ".png", **save_kwargs) -> str:
+        """
+        Codifica y guarda una imagen PIL (p. ej. una cuadrícula compuesta).
+
+        Args:
+            image: Imagen PIL
+            suffix: Extensión que determina el formato
+            **save_kwargs: Opciones para Image.save
+
+        Returns:
+            Ruta del archivo guardado
+        """
+        path = self._new_path(suffix)
+        image.save(path, **save_kwargs)
+        self._track(os.path.getsize(path))
+        return path
+
+    def save_with(self, write: Callable[[str], Any], suffix: str = ".png") -> str:
+        """
+        Reserva una ruta en el almacén y deja que `write` escriba el archivo.
+
+        Útil para codificadores que escriben en streaming (p. ej. una
+        cuadrícula generada por franjas) sin pasar por una imagen PIL.
+
+        Args:
+            write: Función que recibe la ruta de destino y escribe el archivo
+            suffix: Extensión del archivo
+
+        Returns:
+            Ruta del archivo guardado
+        """
+        path = self._new_path(suffix)
+        write(path)
+        self._track(os.path.getsize(path))
+        return path
+
+    def collect(self):
+        """Elimina salidas caducadas y, si hace falta, las más antiguas."""
+        # Si otro hilo ya está recolectando, no repetir el trabajo
+        if not self._gc_lock.acquire(blocking=False):
+            return
+        try:
+            self._collect()
+        finally:
+            self._gc_lock.release()
+
+    def _collect(self):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        kept = len(entries)
+        removed = 0
+
+        for mtime, size, path in entries:
+            if now - mtime <= self.ttl_seconds and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            kept -= 1
+            removed += 1
+
+        with self._lock:
+            self._bytes = total
+            self._files = kept
+            self._last_gc = time.monotonic()
+            self.removed_files += removed
+
+    def disk_usage(self) -> int:
+        """Retorna los bytes ocupados actualmente por las salidas."""
+        with self._lock:
+            return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna el estado del almacén.
+
+        Returns:
+            Diccionario con bytes y archivos actuales y archivos eliminados
+        """
+        with self._lock:
+            return {
+                "bytes": self._bytes,
+                "files": self._files,
+                "removed_files": self.removed_files,
+            }
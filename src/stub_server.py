@@ -0,0 +1,282 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Servidor local que imita la API de imágenes de Together AI
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.stub_server --port 8765 --latency 0.5 --latency-per-step 0.4
+#   python -m src.stub_server --error-rate 0.02 --rate-limit-rate 0.1
+#   python -m src.stub_server --quota-per-min 60 --quota-burst 5
+#
+# Responde a POST /v1/images/generations con PNG generados localmente en
+# base64 (sin gastar créditos), con latencia y tasas de error/429
+# configurables. Sirve para pruebas de carga y benchmarks: basta con apuntar
+# TOGETHER_BASE_URL a la URL que imprime, o usar EDUDIFF_BACKEND=stub.
+
+import json
+import time
+import base64
+import random
+import socket
+import argparse
+import threading
+from io import BytesIO
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from PIL import Image
+
+from src.scheduler import TokenBucket
+
+
+@lru_cache(maxsize=256)
+def canned_png(seed: int, index: int = 0, size: int = 64) -> bytes:
+    """
+    PNG determinista para una semilla: mismo seed e índice, misma imagen.
+
+    Args:
+        seed: Semilla de la petición
+        index: Índice de la variante
+        size: Lado de la imagen en píxeles
+
+    Returns:
+        Bytes del PNG
+    """
+    rng = random.Random(seed * 31 + index)
+    top = tuple(rng.randrange(256) for _ in range(3))
+    bottom = tuple(rng.randrange(256) for _ in range(3))
+    # Degradado vertical entre dos colores (se comprime bien y no es uniforme)
+    mask = Image.linear_gradient("L").resize((size, size))
+    image = Image.composite(Image.new("RGB", (size, size), bottom), Image.new("RGB", (size, size), top), mask)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_StubHTTPServer"
+
+    def setup(self):
+        super().setup()
+        # Sin Nagle: evita esperas de ACK retardado entre cabeceras y cuerpo
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        self._send(status, json.dumps(payload).encode(), "application/json", headers)
+
+    def do_GET(self):
+        # Descarga de imágenes para respuestas con URL: /images/<seed>/<index>.png
+        parts = self.path.strip("/").split("/")
+        try:
+            seed, index = int(parts[-2]), int(parts[-1].split(".")[0])
+        except (IndexError, ValueError):
+            seed, index = 0, 0
+        self._send(200, canned_png(seed, index, self.server.stub.image_size), "image/png")
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            request = {}
+
+        if not self.path.rstrip("/").endswith("/images/generations"):
+            self._send_json(404, {"error": {"message": f"Ruta desconocida: {self.path}"}})
+            return
+
+        outcome, retry_after = stub._next_outcome()
+        if outcome == "rate_limited":
+            self._send_json(
+                429,
+                {"error": {"message": "rate limit exceeded (stub)", "type": "rate_limit"}},
+                {"Retry-After": f"{retry_after:g}"}
+            )
+            return
+
+        steps = int(request.get("steps") or 20)
+        time.sleep(stub.latency_for(steps))
+
+        if outcome == "error":
+            self._send_json(500, {"error": {"message": "internal error (stub)", "type": "server_error"}})
+            return
+
+        seed = int(request.get("seed") or 0)
+        n = max(1, int(request.get("n") or 1))
+        if request.get("response_format") == "url":
+            host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+            data = [{"index": i, "type": "url", "url": f"http://{host}/images/{seed}/{i}.png"} for i in range(n)]
+        else:
+            data = [
+                {"index": i, "type": "b64_json", "b64_json": base64.b64encode(canned_png(seed, i, stub.image_size)).decode()}
+                for i in range(n)
+            ]
+        self._send_json(200, {"id": "stub", "model": request.get("model", "stub"), "object": "list", "data": data})
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "StubServer"
+
+
+class StubServer:
+    """
+    Servidor HTTP local compatible con /v1/images/generations de Together AI.
+
+    La latencia de cada generación es `latency + latency_per_step * steps`
+    más un jitter uniforme de ±`jitter` segundos. Una fracción
+    `rate_limit_rate` de las peticiones recibe un 429 con Retry-After y una
+    fracción `error_rate` un 500 tras la latencia.
+
+    Con `quota_per_min` > 0 el servidor aplica además un límite de tasa real
+    (como el plan de la API, común a todos los clientes): las peticiones que
+    lo superan reciben un 429 con el Retry-After hasta el siguiente token.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_per_step: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        image_size: int = 64,
+        seed: Optional[int] = None,
+        quota_per_min: float = 0.0,
+        quota_burst: float = 1.0
+    ):
+        self.latency = latency
+        self.latency_per_step = latency_per_step
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.image_size = image_size
+
+        self._quota = TokenBucket(quota_per_min / 60.0, quota_burst) if quota_per_min > 0 else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.over_quota = 0
+
+        self._httpd = _StubHTTPServer((host, port), _StubHandler)
+        self._httpd.stub = self
+
+    @property
+    def base_url(self) -> str:
+        """URL base para TOGETHER_BASE_URL (incluye /v1)."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def latency_for(self, steps: int) -> float:
+        """Segundos que tarda una generación de `steps` pasos."""
+        with self._lock:
+            noise = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + self.latency_per_step * steps + noise)
+
+    def _next_outcome(self) -> tuple:
+        """Retorna (resultado, Retry-After en segundos si es un 429)."""
+        with self._lock:
+            self.requests += 1
+            if self._quota is not None:
+                wait = self._quota.try_acquire()
+                if wait > 0:
+                    self.rate_limited += 1
+                    self.over_quota += 1
+                    return "rate_limited", wait
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.rate_limited += 1
+                return "rate_limited", self.retry_after
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.errors += 1
+                return "error", 0.0
+            return "ok", 0.0
+
+    def serve_forever(self):
+        """Atiende peticiones en el hilo actual hasta que se llame a stop()."""
+        self._httpd.serve_forever()
+
+    def start(self) -> "StubServer":
+        """Atiende peticiones en un hilo en segundo plano."""
+        self._thread = threading.Thread(target=self.serve_forever, name="edudiff-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el servidor y libera el puerto."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna los contadores del servidor.
+
+        Returns:
+            Diccionario con peticiones, errores 500, respuestas 429 y, de
+            ellas, las debidas al límite de tasa
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "over_quota": self.over_quota,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de imágenes de Together AI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia fija por generación (s)")
+    parser.add_argument("--latency-per-step", type=float, default=0.0, help="Latencia adicional por step (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación uniforme ± de la latencia (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Cabecera Retry-After de los 429 (s)")
+    parser.add_argument("--image-size", type=int, default=64, help="Lado de las imágenes devueltas")
+    parser.add_argument("--quota-per-min", type=float, default=0.0, help="Límite de tasa real del servidor (0 = sin límite)")
+    parser.add_argument("--quota-burst", type=float, default=1.0, help="Ráfaga máxima del límite de tasa")
+    args = parser.parse_args()
+
+    server = StubServer(
+        args.host, args.port, args.latency, args.latency_per_step, args.jitter,
+        args.error_rate, args.rate_limit_rate, args.retry_after, args.image_size,
+        quota_per_min=args.quota_per_min, quota_burst=args.quota_burst
+    )
+    print(f"🧪 Stub de Together AI en {server.base_url}")
+    print(f"   export TOGETHER_BASE_URL={server.base_url} TOGETHER_API_KEY=stub")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
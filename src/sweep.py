@@ -0,0 +1,468 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Barridos de parámetros declarativos y concurrentes
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Uso:
+#   python -m src.sweep results/sweeps/experimentos.json --workers 4
+#   python -m src.sweep barrido.json --report-only
+#
+# El archivo JSON describe uno o varios barridos ({"sweeps": [...]} o un
+# único objeto). Cada eje acepta un valor o una lista:
+#
+#   {
+#     "nombre": "exp2_steps",
+#     "prompts": ["Infografía del sistema solar con planetas etiquetados y órbitas"],
+#     "estilos": ["📊 Infografía Profesional"],     ("*" = todos los estilos)
+#     "steps": [15, 30, 50],
+#     "guidance": 7.5,
+#     "seeds": 456,
+#     "variantes": 1,
+#     "comparar": "steps"                            (columnas de las cuadrículas)
+#   }
+#
+# Se generan todas las celdas del producto cartesiano en paralelo (con
+# prioridad de lote en la cola de la API). Las celdas ya registradas en
+# <output_dir>/celdas.jsonl no se repiten y las que están en la caché de
+# resultados no llaman a la API. Al terminar se regeneran las cuadrículas
+# comparativas, las tablas de tiempos y calidad (informe.md) y, si
+# matplotlib está instalado, la gráfica tiempos.png.
+
+import os
+import sys
+import json
+import argparse
+import itertools
+from datetime import datetime
+from statistics import mean
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import app
+from src.batch import _es_fatal, item_id, process_item
+from src.grid import build_grid_streaming
+from src.metrics import request_timer
+from src.utils import calculate_image_quality_scores
+
+# Ejes del barrido: clave en la configuración -> campo de la celda
+AXES = {
+    "prompts": "prompt",
+    "estilos": "estilo",
+    "steps": "steps",
+    "guidance": "guidance",
+    "seeds": "seed",
+}
+
+# Nombre de cada campo en las tablas del informe
+_COLUMNAS = {"prompt": "Prompt", "estilo": "Estilo", "steps": "Steps", "guidance": "Guidance", "seed": "Seed"}
+
+# Campo de la celda -> clave del eje en la configuración
+_EJES = {campo: eje for eje, campo in AXES.items()}
+
+DEFAULT_STYLE = "📊 Infografía Profesional"
+
+
+def _como_lista(value) -> list:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def normalize_sweep(sweep: Dict) -> Dict:
+    """
+    Valida un barrido y completa los valores por defecto.
+
+    Args:
+        sweep: Barrido tal como aparece en el archivo de configuración
+
+    Returns:
+        Barrido con todos los ejes como listas tipadas
+
+    Raises:
+        ValueError: Si faltan prompts, un estilo no existe o el eje a comparar no es válido
+    """
+    if not sweep.get("prompts"):
+        raise ValueError("El barrido necesita al menos un prompt")
+
+    estilos = sweep.get("estilos", [DEFAULT_STYLE])
+    estilos = list(app.ESTILOS) if estilos == "*" else _como_lista(estilos)
+    for estilo in estilos:
+        if estilo not in app.ESTILOS:
+            raise ValueError(f"Estilo desconocido: {estilo}")
+
+    nombre = sweep.get("nombre", "barrido")
+    normalized = {
+        "nombre": nombre,
+        "prompts": [str(p) for p in _como_lista(sweep["prompts"])],
+        "estilos": estilos,
+        "steps": [int(v) for v in _como_lista(sweep.get("steps", 25))],
+        "guidance": [float(v) for v in _como_lista(sweep.get("guidance", 7.5))],
+        "seeds": [int(v) for v in _como_lista(sweep.get("seeds", -1))],
+        "variantes": int(sweep.get("variantes", 1)),
+        "output_dir": sweep.get("output_dir", os.path.join("results", "sweeps", nombre)),
+        "tile": int(sweep.get("tile", 256)),
+    }
+
+    comparar = sweep.get("comparar") or next(
+        (eje for eje in ("guidance", "steps", "estilos", "seeds") if len(normalized[eje]) > 1), "steps"
+    )
+    if comparar not in AXES or comparar == "prompts":
+        raise ValueError(f"Eje a comparar no válido: {comparar}")
+    normalized["comparar"] = comparar
+    return normalized
+
+
+def load_config(path: str) -> List[Dict]:
+    """
+    Lee un archivo de barridos.
+
+    Args:
+        path: Ruta al JSON ({"sweeps": [...]}, una lista o un único barrido)
+
+    Returns:
+        Lista de barridos normalizados
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    if isinstance(config, dict):
+        config = config.get("sweeps", [config])
+    return [normalize_sweep(sweep) for sweep in config]
+
+
+def expand_cells(sweep: Dict) -> List[Dict]:
+    """
+    Producto cartesiano de los ejes del barrido.
+
+    Returns:
+        Celdas en el formato de elemento de src.batch, en orden estable
+    """
+    return [
+        {
+            "id": None,
+            "prompt": prompt,
+            "estilo": estilo,
+            "steps": steps,
+            "guidance": guidance,
+            "seed": seed,
+            "variantes": sweep["variantes"],
+        }
+        for prompt, estilo, steps, guidance, seed in itertools.product(
+            sweep["prompts"], sweep["estilos"], sweep["steps"], sweep["guidance"], sweep["seeds"]
+        )
+    ]
+
+
+def _origen(estado: str) -> str:
+    for texto, nombre in app.RESULTADO_METRICA.items():
+        if estado.startswith(texto):
+            return nombre
+    return "api"
+
+
+def run_cell(item: Dict, images_dir: str) -> Tuple[bool, str, Optional[Dict]]:
+    """
+    Genera una celda y calcula sus métricas de calidad.
+
+    El tiempo de API se toma del desglose por etapas, así que no incluye la
+    espera en la cola aunque haya muchas celdas en vuelo.
+
+    Returns:
+        tuple: (éxito, mensaje de estado, registro de la celda o None)
+    """
+    with request_timer("sweep") as cronometro:
+        ok, estado, registros = process_item(item, images_dir)
+    if not ok:
+        return False, estado, None
+
+    rutas = [r["image_path"] for r in registros]
+    calidad = calculate_image_quality_scores(rutas, max_side=512, num_workers=1)
+
+    return True, estado, {
+        "id": item_id(item),
+        "prompt": item["prompt"],
+        "estilo": item["estilo"],
+        "steps": item["steps"],
+        "guidance": item["guidance"],
+        "seed": item["seed"],
+        "effective_seed": registros[0]["seed"],
+        "images": rutas,
+        "outcome": _origen(estado),
+        "generation_time": registros[0]["generation_time"],
+        "api_time": round(cronometro.stages.get("api", 0.0), 3),
+        "quality": calidad,
+        "status": estado,
+        "timestamp": datetime.now().isoformat(),
+    }
+
+
+def load_records(path: str) -> Dict[str, Dict]:
+    """Registros de celdas ya terminadas (el último por id), descartando los que perdieron sus imágenes."""
+    records: Dict[str, Dict] = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    records[record["id"]] = record
+    return {uid: r for uid, r in records.items() if all(os.path.exists(p) for p in r["images"])}
+
+
+def run_sweep(sweep: Dict, workers: int = 4) -> Tuple[Dict[str, Dict], int, bool]:
+    """
+    Ejecuta las celdas pendientes de un barrido.
+
+    Returns:
+        tuple: (registros por id, celdas fallidas, detenido por cuota/credenciales)
+    """
+    output_dir = sweep["output_dir"]
+    images_dir = os.path.join(output_dir, "imagenes")
+    os.makedirs(images_dir, exist_ok=True)
+    records_path = os.path.join(output_dir, "celdas.jsonl")
+
+    records = load_records(records_path)
+    cells = expand_cells(sweep)
+    pending = [cell for cell in cells if item_id(cell) not in records]
+    print(f"🧪 {sweep['nombre']}: {len(cells)} celdas | {len(cells) - len(pending)} ya hechas | {len(pending)} pendientes")
+
+    failed = 0
+    detenido = False
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(records_path, 'a', encoding='utf-8') as f:
+        futures = {pool.submit(run_cell, cell, images_dir): cell for cell in pending}
+        for future in as_completed(futures):
+            cell = futures[future]
+            if future.cancelled():
+                continue
+            try:
+                ok, estado, record = future.result()
+            except Exception as e:
+                ok, estado, record = False, f"❌ Error: {e}", None
+
+            if not ok:
+                failed += 1
+                print(f"❌ {cell['estilo']} | steps {cell['steps']} | guidance {cell['guidance']} | {estado}", file=sys.stderr)
+                if _es_fatal(estado) and not detenido:
+                    detenido = True
+                    for other in futures:
+                        other.cancel()
+                continue
+
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            records[record["id"]] = record
+            print(f"✅ {record['id']} | {record['outcome']} | API {record['api_time']:.2f}s | "
+                  f"calidad {_calidad_media(record):.3f}")
+
+    return records, failed, detenido
+
+
+def _calidad_media(record: Dict, key: str = "overall_score") -> float:
+    return mean(scores[key] for scores in record["quality"])
+
+
+def _ejes_variables(sweep: Dict) -> List[str]:
+    """Campos de celda con más de un valor en el barrido (sin contar el prompt)."""
+    return [AXES[eje] for eje in ("estilos", "steps", "guidance", "seeds") if len(sweep[eje]) > 1]
+
+
+def _valor(value) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def _tiempo(record: Dict) -> str:
+    # Las celdas servidas desde caché no midieron una generación real
+    if record["outcome"] == "cache":
+        return "⚡ caché"
+    return f"{record['api_time']:.2f}"
+
+
+def _resumen_por_eje(sweep: Dict, records: List[Dict], field: str) -> List[str]:
+    """Tabla con el tiempo de API y la calidad medios por cada valor de un eje."""
+    lines = [
+        f"| {_COLUMNAS[field]} | Celdas | Tiempo API medio (s) | Calidad media | Nitidez media |",
+        "|---|---|---|---|---|",
+    ]
+    for value in sweep[_EJES[field]]:
+        grupo = [r for r in records if r[field] == value]
+        if not grupo:
+            continue
+        medidos = [r["api_time"] for r in grupo if r["outcome"] != "cache"]
+        tiempo = f"{mean(medidos):.2f}" if medidos else "⚡ caché"
+        lines.append(
+            f"| {_valor(value)} | {len(grupo)} | {tiempo} | "
+            f"{mean(_calidad_media(r) for r in grupo):.3f} | {mean(_calidad_media(r, 'sharpness') for r in grupo):.4f} |"
+        )
+    return lines
+
+
+def _cuadricula(sweep: Dict, prompt_records: List[Dict], path: str) -> Optional[List[str]]:
+    """
+    Cuadrícula de un prompt: una columna por valor del eje comparado y una
+    fila por combinación del resto de ejes. Omite las filas incompletas.
+
+    Returns:
+        Etiquetas de las filas incluidas, o None si no hay ninguna completa
+    """
+    comparar = AXES[sweep["comparar"]]
+    otros = [field for field in _ejes_variables(sweep) if field != comparar]
+    columnas = sweep[sweep["comparar"]]
+
+    filas: Dict[tuple, Dict] = {}
+    for record in prompt_records:
+        filas.setdefault(tuple(record[field] for field in otros), {})[record[comparar]] = record["images"][0]
+
+    rutas, etiquetas = [], []
+    for clave, por_columna in filas.items():
+        if all(valor in por_columna for valor in columnas):
+            rutas.extend(por_columna[valor] for valor in columnas)
+            etiquetas.append(", ".join(f"{_COLUMNAS[f]} {_valor(v)}" for f, v in zip(otros, clave)) or "—")
+
+    if not rutas:
+        return None
+    build_grid_streaming(rutas, path, cols=len(columnas), tile_size=(sweep["tile"], sweep["tile"]))
+    return etiquetas
+
+
+def _grafica(sweep: Dict, records: List[Dict], path: str) -> bool:
+    """Tiempo de API y calidad por valor del eje comparado (requiere matplotlib)."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+
+    comparar = AXES[sweep["comparar"]]
+    valores, tiempos, calidades = [], [], []
+    for value in sweep[sweep["comparar"]]:
+        grupo = [r for r in records if r[comparar] == value]
+        medidos = [r["api_time"] for r in grupo if r["outcome"] != "cache"]
+        if grupo:
+            valores.append(_valor(value))
+            tiempos.append(mean(medidos) if medidos else float("nan"))
+            calidades.append(mean(_calidad_media(r) for r in grupo))
+
+    fig, (ax_tiempo, ax_calidad) = plt.subplots(1, 2, figsize=(11, 4))
+    ax_tiempo.bar(valores, tiempos, color="#2563eb")
+    ax_tiempo.set_title("Tiempo de API medio")
+    ax_tiempo.set_ylabel("segundos")
+    ax_calidad.bar(valores, calidades, color="#16a34a")
+    ax_calidad.set_title("Calidad media (overall_score)")
+    for ax in (ax_tiempo, ax_calidad):
+        ax.set_xlabel(_COLUMNAS[comparar])
+    fig.suptitle(sweep["nombre"])
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return True
+
+
+def write_report(sweep: Dict, records: Dict[str, Dict]) -> str:
+    """
+    Regenera cuadrículas, tablas y gráfica del barrido a partir de sus registros.
+
+    Args:
+        sweep: Barrido normalizado
+        records: Registros de celdas por id
+
+    Returns:
+        Ruta del informe Markdown
+    """
+    output_dir = sweep["output_dir"]
+    ordered = [records[uid] for uid in map(item_id, expand_cells(sweep)) if uid in records]
+    variables = _ejes_variables(sweep)
+
+    lines = [
+        f"# 🧪 Barrido: {sweep['nombre']}",
+        "",
+        f"- **Celdas:** {len(ordered)} de {len(expand_cells(sweep))}",
+        f"- **Estilos:** {', '.join(sweep['estilos'])}",
+        f"- **Steps:** {', '.join(map(str, sweep['steps']))} | **Guidance:** {', '.join(_valor(g) for g in sweep['guidance'])} "
+        f"| **Seeds:** {', '.join(map(str, sweep['seeds']))} | **Variantes:** {sweep['variantes']}",
+        "- **Tiempo API:** sin espera en cola; ⚡ = servido desde caché",
+        "",
+    ]
+
+    for field in variables:
+        lines += [f"## Resumen por {_COLUMNAS[field].lower()}", ""] + _resumen_por_eje(sweep, ordered, field) + [""]
+
+    if _grafica(sweep, ordered, os.path.join(output_dir, "tiempos.png")):
+        lines += ["![Tiempos y calidad](tiempos.png)", ""]
+
+    for i, prompt in enumerate(sweep["prompts"], 1):
+        prompt_records = [r for r in ordered if r["prompt"] == prompt]
+        if not prompt_records:
+            continue
+        lines += [f"## Prompt {i}: {prompt}", ""]
+
+        etiquetas = _cuadricula(sweep, prompt_records, os.path.join(output_dir, f"comparacion_p{i}.png"))
+        if etiquetas:
+            columnas = ", ".join(_valor(v) for v in sweep[sweep["comparar"]])
+            lines += [
+                f"![Comparación prompt {i}](comparacion_p{i}.png)",
+                "",
+                f"Columnas ({_COLUMNAS[AXES[sweep['comparar']]]}): {columnas}. Filas: {' | '.join(etiquetas)}",
+                "",
+            ]
+
+        cabecera = [_COLUMNAS[field] for field in variables] + ["Tiempo API (s)", "Tiempo total (s)", "Calidad", "Nitidez", "Imagen"]
+        lines += ["| " + " | ".join(cabecera) + " |", "|" + "---|" * len(cabecera)]
+        for record in prompt_records:
+            imagen = os.path.relpath(record["images"][0], output_dir)
+            celdas = [_valor(record[field]) for field in variables] + [
+                _tiempo(record),
+                f"{record['generation_time']:.2f}",
+                f"{_calidad_media(record):.3f}",
+                f"{_calidad_media(record, 'sharpness'):.4f}",
+                f"[{os.path.basename(imagen)}]({imagen})",
+            ]
+            lines.append("| " + " | ".join(celdas) + " |")
+        lines.append("")
+
+    lines.append(f"*Generado por src.sweep el {datetime.now().strftime('%Y-%m-%d %H:%M')}*")
+
+    report_path = os.path.join(output_dir, "informe.md")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    return report_path
+
+
+def run(args) -> int:
+    """
+    Ejecuta todos los barridos del archivo y regenera sus informes.
+
+    Returns:
+        Código de salida (0 si todas las celdas terminaron, 1 si hubo fallos o se detuvo)
+    """
+    sweeps = load_config(args.config)
+    if args.output_dir:
+        if len(sweeps) != 1:
+            raise SystemExit("--output-dir solo se admite con un único barrido")
+        sweeps[0]["output_dir"] = args.output_dir
+
+    exit_code = 0
+    for sweep in sweeps:
+        if args.report_only:
+            records, failed, detenido = load_records(os.path.join(sweep["output_dir"], "celdas.jsonl")), 0, False
+        else:
+            records, failed, detenido = run_sweep(sweep, args.workers)
+
+        report = write_report(sweep, records)
+        print(f"📄 Informe: {report}")
+        if failed:
+            exit_code = 1
+        if detenido:
+            print("⏸️ Detenido por cuota/credenciales. Vuelve a lanzar el comando para reanudar.", file=sys.stderr)
+            return 1
+    return exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barridos de parámetros de EduDiff XL")
+    parser.add_argument("config", help="Archivo JSON con los barridos")
+    parser.add_argument("--workers", type=int, default=4, help="Celdas generadas a la vez")
+    parser.add_argument("--output-dir", help="Directorio de salida (solo con un barrido)")
+    parser.add_argument("--report-only", action="store_true", help="Regenerar informes sin generar celdas")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# ═══════════════════════════════════════════════════════════════════════════════
+# EduDiff XL — Taxonomía curricular: clasificación de temas y sugerencias de prompts
+# ═══════════════════════════════════════════════════════════════════════════════
+#
+# Cada asignatura tiene palabras clave (o frases de varias palabras) y
+# plantillas de sugerencias. Las palabras clave de todas las asignaturas se
+# compilan una sola vez en un autómata Aho-Corasick sobre palabras ya sin
+# tildes y en singular. Clasificar un tema es un único recorrido por sus
+# palabras, sin importar cuántos miles de palabras clave haya.
+#
+# La taxonomía por defecto puede ampliarse con un JSON (EDUDIFF_TAXONOMY):
+#
+#   {
+#     "biologia": {
+#       "keywords": ["célula", "mitocondria", "ciclo de krebs", ...],
+#       "templates": ["Diagrama detallado de {topic} con partes etiquetadas", ...]
+#     },
+#     "historia": {"keywords": [...], "templates": [...]}
+#   }
+#
+# Las asignaturas del archivo se añaden a las de por defecto. Si una ya
+# existe, sus palabras clave se suman y sus plantillas, si las trae, la
+# reemplazan.
+
+import os
+import re
+import json
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.similarity import fold_accents
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Asignatura usada cuando ninguna palabra clave coincide
+DEFAULT_CATEGORY = "general"
+
+DEFAULT_TAXONOMY: Dict[str, dict] = {
+    "biologia": {
+        "keywords": [
+            "célula", "animal", "planta", "cuerpo", "órgano", "tejido", "mitocondria",
+            "núcleo celular", "ADN", "gen", "fotosíntesis", "ecosistema", "bacteria",
+            "virus", "sistema digestivo", "sistema nervioso", "corazón", "esqueleto",
+        ],
+        "templates": [
+            "Diagrama detallado de {topic} con partes etiquetadas",
+            "Ciclo de vida de {topic} con flechas y etapas",
+            "Anatomía de {topic} en estilo científico educativo",
+        ],
+    },
+    "quimica": {
+        "keywords": [
+            "molécula", "elemento", "reacción", "átomo", "enlace", "ion", "ácido",
+            "tabla periódica", "compuesto", "electrón", "isótopo", "oxidación",
+        ],
+        "templates": [
+            "Modelo molecular de {topic} en 3D con enlaces",
+            "Reacción química de {topic} con ecuación balanceada",
+            "Tabla periódica destacando {topic}",
+        ],
+    },
+    "matematicas": {
+        "keywords": [
+            "número", "ecuación", "geometría", "función", "fracción", "triángulo",
+            "polígono", "teorema de pitágoras", "derivada", "integral", "probabilidad",
+        ],
+        "templates": [
+            "Representación visual de {topic} con ejemplos",
+            "Gráfica explicativa de {topic} con ejes etiquetados",
+            "Diagrama de {topic} paso a paso",
+        ],
+    },
+    DEFAULT_CATEGORY: {
+        "keywords": [],
+        "templates": [
+            "Infografía educativa sobre {topic} con iconos",
+            "Mapa conceptual de {topic} con conexiones",
+            "Ilustración explicativa de {topic}",
+        ],
+    },
+}
+
+
+def _singular(word: str) -> str:
+    """Singular aproximado en español ("células" -> "celula", "reacciones" -> "reaccion")."""
+    if len(word) > 4 and word.endswith("es") and word[-3] in "lnrdzj":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def keyword_tokens(text: str) -> List[str]:
+    """
+    Palabras de un texto tal como las compara el clasificador.
+
+    Ignora mayúsculas, tildes, puntuación y plurales regulares, de modo que
+    "Células Animales" y "celula animal" producen las mismas palabras.
+
+    Args:
+        text: Tema o palabra clave
+
+    Returns:
+        Lista de palabras normalizadas, en orden
+    """
+    return [_singular(word) for word in _WORD_RE.findall(fold_accents(text).casefold())]
+
+
+class KeywordMatcher:
+    """
+    Autómata Aho-Corasick sobre palabras: encuentra en una sola pasada todas
+    las palabras clave (y frases de varias palabras) presentes en un texto.
+
+    Cada palabra clave lleva un valor asociado (p. ej. su asignatura). Las
+    coincidencias respetan los límites de palabra: "ion" no coincide dentro
+    de "reaccion".
+    """
+
+    def __init__(self):
+        self._children: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, int]]] = [[]]
+        self._values: List[object] = []
+        self._built = False
+        self.size = 0
+
+    def add(self, keyword: str, value: object) -> bool:
+        """
+        Añade una palabra clave (antes de build).
+
+        Args:
+            keyword: Palabra o frase
+            value: Valor que se devuelve al encontrarla
+
+        Returns:
+            False si la palabra clave no tiene ninguna palabra
+        """
+        if self._built:
+            raise RuntimeError("KeywordMatcher ya está compilado")
+        tokens = keyword_tokens(keyword)
+        if not tokens:
+            return False
+
+        node = 0
+        for token in tokens:
+            child = self._children[node].get(token)
+            if child is None:
+                child = len(self._children)
+                self._children[node][token] = child
+                self._children.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = child
+
+        self._outputs[node].append((len(self._values), len(tokens)))
+        self._values.append(value)
+        self.size += 1
+        return True
+
+    def build(self) -> "KeywordMatcher":
+        """Calcula los enlaces de fallo (recorrido en anchura). Retorna self."""
+        queue = list(self._children[0].values())
+        for node in queue:
+            for token, child in self._children[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._children[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._children[fail].get(token, 0)
+                # Las coincidencias del sufijo más largo también terminan aquí
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+        self._built = True
+        return self
+
+    def iter_matches(self, tokens: Iterable[str]) -> Iterator[Tuple[object, int]]:
+        """
+        Recorre las coincidencias en unas palabras ya normalizadas.
+
+        Args:
+            tokens: Palabras de keyword_tokens()
+
+        Yields:
+            Tuple (valor de la palabra clave, número de palabras que la forman)
+        """
+        children, fail, outputs, values = self._children, self._fail, self._outputs, self._values
+        node = 0
+        for token in tokens:
+            while node and token not in children[node]:
+                node = fail[node]
+            node = children[node].get(token, 0)
+            for index, length in outputs[node]:
+                yield values[index], length
+
+
+class Taxonomy:
+    """
+    Clasificador de temas por asignatura y tabla de plantillas de sugerencias.
+
+    Cada coincidencia suma a su asignatura tantos puntos como palabras tiene
+    la palabra clave (las frases más específicas pesan más). Gana la
+    asignatura con más puntos; en caso de empate, la que aparece antes en
+    la taxonomía.
+    """
+
+    def __init__(self, categories: Dict[str, dict], default: str = DEFAULT_CATEGORY):
+        """
+        Args:
+            categories: Asignatura -> {"keywords": [...], "templates": [...]}
+            default: Asignatura cuando no hay coincidencias (debe tener plantillas)
+        """
+        if not categories.get(default, {}).get("templates"):
+            raise ValueError(f"La asignatura por defecto '{default}' necesita plantillas")
+
+        self.default = default
+        self.names: List[str] = list(categories)
+        self._templates: Dict[str, Tuple[str, ...]] = {
+            name: tuple(spec.get("templates") or categories[default]["templates"])
+            for name, spec in categories.items()
+        }
+        for name, templates in self._templates.items():
+            for template in templates:
+                try:
+                    template.format(topic="")
+                except (KeyError, IndexError, ValueError) as e:
+                    raise ValueError(f"Plantilla inválida en '{name}': {template!r} ({e})") from e
+
+        self.matcher = KeywordMatcher()
+        for index, name in enumerate(self.names):
+            for keyword in categories[name].get("keywords", ()):
+                self.matcher.add(keyword, index)
+        self.matcher.build()
+
+    def scores(self, topic: str) -> Dict[str, int]:
+        """
+        Puntos de cada asignatura con alguna coincidencia en el tema.
+
+        Args:
+            topic: Tema educativo
+
+        Returns:
+            Diccionario asignatura -> puntos (vacío si no hay coincidencias)
+        """
+        totals: Dict[int, int] = {}
+        for index, length in self.matcher.iter_matches(keyword_tokens(topic)):
+            totals[index] = totals.get(index, 0) + length
+        return {self.names[index]: points for index, points in sorted(totals.items())}
+
+    def classify(self, topic: str) -> str:
+        """
+        Asignatura de un tema.
+
+        Args:
+            topic: Tema educativo
+
+        Returns:
+            Nombre de la asignatura (la de por defecto si no hay coincidencias)
+        """
+        totals: Dict[int, int] = {}
+        for index, length in self.matcher.iter_matches(keyword_tokens(topic)):
+            totals[index] = totals.get(index, 0) + length
+        if not totals:
+            return self.default
+        # Más puntos y, a igualdad, la asignatura que aparece antes
+        return self.names[min(totals, key=lambda index: (-totals[index], index))]
+
+    def suggestions(self, topic: str, category: Optional[str] = None) -> List[str]:
+        """
+        Sugerencias de prompts para un tema.
+
+        Args:
+            topic: Tema educativo
+            category: Asignatura a usar (por defecto se clasifica el tema)
+
+        Returns:
+            Lista de sugerencias de prompts
+        """
+        templates = self._templates.get(category or self.classify(topic), self._templates[self.default])
+        return [template.format(topic=topic) for template in templates]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Retorna el tamaño de la taxonomía.
+
+        Returns:
+            Diccionario con asignaturas, palabras clave y plantillas
+        """
+        return {
+            "categories": len(self.names),
+            "keywords": self.matcher.size,
+            "templates": sum(len(templates) for templates in self._templates.values()),
+        }
+
+
+def load_categories(path: Optional[str] = None) -> Dict[str, dict]:
+    """
+    Asignaturas de la taxonomía por defecto ampliadas con un archivo JSON.
+
+    Args:
+        path: Archivo JSON con asignaturas (None = solo la taxonomía por defecto)
+
+    Returns:
+        Asignatura -> {"keywords": [...], "templates": [...]}
+    """
+    categories = {name: dict(spec) for name, spec in DEFAULT_TAXONOMY.items()}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            extra = json.load(f)
+        for name, spec in extra.items():
+            current = categories.setdefault(name, {"keywords": [], "templates": []})
+            current["keywords"] = list(current.get("keywords", [])) + list(spec.get("keywords", []))
+            if spec.get("templates"):
+                current["templates"] = list(spec["templates"])
+    return categories
+
+
+def load_taxonomy(path: Optional[str] = None) -> Taxonomy:
+    """
+    Compila la taxonomía por defecto ampliada con un archivo JSON.
+
+    Args:
+        path: Archivo JSON con asignaturas (None = solo la taxonomía por defecto)
+
+    Returns:
+        Taxonomía compilada
+    """
+    return Taxonomy(load_categories(path))
+
+
+_taxonomy: Optional[Taxonomy] = None
+_taxonomy_lock = threading.Lock()
+
+
+def get_taxonomy() -> Taxonomy:
+    """
+    Taxonomía compartida, compilada la primera vez que se usa.
+
+    Se amplía con el archivo de EDUDIFF_TAXONOMY si está definido.
+
+    Returns:
+        Taxonomía compilada
+    """
+    global _taxonomy
+    if _taxonomy is None:
+        with _taxonomy_lock:
+            if _taxonomy is None:
+                _taxonomy = load_taxonomy(os.environ.get("EDUDIFF_TAXONOMY") or None)
+    return _taxonomy
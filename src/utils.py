@@ -1,272 +1,42 @@
-<<<<<<< HEAD
-# ═══════════════════════════════════════════════════════════════════════════════
-# EduDiff XL — Utilidades y Funciones Auxiliares
-# ═══════════════════════════════════════════════════════════════════════════════
-
-import os
-import gc
-import torch
-import numpy as np
-from PIL import Image
-from typing import List, Dict, Tuple, Optional
-from datetime import datetime
-import json
-
-
-def get_device() -> str:
-    """Detecta y retorna el dispositivo disponible (cuda o cpu)."""
-    return "cuda" if torch.cuda.is_available() else "cpu"
-
-
-def clear_memory():
-    """Libera memoria GPU y ejecuta garbage collection."""
-    gc.collect()
-    if torch.cuda.is_available():
-        torch.cuda.empty_cache()
-
-
-def save_generation_metadata(
-    image_path: str,
-    metadata: Dict,
-    output_dir: str = "results"
-) -> str:
-    """
-    Guarda los metadatos de una generación en un archivo JSON.
-    
-    Args:
-        image_path: Ruta de la imagen generada
-        metadata: Diccionario con metadatos de la generación
-        output_dir: Directorio de salida
-    
-    Returns:
-        Ruta del archivo JSON guardado
-    """
-    os.makedirs(output_dir, exist_ok=True)
-    
-    json_path = os.path.splitext(image_path)[0] + "_metadata.json"
-    
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
-    
-    return json_path
-
-
-def calculate_image_quality_score(image: Image.Image) -> Dict[str, float]:
-    """
-    Calcula métricas de calidad básicas para una imagen.
-    
-    Args:
-        image: Imagen PIL
-    
-    Returns:
-        Diccionario con scores de calidad
-    """
-    img_array = np.array(image.convert('RGB'))
-    
-    # Brillo promedio (0-1)
-    brightness = np.mean(img_array) / 255.0
-    
-    # Contraste (desviación estándar normalizada)
-    contrast = np.std(img_array) / 255.0
-    
-    # Saturación promedio
-    hsv = np.array(image.convert('HSV'))
-    saturation = np.mean(hsv[:, :, 1]) / 255.0
-    
-    # Score de claridad (basado en contraste)
-    clarity = min(1.0, contrast * 2.5)
-    
-    # Score general
-    overall = (clarity * 0.4 + saturation * 0.3 + (1 - abs(brightness - 0.5)) * 0.3)
-    
-    return {
-        "brightness": round(brightness, 3),
-        "contrast": round(contrast, 3),
-        "saturation": round(saturation, 3),
-        "clarity": round(clarity, 3),
-        "overall_score": round(overall, 3)
-    }
-
-
-def resize_image_for_controlnet(
-    image: Image.Image,
-    target_width: int = 1024,
-    target_height: int = 1024
-) -> Image.Image:
-    """
-    Redimensiona una imagen para uso con ControlNet.
-    
-    Args:
-        image: Imagen PIL de entrada
-        target_width: Ancho objetivo
-        target_height: Alto objetivo
-    
-    Returns:
-        Imagen redimensionada
-    """
-    if image.mode != "RGB":
-        image = image.convert("RGB")
-    
-    return image.resize((target_width, target_height), Image.LANCZOS)
-
-
-def validate_prompt(prompt: str) -> Tuple[bool, str]:
-    """
-    Valida un prompt de entrada.
-    
-    Args:
-        prompt: Texto del prompt
-    
-    Returns:
-        Tuple (es_válido, mensaje)
-    """
-    if not prompt or not prompt.strip():
-        return False, "El prompt no puede estar vacío"
-    
-    if len(prompt) < 10:
-        return False, "El prompt debe tener al menos 10 caracteres"
-    
-    if len(prompt) > 2000:
-        return False, "El prompt no debe exceder 2000 caracteres"
-    
-    return True, "Prompt válido"
-
-
-def create_image_grid(
-    images: List[Image.Image],
-    rows: int = 2,
-    cols: int = 3,
-    padding: int = 10,
-    bg_color: Tuple[int, int, int] = (255, 255, 255)
-) -> Image.Image:
-    """
-    Crea una cuadrícula de imágenes.
-    
-    Args:
-        images: Lista de imágenes PIL
-        rows: Número de filas
-        cols: Número de columnas
-        padding: Espacio entre imágenes
-        bg_color: Color de fondo RGB
-    
-    Returns:
-        Imagen de la cuadrícula
-    """
-    if not images:
-        raise ValueError("La lista de imágenes no puede estar vacía")
-    
-    # Obtener tamaño de la primera imagen
-    img_width, img_height = images[0].size
-    
-    # Calcular tamaño total
-    grid_width = cols * img_width + (cols + 1) * padding
-    grid_height = rows * img_height + (rows + 1) * padding
-    
-    # Crear imagen de fondo
-    grid = Image.new('RGB', (grid_width, grid_height), bg_color)
-    
-    # Pegar imágenes
-    for idx, img in enumerate(images[:rows * cols]):
-        row = idx // cols
-        col = idx % cols
-        
-        x = padding + col * (img_width + padding)
-        y = padding + row * (img_height + padding)
-        
-        # Redimensionar si es necesario
-        if img.size != (img_width, img_height):
-            img = img.resize((img_width, img_height), Image.LANCZOS)
-        
-        grid.paste(img, (x, y))
-    
-    return grid
-
-
-def get_educational_prompt_suggestions(topic: str) -> List[str]:
-    """
-    Genera sugerencias de prompts educativos basados en un tema.
-    
-    Args:
-        topic: Tema educativo
-    
-    Returns:
-        Lista de sugerencias de prompts
-    """
-    suggestions = {
-        "biologia": [
-            f"Diagrama detallado de {topic} con partes etiquetadas",
-            f"Ciclo de vida de {topic} con flechas y etapas",
-            f"Anatomía de {topic} en estilo científico educativo",
-        ],
-        "quimica": [
-            f"Modelo molecular de {topic} en 3D con enlaces",
-            f"Reacción química de {topic} con ecuación balanceada",
-            f"Tabla periódica destacando {topic}",
-        ],
-        "matematicas": [
-            f"Representación visual de {topic} con ejemplos",
-            f"Gráfica explicativa de {topic} con ejes etiquetados",
-            f"Diagrama de {topic} paso a paso",
-        ],
-        "general": [
-            f"Infografía educativa sobre {topic} con iconos",
-            f"Mapa conceptual de {topic} con conexiones",
-            f"Ilustración explicativa de {topic}",
-        ]
-    }
-    
-    # Detectar categoría
-    topic_lower = topic.lower()
-    if any(word in topic_lower for word in ["célula", "animal", "planta", "cuerpo", "órgano"]):
-        category = "biologia"
-    elif any(word in topic_lower for word in ["molécula", "elemento", "reacción", "átomo"]):
-        category = "quimica"
-    elif any(word in topic_lower for word in ["número", "ecuación", "geometría", "función"]):
-        category = "matematicas"
-    else:
-        category = "general"
-    
-    return suggestions.get(category, suggestions["general"])
-
-
-# Constantes útiles
-SUPPORTED_IMAGE_FORMATS = ['.png', '.jpg', '.jpeg', '.webp']
-MAX_IMAGE_DIMENSION = 2048
-DEFAULT_GENERATION_PARAMS = {
-    "num_inference_steps": 25,
-    "guidance_scale": 7.5,
-    "width": 1024,
-    "height": 1024
-}
-
-
-
-
-
-
-=======
 # ═══════════════════════════════════════════════════════════════════════════════
 # EduDiff XL — Utilidades y Funciones Auxiliares
 # ═══════════════════════════════════════════════════════════════════════════════
+#
+# Solo depende de NumPy y PIL al importarse. torch (varios segundos de
+# importación) se carga dentro de get_device y clear_memory, las únicas
+# funciones que lo necesitan, y ambas funcionan aunque no esté instalado.
 
 import os
 import gc
-import torch
+import math
+import importlib.util
 import numpy as np
 from PIL import Image
 from typing import List, Dict, Tuple, Optional
-from datetime import datetime
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from src.taxonomy import get_taxonomy
+
+
+def _torch_available() -> bool:
+    return importlib.util.find_spec("torch") is not None
 
 
 def get_device() -> str:
     """Detecta y retorna el dispositivo disponible (cuda o cpu)."""
+    if not _torch_available():
+        return "cpu"
+    import torch
     return "cuda" if torch.cuda.is_available() else "cpu"
 
 
 def clear_memory():
     """Libera memoria GPU y ejecuta garbage collection."""
     gc.collect()
+    if not _torch_available():
+        return
+    import torch
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
 
@@ -334,26 +104,178 @@ def calculate_image_quality_score(image: Image.Image) -> Dict[str, float]:
     }
 
 
+def _load_rgb_array(image, max_side: Optional[int] = None) -> np.ndarray:
+    """Abre (si es una ruta), reduce opcionalmente y convierte a RGB una sola vez."""
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as opened:
+            if max_side and max(opened.size) > max_side:
+                # draft() permite a JPEG decodificar directamente a menor escala
+                # (solo sobre imágenes abiertas aquí: modifica el objeto)
+                opened.draft("RGB", (max_side, max_side))
+            return _rgb_array(opened, max_side)
+    return _rgb_array(image, max_side)
+
+
+def _rgb_array(image: Image.Image, max_side: Optional[int]) -> np.ndarray:
+    """Array RGB de una imagen con el lado mayor reducido a max_side (sin modificarla)."""
+    if max_side and max(image.size) > max_side:
+        # Redondeo hacia arriba: ceil(lado / factor) nunca supera max_side
+        image = image.reduce(math.ceil(max(image.size) / max_side))
+    
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    
+    return np.asarray(image)
+
+
+def _histogram_mean_std(hist: np.ndarray, values: np.ndarray) -> Tuple[float, float]:
+    """Media y desviación estándar exactas a partir de un histograma."""
+    total = hist.sum()
+    mean = (hist * values).sum() / total
+    var = (hist * (values - mean) ** 2).sum() / total
+    return float(mean), float(np.sqrt(var))
+
+
+def _quality_scores_for_stack(stack: np.ndarray) -> List[Dict[str, float]]:
+    """Métricas vectorizadas para un lote uint8 (B, H, W, 3) de imágenes del mismo tamaño."""
+    batch = stack.shape[0]
+    r, g, b = stack[..., 0], stack[..., 1], stack[..., 2]
+    
+    # Brillo y contraste exactos desde el histograma de cada imagen (sin copias float)
+    levels = np.arange(256, dtype=np.float64)
+    flat = stack.reshape(batch, -1)
+    brightness = np.empty(batch)
+    contrast = np.empty(batch)
+    for i in range(batch):
+        mean, std = _histogram_mean_std(np.bincount(flat[i], minlength=256), levels)
+        brightness[i] = mean / 255.0
+        contrast[i] = std / 255.0
+    
+    # Saturación HSV calculada directamente desde RGB, truncada a 0-255 como
+    # la conversión "HSV" de PIL para coincidir con calculate_image_quality_score
+    maxc = np.maximum(np.maximum(r, g), b)
+    minc = np.minimum(np.minimum(r, g), b)
+    chroma = (maxc - minc).astype(np.uint16) * 255
+    sat = np.floor_divide(chroma, maxc, out=np.zeros_like(chroma), where=maxc > 0)
+    saturation = sat.mean(axis=(1, 2)) / 255.0
+    
+    # Nitidez: varianza del Laplaciano sobre la luminancia (aritmética entera)
+    gray = ((r.astype(np.uint16) * 77 + g.astype(np.uint16) * 150 + b.astype(np.uint16) * 29) >> 8).astype(np.int16)
+    laplacian = gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1]
+    laplacian += gray[:, 1:-1, :-2]
+    laplacian += gray[:, 1:-1, 2:]
+    laplacian -= 4 * gray[:, 1:-1, 1:-1]
+    
+    lap_levels = np.arange(-1020, 1021, dtype=np.float64) / 255.0
+    lap_flat = laplacian.reshape(batch, -1)
+    sharpness = np.empty(batch)
+    for i in range(batch):
+        if lap_flat.shape[1] == 0:
+            sharpness[i] = 0.0
+            continue
+        hist = np.bincount(lap_flat[i].astype(np.intp) + 1020, minlength=2041)
+        sharpness[i] = _histogram_mean_std(hist, lap_levels)[1] ** 2
+    
+    clarity = np.minimum(1.0, contrast * 2.5)
+    overall = clarity * 0.4 + saturation * 0.3 + (1 - np.abs(brightness - 0.5)) * 0.3
+    
+    return [
+        {
+            "brightness": round(float(brightness[i]), 3),
+            "contrast": round(float(contrast[i]), 3),
+            "saturation": round(float(saturation[i]), 3),
+            "sharpness": round(float(sharpness[i]), 5),
+            "clarity": round(float(clarity[i]), 3),
+            "overall_score": round(float(overall[i]), 3)
+        }
+        for i in range(batch)
+    ]
+
+
+def _quality_scores_for_chunk(chunk: List, max_side: Optional[int]) -> List[Dict[str, float]]:
+    """Carga un grupo de imágenes y calcula sus métricas agrupando por tamaño."""
+    arrays = [_load_rgb_array(img, max_side) for img in chunk]
+    results: List[Optional[Dict[str, float]]] = [None] * len(arrays)
+    
+    # Agrupar por tamaño para poder apilar en un solo array
+    by_shape: Dict[Tuple[int, ...], List[int]] = {}
+    for idx, arr in enumerate(arrays):
+        by_shape.setdefault(arr.shape, []).append(idx)
+    
+    for indices in by_shape.values():
+        stack = np.stack([arrays[i] for i in indices])
+        for i, scores in zip(indices, _quality_scores_for_stack(stack)):
+            results[i] = scores
+    
+    return results
+
+
+def calculate_image_quality_scores(
+    images: List,
+    max_side: Optional[int] = None,
+    batch_size: int = 8,
+    num_workers: int = 4
+) -> List[Dict[str, float]]:
+    """
+    Calcula métricas de calidad para un lote de imágenes.
+    
+    Cada imagen se abre y convierte a RGB una sola vez y las métricas se
+    calculan con NumPy sobre lotes completos, repartidos entre varios hilos.
+    Incluye además una métrica de nitidez (varianza del Laplaciano).
+    
+    Args:
+        images: Lista de imágenes PIL o rutas a archivos
+        max_side: Si se indica, las métricas se calculan sobre una copia
+            reducida cuyo lado mayor no supera este valor
+        batch_size: Imágenes por lote (la memoria pico es ~num_workers lotes)
+        num_workers: Hilos que procesan lotes en paralelo
+    
+    Returns:
+        Lista de diccionarios con scores de calidad, en el orden de entrada
+    """
+    chunks = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        partial = pool.map(lambda chunk: _quality_scores_for_chunk(chunk, max_side), chunks)
+        return [scores for chunk_scores in partial for scores in chunk_scores]
+
+
 def resize_image_for_controlnet(
     image: Image.Image,
     target_width: int = 1024,
-    target_height: int = 1024
+    target_height: int = 1024,
+    keep_aspect: bool = False,
+    multiple: int = 8
 ) -> Image.Image:
     """
     Redimensiona una imagen para uso con ControlNet.
     
+    Al reducir, PIL promedia primero bloques enteros (reduce) antes del
+    LANCZOS final, que trabaja así sobre una imagen mucho más pequeña. La
+    imagen de entrada no se modifica.
+    
     Args:
         image: Imagen PIL de entrada
         target_width: Ancho objetivo
         target_height: Alto objetivo
+        keep_aspect: Conservar la proporción: el resultado cabe en el tamaño
+            objetivo y sus lados son múltiplos de `multiple`
+        multiple: Múltiplo de los lados con keep_aspect (SDXL requiere 8)
     
     Returns:
         Imagen redimensionada
     """
+    if keep_aspect:
+        scale = min(target_width / image.width, target_height / image.height)
+        target_width = max(multiple, int(image.width * scale) // multiple * multiple)
+        target_height = max(multiple, int(image.height * scale) // multiple * multiple)
+    
     if image.mode != "RGB":
         image = image.convert("RGB")
     
-    return image.resize((target_width, target_height), Image.LANCZOS)
+    if image.size == (target_width, target_height):
+        return image
+    return image.resize((target_width, target_height), Image.LANCZOS, reducing_gap=3.0)
 
 
 def validate_prompt(prompt: str) -> Tuple[bool, str]:
@@ -432,47 +354,16 @@ def get_educational_prompt_suggestions(topic: str) -> List[str]:
     """
     Genera sugerencias de prompts educativos basados en un tema.
     
+    La asignatura se detecta con las palabras clave de la taxonomía
+    curricular, sin distinguir tildes, mayúsculas ni plurales.
+    
     Args:
         topic: Tema educativo
     
     Returns:
         Lista de sugerencias de prompts
     """
-    suggestions = {
-        "biologia": [
-            f"Diagrama detallado de {topic} con partes etiquetadas",
-            f"Ciclo de vida de {topic} con flechas y etapas",
-            f"Anatomía de {topic} en estilo científico educativo",
-        ],
-        "quimica": [
-            f"Modelo molecular de {topic} en 3D con enlaces",
-            f"Reacción química de {topic} con ecuación balanceada",
-            f"Tabla periódica destacando {topic}",
-        ],
-        "matematicas": [
-            f"Representación visual de {topic} con ejemplos",
-            f"Gráfica explicativa de {topic} con ejes etiquetados",
-            f"Diagrama de {topic} paso a paso",
-        ],
-        "general": [
-            f"Infografía educativa sobre {topic} con iconos",
-            f"Mapa conceptual de {topic} con conexiones",
-            f"Ilustración explicativa de {topic}",
-        ]
-    }
-    
-    # Detectar categoría
-    topic_lower = topic.lower()
-    if any(word in topic_lower for word in ["célula", "animal", "planta", "cuerpo", "órgano"]):
-        category = "biologia"
-    elif any(word in topic_lower for word in ["molécula", "elemento", "reacción", "átomo"]):
-        category = "quimica"
-    elif any(word in topic_lower for word in ["número", "ecuación", "geometría", "función"]):
-        category = "matematicas"
-    else:
-        category = "general"
-    
-    return suggestions.get(category, suggestions["general"])
+    return get_taxonomy().suggestions(topic)
 
 
 # Constantes útiles
@@ -484,5 +375,3 @@ DEFAULT_GENERATION_PARAMS = {
     "width": 1024,
     "height": 1024
 }
-
->>>>>>> 8bf1d5b1f0324efa06f12e94947044e7e2e4ada2